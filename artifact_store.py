@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import os
+import pickle
+from os.path import isfile
+
+import numpy as np
+import pandas as pd
+
+def data_hash(*data):
+    # sha256 of the values, index and columns of DataFrames, Series or arrays
+    sha = hashlib.sha256()
+    for d in data:
+        if isinstance(d, (pd.DataFrame, pd.Series)):
+            sha.update(repr(list(d.columns) if isinstance(d, pd.DataFrame) else d.name).encode())
+            sha.update(pd.util.hash_pandas_object(d, index = True).values.tobytes())
+        else:
+            d = np.ascontiguousarray(d)
+            sha.update(repr((d.dtype.str, d.shape)).encode())
+            sha.update(d.tobytes())
+    return sha.hexdigest()
+
+########################################
+# Artifact store
+########################################
+class ArtifactStore():
+    """
+    Artifacts of the model of every (pkt, fold) (fitted model, predictions, best
+    hyperparameters, feature importances...) in directory, one pickle file per
+    fold named by a hash of the fold, the version of its data (values and columns
+    of its train and test flows, or hashes of the files they are read from) and
+    the hyperparameters. A file is written
+    atomically as soon as its fold is done, so that an interrupted run resumes
+    from the folds done, and a change of the data or of the hyperparameters is a
+    new file. The flows themselves are not saved.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def key(self, i, version, params):
+        # version of the data of the fold, e.g. data_hash of its train and test flows
+        return hashlib.sha256(repr((i, version, params)).encode()).hexdigest()
+
+    def filename(self, key):
+        return self.directory + key + ".pickle"
+
+    def load(self, key):
+        # artifacts saved for key, None if none
+        if not isfile(self.filename(key)):
+            return None
+        with open(self.filename(key), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, key, artifacts):
+        with open(self.filename(key) + ".tmp", "wb") as f:
+            pickle.dump(artifacts, f)
+        os.replace(self.filename(key) + ".tmp", self.filename(key))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+# (row, tree) pairs traversed at once
+CHUNK_SIZE = 1 << 18
+
+def float32_floor(threshold):
+    # largest float32 <= threshold: x <= float32_floor(threshold) if and only if x <= threshold for a float32 x
+    threshold32 = np.asarray(threshold).astype(np.float32)
+    above = threshold32.astype(np.float64) > threshold
+    threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+    return threshold32
+
+########################################
+# Compiled forest
+########################################
+class CompiledForest():
+    """
+    Trees of a fitted sklearn RandomForestClassifier flattened in contiguous arrays
+    (feature, threshold, children, missing_go_to_left and class probabilities of
+    the node), the nodes of tree t starting at roots[t]. Every row of a batch goes
+    down every tree at once, one level per step, so that the number of numpy
+    operations only depends on the depth of the trees. Features are compared in
+    float32 and the probabilities of the trees summed in their order, as sklearn
+    does, hence the same predictions as forest.predict.
+    """
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        self.roots = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        offsets = np.repeat(self.roots, sizes)
+        left = np.concatenate([tree.children_left for tree in trees]).astype(np.int64)
+        right = np.concatenate([tree.children_right for tree in trees]).astype(np.int64)
+        self.is_leaf = left == -1
+        # leaves are their own children, so that the rows already in a leaf stay there
+        nodes = np.arange(len(left))
+        self.left = np.where(self.is_leaf, nodes, left + offsets)
+        self.right = np.where(self.is_leaf, nodes, right + offsets)
+        # children of node i at 2 * i + (x <= threshold), a NaN going right
+        self.children = np.stack((self.right, self.left), axis = 1).ravel()
+        self.feature = np.where(self.is_leaf, 0, np.concatenate([tree.feature for tree in trees])).astype(np.int64)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.threshold32 = float32_floor(self.threshold)
+        self.missing_go_to_left = np.concatenate([tree.missing_go_to_left for tree in trees]).astype(bool) & ~self.is_leaf
+        self.has_missing = self.missing_go_to_left.any()
+        self.value = np.concatenate([tree.value[:, 0, :forest.n_classes_] for tree in trees])
+        self.classes_ = forest.classes_
+        self.n_features = forest.n_features_in_
+
+    def __len__(self):
+        return len(self.roots)
+
+    def _descend(self, X, nodes, rows):
+        # nodes of rows one level down
+        x = np.take(X, rows + np.take(self.feature, nodes))
+        go_left = x <= np.take(self.threshold32, nodes)
+        if self.has_missing:
+            go_left |= np.isnan(x) & np.take(self.missing_go_to_left, nodes)
+        return np.take(self.children, 2 * nodes + go_left)
+
+    def _leaves(self, X):
+        # leaf of every row of X in every tree, tree by tree
+        X = np.asarray(X, dtype = np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError("X has %s features, the forest was fitted with %d" % (X.shape[1:], self.n_features))
+        nb_trees = len(self.roots)
+        leaves = np.empty((nb_trees, X.shape[0]), dtype = np.int64)
+        chunk = max(1, CHUNK_SIZE // nb_trees)
+        for start in range(0, X.shape[0], chunk):
+            _X = np.ascontiguousarray(X[start:start + chunk]).ravel()
+            nb_rows = min(chunk, X.shape[0] - start)
+            nodes = np.repeat(self.roots, nb_rows)
+            # offset in _X of the row of every (tree, row) pair
+            rows = np.tile(np.arange(nb_rows) * self.n_features, nb_trees)
+            # all the pairs go down while most of them are not in a leaf, then only the others
+            while np.count_nonzero(np.take(self.is_leaf, nodes)) < len(nodes) / 2:
+                nodes = self._descend(_X, nodes, rows)
+            active = np.flatnonzero(~np.take(self.is_leaf, nodes))
+            while len(active) > 0:
+                _nodes = self._descend(_X, np.take(nodes, active), np.take(rows, active))
+                nodes[active] = _nodes
+                active = active[~np.take(self.is_leaf, _nodes)]
+            leaves[:, start:start + nb_rows] = nodes.reshape(nb_trees, nb_rows)
+        return leaves
+
+    def apply(self, X):
+        """
+        Leaf (index in the flat arrays) of every row of X in every tree, as an
+        array of shape (number of rows, number of trees).
+        """
+        return self._leaves(X).T
+
+    def predict_proba(self, X):
+        leaves = self._leaves(X)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype = np.float64)
+        for tree_leaves in leaves:
+            proba += np.take(self.value, tree_leaves, axis = 0)
+        proba /= len(leaves)
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis = 1), axis = 0)
+
+    def staged_predict_proba(self, X, sizes):
+        """
+        predict_proba of the first n trees for every n of the increasing sizes, from
+        a single traversal of the trees. The first n trees of a forest are those of
+        the forest fitted with n_estimators = n and the same random_state, so that
+        the forests of all the sizes are evaluated with the largest one.
+        """
+        leaves = self._leaves(X)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype = np.float64)
+        previous = 0
+        for n in sizes:
+            for tree_leaves in leaves[previous:n]:
+                proba += np.take(self.value, tree_leaves, axis = 0)
+            previous = n
+            yield proba / n
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from functools import partial
 from os import listdir
 from os.path import isfile, join
 import sys
@@ -21,7 +22,7 @@ from sklearn.metrics import classification_report, f1_score, confusion_matrix, C
 import seaborn as sns
 import matplotlib.pyplot as plt 
 
-from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator
+from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator, FOLD_STORAGES, RF_SEARCHES, FLOW_FEATURES, FlowRecords, get_flows_statistical_features_from_chunks, read_csv_chunks
 
 ########################################
 # Data preparation: convert RAW data
@@ -57,12 +58,38 @@ class CstNetTls13Classifier(EncryptedTrafficClassifier):
     ########################################
     # Preprocessing
     ########################################
+    def _read_packets(self, f, c):
+        """
+        Packets of file f but DNS traffic, of class c if not None, by chunks of self.chunksize packets.
+        """
+        for df_new in read_csv_chunks(f, 
+                                      self.chunksize,
+                                      names = [
+                                          'flow_id',
+                                          'timestamp', 
+                                          'iat',                                                         
+                                          'source',
+                                          'sport',
+                                          'dest', 
+                                          'dport',
+                                          'protocol', 
+                                          'length'
+                                      ],
+                                      header = 0
+                                      ):
+            # drop DNS traffic
+            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
+            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
+            if c is not None:
+                df_new['class'] = c
+            yield df_new
+
     def _get_flows_with_all_packets(self):
         print("_get_flows_with_all_packets")
         start_time = time.time()
         subdirs = sorted([f for f in listdir(self.data_dir)])
         nb_flows = 0
-        df_flows = pd.DataFrame()
+        records = FlowRecords()
         self.classes = set()
         for subdir in subdirs:
             # print("subdir", self.data_dir+subdir)
@@ -71,58 +98,27 @@ class CstNetTls13Classifier(EncryptedTrafficClassifier):
             for _i in range(len(_files)):
                 f = self.data_dir + subdir + "/" + _files[_i]
 
-                df_new = pd.read_csv(f, 
-                                     names = [
-                                         'flow_id',
-                                         'timestamp', 
-                                         'iat',                                                         
-                                         'source',
-                                         'sport',
-                                         'dest', 
-                                         'dport',
-                                         'protocol', 
-                                         'length'
-                                     ],
-                                     header = 0
-                                     )   
-                print(f, df_new.shape)
-            
-                # drop DNS traffic
-                df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-                df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-                
-                found = False
+                print(f)
+                c = None
                 for _c in self.all_classes:
                     if _c in f:
-                        found = True
-                        df_new['class'] = _c
+                        c = _c
                         self.classes.add(_c)
                         break
-                if found == False:
+                if c is None:
                     print("class not identified for", f)
             
                 # extract flow and add statistical features
-                dfs = []
-                for flow_id in df_new['flow_id'].unique():                    
-                    nb_flows += 1
-                    d = df_new[df_new['flow_id'] == flow_id].head(n = 1)
-                    d['nb_packets'] = len(df_new[df_new['flow_id'] == flow_id])
-                    c = d['class'].tolist()
-                    dport = d.dport.tolist()
-                    sport = d.sport.tolist()
-                    #print(d)
-                    _df = df_new.loc[df_new['flow_id'] == flow_id, 'iat']
-                    d['sum_iat'] = np.sum(_df)
-                
-                    _df = df_new.loc[df_new['flow_id'] == flow_id, 'length']
-                    d['sum_length'] = np.sum(_df)
-                    d['src'] = f
-                    dfs.append(d)
-            _d = pd.concat(dfs)
-            df_flows = pd.concat([_d, df_flows])
+                d = get_flows_statistical_features_from_chunks(self._read_packets(f, c), [sys.maxsize], self.memory_budget, min_iat_per_flow = True)[sys.maxsize]
+                d = d[[_c for _c in d.columns if _c not in FLOW_FEATURES] + ['nb_packets', 'sum_iat', 'sum_length']]
+                nb_flows += len(d)
+                d['src'] = f
+                # flows of each file were prepended to the ones of the previous files
+                records.append(d.iloc[::-1])
             # For debugging
             # break
                 
+        df_flows = records.to_frame().iloc[::-1]
         print("  processing took ", time.time() - start_time, "seconds.")
         print("%d flows processed" % nb_flows)            
         # Finish processing the data, create the train/tests split and save as pickle files
@@ -149,94 +145,58 @@ class CstNetTls13Classifier(EncryptedTrafficClassifier):
             files += _files
 
         # print(files)
-        for i in self.nb_packets_per_flow:
-            self.__generate_pickle_for_n_packets(i, files)
+        # each file is read once for all the numbers of packets per flow
+        self.__generate_pickles(self.nb_packets_per_flow, files)
 
-    def __generate_pickle_for_n_packets(self, n, files):
-        print("__generate_pickle_for_n_packets n =", n)
+    def _extract_flows(self, f, nb_packets):
+        """
+        Flows of file f for every number of packets, run in a worker process when
+        self.jobs > 1: the classes found are returned instead of added to self.classes.
+        """
+        classes = []
+        print(f)
+        c = None
+        for _c in self.all_classes:
+            if _c in f:
+                c = _c
+                classes.append(_c)
+                break
+        if c is None:
+            print("class not identified for", f)
+        
+        # extract flows and add statistical features for every number of packets
+        flows = get_flows_statistical_features_from_chunks(self._read_packets(f, c), nb_packets, self.memory_budget, fixed_point = self.fixed_point)
+        for n, d in flows.items():
+            d['src'] = f
+        return len(d), (classes, flows)
+
+    def __generate_pickles(self, nb_packets, files):
+        print("__generate_pickles nb_packets =", nb_packets)
         nb_flows = 0
-        df_flows = pd.DataFrame()
-        # dfs = []
+        records = {n: FlowRecords() for n in nb_packets}
         self.classes = set()
-        for f in files:
-            # print("f=", f)
-            df_new = pd.read_csv(f, 
-                                 names = [
-                                     'flow_id',
-                                     'timestamp', 
-                                     'iat',                                                         
-                                     'source',
-                                     'sport',
-                                     'dest', 
-                                     'dport',
-                                     'protocol', 
-                                     'length'
-                                 ],
-                                 header = 0
-                                 )   
-            print(n, f, df_new.shape)
-            
-            # drop DNS traffic
-            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-            
-            found = False
-            for _c in self.all_classes:
-                if _c in f:
-                    found = True
-                    df_new['class'] = _c
-                    self.classes.add(_c)
-                    break
-            if found == False:
-                print("class not identified for", f)
-            
-            # extract flow and add statistical features
-            for flow_id in df_new['flow_id'].unique():                    
-                nb_flows += 1
-                _df_new = df_new[df_new['flow_id'] == flow_id].head(n = n)
-                d = _df_new.head(n = 1)
-                d['nb_packets'] = len(_df_new) #df_new[df_new['flow_id'] == flow_id])
-                c = d['class'].tolist()
-                dport = d.dport.tolist()
-                sport = d.sport.tolist()
-                #print(d)
-                _df = _df_new['iat']
-                d['min_iat'] = np.min(df_new[df_new['iat'] > 0]['iat']) # probably useless as most probably always 0 for the first packet
-                d['max_iat'] = np.max(_df)
-                d['sum_iat'] = np.sum(_df)
-                d['mean_iat'] = np.mean(_df)
-                d['median_iat'] = np.median(_df)
-                d['std_iat'] = np.std(_df)
-                d['1stQ_iat'] = np.quantile(_df, 0.25)
-                d['3rdQ_iat'] = np.quantile(_df, 0.75)
-                _a = list(_df)
-                d['skew_iat'] = skew(_a)
-                d['kurt_iat'] = kurtosis(_a)
-                
-                _df = _df_new['length']
-                d['min_length'] = np.min(_df)
-                d['max_length'] = np.max(_df)
-                d['sum_length'] = np.sum(_df)
-                d['median_length'] = np.median(_df)
-                d['mean_length'] = np.mean(_df)
-                d['std_length'] = np.std(_df)
-                d['1stQ_length'] = np.quantile(_df, 0.25)
-                d['3rdQ_length'] = np.quantile(_df, 0.75)
-                _a = list(_df)
-                d['skew_length'] = skew(_a)
-                # d['skew_length'] = skew(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'length']))
-                d['kurt_length'] = kurtosis(_a)
-                d['src'] = f
-                # dfs.append(d)
-                df_flows = pd.concat([d, df_flows])
+        # files are processed in parallel, results are merged in the order of files
+        for classes, flows in self._map_files(partial(self._extract_flows, nb_packets = nb_packets), files):
+            for c in classes:
+                self.classes.add(c)
+            for n, d in flows.items():
+                records[n].append(d)
+            nb_flows += len(d)
             # if nb_flows > 20:
             #     break
                 
         print("%d flows processed" % nb_flows)            
+        self.classes = list(self.classes)
+        for n in nb_packets:
+            self.__generate_pickle_for_n_packets(n, records[n])
+
+    def __generate_pickle_for_n_packets(self, n, records):
+        print("__generate_pickle_for_n_packets n =", n)
         # Finish processing the data, create the train/tests split and save as pickle files
+        # flows were historically prepended one by one, keep the same (reversed) order
+        df_flows = records.to_frame().iloc[::-1]
         df_flows = df_flows.fillna(0)
         
-        self.classes = list(self.classes)
         self._hotencode_class(df_flows)
         
         filename = self.filename_prefix + "_" + str(n) + ".pickle"
@@ -308,6 +268,14 @@ if __name__ == "__main__":
     parser.add_argument('-v', '--visualization', action = 'store_true', required = False, default = False)
     parser.add_argument('-r', '--report', action = 'store_true', required = False, default = False)
     parser.add_argument('-F', '--force_rf_classification', action = 'store_true', required = False, default = False)
+    parser.add_argument('-j', '--jobs', action = 'store', default = 1, type = int)
+    parser.add_argument('-s', '--storage', action = 'store', default = 'feather', choices = FOLD_STORAGES)
+    parser.add_argument('--rf_search', action = 'store', default = 'grid', choices = RF_SEARCHES)
+    parser.add_argument('--rf_search_time_budget', action = 'store', default = None, type = float)
+    parser.add_argument('--binned', action = 'store_true', required = False, default = False)
+    parser.add_argument('-m', '--memory_budget', action = 'store', default = 2048, type = int)
+    parser.add_argument('-q', '--fixed_point', action = 'store', default = None, type = int)
+    parser.add_argument('--fixed_point_report', action = 'store_true', required = False, default = False)
     args = parser.parse_args(sys.argv[1:])
 
     VISUALIZATION_ENABLED = False
@@ -335,6 +303,13 @@ if __name__ == "__main__":
 
     if args.force_rf_classification == True:
         classifier.force_rf_classification = True
+    classifier.jobs = args.jobs
+    classifier.fold_storage = args.storage
+    classifier.rf_search = args.rf_search
+    classifier.rf_search_time_budget = args.rf_search_time_budget
+    classifier.binned = args.binned
+    classifier.memory_budget = args.memory_budget * 1024 * 1024
+    classifier.set_fixed_point(args.fixed_point)
 
     classifier.all_classes = [
         "163.com",
@@ -536,6 +511,10 @@ if __name__ == "__main__":
     ]
     feats_flows = all_features_flows
     
+    if args.fixed_point_report == True:
+        classifier.fixed_point_report()
+        sys.exit(0)
+
     # Preprocessing
     if not classifier.data_prepared():
         classifier.data_preparation()
@@ -651,11 +630,30 @@ if __name__ == "__main__":
         print(output)
 
     if GB_ENABLED:
-        gb_regr, gb_y_train_predicted, gb_y_test_predicted  = classifier.GBoost_predict(feats_flows, df_score)
-        gb_cm_dict = classifier.confusion_matrix(gb_regr, gb_y_test_predicted, False)
-        gb_f1_scores = classifier.get_F1_score(df_score, gb_cm_dict,  y_test, gb_y_test_predicted, "gb", False)
-        classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids_without_folds)
-        classifier.avg_f1_scores(gb_f1_scores)
+        print("==== GradientBoosting =====")
+        gb_regr, gb_y_train_predicted, gb_y_test_flows_predicted = classifier.GBoost_predict(
+            classifier.X_train_flows_fitted,
+            classifier.y_train_flows,
+            classifier.X_test_flows_fitted,
+            classifier.y_test_flows
+        )
+        gb_cm_dict_flows, output = classifier.confusion_matrix(gb_regr,
+                                                               classifier.y_test_flows,
+                                                               gb_y_test_flows_predicted,
+                                                               classifier.flow_ids,
+                                                               "gb"
+                                                               )
+        print(output)
+            
+        gb_f1_scores_flows, output = classifier.get_F1_score(
+            gb_cm_dict_flows,
+            classifier.y_test_flows,
+            gb_y_test_flows_predicted,
+            classifier.flow_ids,
+            "gb_flows")
+        print(output)
+        avg_scores, output = classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids)
+        print(output)
 
     if XG_ENABLED:
         print("==== XGBoost =====")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import mmap
+import socket
+import struct
+import sys
+
+import numpy as np
+import pandas as pd
+
+# same fields as data_preparation/pcap2csv.sh (tshark), -1 or '' when the packet does not have them
+PACKETS_DTYPE = np.dtype([
+    ('frame_number', np.int64),
+    ('time_epoch', np.float64),
+    ('time_delta', np.float64),
+    ('src', 'U15'),
+    ('sport', np.int32),
+    ('dst', 'U15'),
+    ('dport', np.int32),
+    ('proto', np.int16),
+    ('frame_len', np.int64)
+])
+TSHARK_FIELDS = ['frame.number', 'frame.time_epoch', 'frame.time_delta', 'ip.src', '_ws.col.SP', 'ip.dst', '_ws.col.DP', 'ip.proto', 'frame.len']
+
+PCAP_EXTENSIONS = ('.pcap', '.pcapng', '.cap')
+
+# link layer types, cf. https://www.tcpdump.org/linktypes.html
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = [12, 14, 101, 228, 229]
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = [0x8100, 0x88a8, 0x9100]
+# transport protocols whose header starts with the source and destination ports: TCP, UDP, DCCP, SCTP, UDP-Lite
+PORTS_PROTOCOLS = [6, 17, 33, 132, 136]
+# IPv6 extension headers skipped to find the transport header: hop-by-hop, routing, fragment, destination options
+IPV6_EXTENSION_HEADERS = [0, 43, 44, 60]
+
+PCAP_MAGIC = {0xa1b2c3d4: 1000, 0xa1b23c4d: 1}
+PCAPNG_SECTION_HEADER = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+def __pcap_batches(mm, batch_size):
+    # offsets of the data, captured lengths, lengths on the wire, timestamps in ns and link types of batch_size packets
+    for endian in ['<', '>']:
+        magic, _, _, _, _, _, linktype = struct.unpack_from(endian + 'IHHiIII', mm, 0)
+        if magic in PCAP_MAGIC:
+            break
+    buf = np.frombuffer(mm, dtype = np.uint8)
+    caplen = struct.Struct(endian + 'I').unpack_from
+    offset = 24
+    end = len(mm) - 16
+    while offset <= end:
+        offsets = []
+        for _ in range(batch_size):
+            if offset > end:
+                break
+            offsets.append(offset + 16)
+            offset += 16 + caplen(mm, offset + 8)[0]
+        offsets = np.array(offsets, dtype = np.int64)
+        headers = buf[(offsets - 16)[:, None] + np.arange(16)].view(endian + 'u4').astype(np.int64)
+        yield offsets, headers[:, 2], headers[:, 3], headers[:, 0] * 1000000000 + headers[:, 1] * PCAP_MAGIC[magic], np.full(len(offsets), linktype & 0xffff)
+
+def __pcapng_interface(mm, endian, offset, length):
+    # link type and function converting timestamps to ns of an Interface Description Block
+    linktype, = struct.unpack_from(endian + 'H', mm, offset + 8)
+    tsresol = 6
+    tsoffset = 0
+    position = offset + 16
+    while position + 4 <= offset + length - 4:
+        code, option_length = struct.unpack_from(endian + 'HH', mm, position)
+        if code == 0:
+            break
+        if code == 9:
+            tsresol = mm[position + 4]
+        elif code == 14:
+            tsoffset, = struct.unpack_from(endian + 'q', mm, position + 4)
+        position += 4 + (option_length + 3) // 4 * 4
+    if tsresol & 0x80:
+        to_ns = lambda ts: (ts * 1000000000 >> (tsresol & 0x7f)) + tsoffset * 1000000000
+    elif tsresol <= 9:
+        to_ns = lambda ts: ts * 10 ** (9 - tsresol) + tsoffset * 1000000000
+    else:
+        to_ns = lambda ts: ts // 10 ** (tsresol - 9) + tsoffset * 1000000000
+    return linktype, to_ns
+
+def __pcapng_batches(mm, batch_size):
+    # same as __pcap_batches, the byte order and the interfaces are set by each section
+    endian = '<'
+    interfaces = []
+    snaplen = 0
+    offset = 0
+    records = []
+    while offset + 12 <= len(mm):
+        block_type, = struct.unpack_from('<I', mm, offset)
+        if block_type == PCAPNG_SECTION_HEADER:
+            endian = '<' if struct.unpack_from('<I', mm, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            interfaces = []
+        block_type, length = struct.unpack_from(endian + 'II', mm, offset)
+        if length < 12:
+            break
+        if block_type == 1:
+            interfaces.append(__pcapng_interface(mm, endian, offset, length))
+            if len(interfaces) == 1:
+                snaplen, = struct.unpack_from(endian + 'I', mm, offset + 12)
+        elif block_type == 6 or block_type == 2:
+            # Enhanced Packet Block, or obsolete Packet Block with a 16 bits interface id
+            if block_type == 6:
+                interface, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + 'IIIII', mm, offset + 8)
+            else:
+                interface, _, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + 'HHIIII', mm, offset + 8)
+            linktype, to_ns = interfaces[interface]
+            records.append((offset + 28, caplen, origlen, to_ns(ts_high << 32 | ts_low), linktype))
+        elif block_type == 3:
+            # Simple Packet Block, without timestamp
+            origlen, = struct.unpack_from(endian + 'I', mm, offset + 8)
+            caplen = min(origlen, length - 16, snaplen if snaplen > 0 else origlen)
+            records.append((offset + 12, caplen, origlen, 0, interfaces[0][0]))
+        offset += length
+        if len(records) == batch_size or (offset + 12 > len(mm) and len(records) > 0):
+            yield tuple(np.array(values, dtype = np.int64) for values in zip(*records))
+            records = []
+
+def __decode(buf, offsets, caplens, linktypes):
+    # link, network and transport headers of a batch of packets, vectorized over packets
+    ends = offsets + caplens
+    last = len(buf) - 1
+    def u8(index):
+        return buf[np.minimum(index, last)].astype(np.int64)
+    def u16(index):
+        return u8(index) << 8 | u8(index + 1)
+
+    l3 = np.full(len(offsets), -1, dtype = np.int64)
+    ethertype = np.full(len(offsets), -1, dtype = np.int64)
+    ethernet = linktypes == LINKTYPE_ETHERNET
+    _ethertype = u16(offsets + 12)
+    _l3 = offsets + 14
+    for _ in range(2):
+        vlan = np.isin(_ethertype, ETHERTYPE_VLAN)
+        _ethertype = np.where(vlan, u16(_l3 + 2), _ethertype)
+        _l3 = np.where(vlan, _l3 + 4, _l3)
+    l3 = np.where(ethernet, _l3, l3)
+    ethertype = np.where(ethernet, _ethertype, ethertype)
+    sll = linktypes == LINKTYPE_LINUX_SLL
+    l3 = np.where(sll, offsets + 16, l3)
+    ethertype = np.where(sll, u16(offsets + 14), ethertype)
+    sll2 = linktypes == LINKTYPE_LINUX_SLL2
+    l3 = np.where(sll2, offsets + 20, l3)
+    ethertype = np.where(sll2, u16(offsets), ethertype)
+    # IP version given by the first byte of the packet after a 4 bytes header (null/loop) or none (raw)
+    raw = np.isin(linktypes, LINKTYPE_RAW)
+    loop = (linktypes == LINKTYPE_NULL) | (linktypes == LINKTYPE_LOOP)
+    l3 = np.where(raw, offsets, np.where(loop, offsets + 4, l3))
+    version = u8(l3) >> 4
+    ethertype = np.where(raw | loop, np.where(version == 4, ETHERTYPE_IPV4, np.where(version == 6, ETHERTYPE_IPV6, -1)), ethertype)
+
+    ipv4 = (ethertype == ETHERTYPE_IPV4) & (version == 4) & (l3 >= 0) & (l3 + 20 <= ends)
+    ipv6 = (ethertype == ETHERTYPE_IPV6) & (version == 6) & (l3 >= 0) & (l3 + 40 <= ends)
+    proto = np.where(ipv4, u8(l3 + 9), -1)
+    src = np.where(ipv4, u16(l3 + 12) << 16 | u16(l3 + 14), -1)
+    dst = np.where(ipv4, u16(l3 + 16) << 16 | u16(l3 + 18), -1)
+    # ports are only in the first fragment
+    first_fragment = (u16(l3 + 6) & 0x1fff) == 0
+    l4 = l3 + (u8(l3) & 0x0f) * 4
+    l4_proto = np.where(ipv4, proto, -1)
+    next_header = u8(l3 + 6)
+    _l4 = l3 + 40
+    for _ in range(4):
+        extension = ipv6 & np.isin(next_header, IPV6_EXTENSION_HEADERS) & (_l4 + 8 <= ends)
+        fragment = extension & (next_header == 44)
+        first_fragment = np.where(fragment, first_fragment & ((u16(_l4 + 2) >> 3) == 0), first_fragment)
+        _next_header = u8(_l4)
+        _l4 = np.where(extension, _l4 + np.where(fragment, 8, (u8(_l4 + 1) + 1) * 8), _l4)
+        next_header = np.where(extension, _next_header, next_header)
+    first_fragment = np.where(ipv6, True, first_fragment)
+    l4 = np.where(ipv6, _l4, l4)
+    l4_proto = np.where(ipv6, next_header, l4_proto)
+    ports = (ipv4 | ipv6) & first_fragment & np.isin(l4_proto, PORTS_PROTOCOLS) & (l4 + 4 <= ends)
+    sport = np.where(ports, u16(l4), -1)
+    dport = np.where(ports, u16(l4 + 2), -1)
+    return src, sport, dst, dport, proto
+
+def __addresses(addresses):
+    # dotted notation of IPv4 addresses, '' for -1
+    unique, inverse = np.unique(addresses, return_inverse = True)
+    names = np.array([socket.inet_ntoa(struct.pack('>I', a)) if a >= 0 else '' for a in unique.tolist()], dtype = 'U15')
+    return names[inverse]
+
+def read_packets(filename, batch_size = 65536):
+    """
+    Packets of a pcap or pcapng file as numpy arrays of PACKETS_DTYPE of at most
+    batch_size packets, with the values written by pcap2csv.sh (tshark). Only the
+    outermost IP header of each packet is considered.
+    """
+    with open(filename, 'rb') as f:
+        if f.seek(0, 2) < 4:
+            raise ValueError(filename + " is not a pcap or pcapng file")
+        # closed when the arrays using it are released, even if the packets are not all read
+        mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        buf = np.frombuffer(mm, dtype = np.uint8)
+        magic, = struct.unpack_from('<I', mm, 0)
+        if magic == PCAPNG_SECTION_HEADER:
+            batches = __pcapng_batches(mm, batch_size)
+        elif magic in PCAP_MAGIC or struct.unpack_from('>I', mm, 0)[0] in PCAP_MAGIC:
+            batches = __pcap_batches(mm, batch_size)
+        else:
+            raise ValueError(filename + " is not a pcap or pcapng file")
+        frame_number = 0
+        previous_ns = None
+        for offsets, caplens, origlens, timestamps, linktypes in batches:
+            packets = np.empty(len(offsets), dtype = PACKETS_DTYPE)
+            packets['frame_number'] = np.arange(frame_number + 1, frame_number + len(offsets) + 1)
+            frame_number += len(offsets)
+            # from the integer ns as tshark, the division of Python integers is correctly rounded
+            packets['time_epoch'] = [ts / 1000000000 for ts in timestamps.tolist()]
+            if previous_ns is None:
+                previous_ns = timestamps[0]
+            packets['time_delta'] = np.diff(timestamps, prepend = previous_ns) / 1000000000
+            previous_ns = timestamps[-1]
+            caplens = np.minimum(caplens, len(buf) - offsets)
+            src, sport, dst, dport, proto = __decode(buf, offsets, caplens, linktypes)
+            packets['src'] = __addresses(src)
+            packets['sport'] = sport
+            packets['dst'] = __addresses(dst)
+            packets['dport'] = dport
+            packets['proto'] = proto
+            packets['frame_len'] = origlens
+            yield packets
+
+def write_csv(filename, output):
+    """
+    Write the packets of filename in output as pcap2csv.sh does.
+    """
+    header = True
+    for packets in read_packets(filename):
+        df = pd.DataFrame(packets)
+        for name in ['sport', 'dport', 'proto']:
+            df[name] = df[name].astype('Int64').mask(df[name] < 0)
+        df.columns = TSHARK_FIELDS
+        df.to_csv(output, header = header, index = False)
+        header = False
+
+def main():
+    # python data_preparation/pcapreader.py datafile.pcap > datafile.csv
+    write_csv(sys.argv[1], sys.stdout)
+
+if __name__ == "__main__":
+    main()
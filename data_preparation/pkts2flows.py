@@ -1,41 +1,278 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from os import listdir
-from os.path import join
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count, listdir, remove
+import pickle
+from os.path import join, splitext
 
 import pandas as pd
 import numpy as np
 
-def __pkts2flow(path, outpath, filename, first_flow_id):
+from pcapreader import PACKETS_DTYPE, PCAP_EXTENSIONS, read_packets
+
+COLUMNS = ["packet_id", "timestamp", "iat", "src", "psrc", "dst", "pdst", "protocol", "length"]
+# IP addresses as categories: integer codes and a single copy of each address
+DTYPES = {'packet_id': 'int', 'timestamp': 'float', 'iat': 'float', 'src': 'category', "psrc": 'int', 'dst':'category', 'pdst': 'int', 'protocol': 'int', 'length': 'int'}
+# packets read at once by the flow table
+CHUNKSIZE = 1000000
+
+def __read_packets(path, filename):
+    # the CSV written by pcap2csv.sh, or the same columns read directly from a pcap/pcapng file (-1 for missing ports or protocol)
+    if filename.endswith(PCAP_EXTENSIONS):
+        df = pd.DataFrame(np.concatenate(list(read_packets(join(path, filename))) or [np.empty(0, dtype = PACKETS_DTYPE)]))
+        df.columns = COLUMNS
+        return df.astype(DTYPES)
+    return pd.read_csv(join(path, filename), names = COLUMNS, dtype = DTYPES, header = 0)
+
+def __read_packet_chunks(path, filename):
+    # same as __read_packets by chunks of CHUNKSIZE packets, the categories of the addresses would differ between chunks
+    dtypes = dict(DTYPES, src = 'str', dst = 'str')
+    if filename.endswith(PCAP_EXTENSIONS):
+        for packets in read_packets(join(path, filename), CHUNKSIZE):
+            df = pd.DataFrame(packets)
+            df.columns = COLUMNS
+            yield df.astype(dtypes)
+    else:
+        yield from pd.read_csv(join(path, filename), names = COLUMNS, dtype = dtypes, header = 0, chunksize = CHUNKSIZE)
+
+def __ordered_codes(column):
+    # codes of a categorical column in the order of its sorted values
+    categories = column.cat.categories
+    rank = np.empty(len(categories), dtype = np.int64)
+    rank[categories.argsort()] = np.arange(len(categories))
+    return rank[column.cat.codes.to_numpy()], max(len(categories), 1).bit_length()
+
+def __flow_ids(df):
+    """
+    Flow of every packet numbered from 0 in the order of the sorted 5-tuples, as
+    df.groupby(['src', 'psrc', 'dst', 'pdst', 'protocol']).ngroup() but with the
+    5-tuple packed in an int64 key factorized in one pass.
+    """
+    src, src_bits = __ordered_codes(df['src'])
+    dst, dst_bits = __ordered_codes(df['dst'])
+    # ports and protocol shifted by one for the -1 of the packets without them
+    src_key = src << 17 | (df['psrc'].to_numpy() + 1)
+    dst_key = (dst << 17 | (df['pdst'].to_numpy() + 1)) << 9 | (df['protocol'].to_numpy() + 1)
+    dst_key_bits = dst_bits + 17 + 9
+    if src_bits + 17 + dst_key_bits <= 63:
+        key = src_key << dst_key_bits | dst_key
+    else:
+        # too many addresses for a single int64: pack the ranks of both halves
+        src_key, _ = pd.factorize(src_key, sort = True)
+        dst_key, dst_uniques = pd.factorize(dst_key, sort = True)
+        key = src_key * len(dst_uniques) + dst_key
+    flow_ids, _ = pd.factorize(key, sort = True)
+    return flow_ids
+
+def __lowest_first(df):
+    # 5-tuples of df with the lowest (address, port) first, the same for both directions as in FlowTable
+    src = df['src'].to_numpy(dtype = object)
+    psrc = df['psrc'].to_numpy()
+    dst = df['dst'].to_numpy(dtype = object)
+    pdst = df['pdst'].to_numpy()
+    swap = (src > dst) | ((src == dst) & (psrc > pdst))
+    return pd.DataFrame({'src': pd.Categorical(np.where(swap, dst, src)),
+                         'psrc': np.where(swap, pdst, psrc),
+                         'dst': pd.Categorical(np.where(swap, src, dst)),
+                         'pdst': np.where(swap, psrc, pdst),
+                         'protocol': df['protocol'].to_numpy()})
+
+class FlowTable:
+    """
+    Flow cache of a switch: packets go to the flow of their 5-tuple, the same for
+    both directions if bidirectional, until the flow has been idle for more than
+    idle_timeout seconds or active for more than active_timeout seconds, then the
+    next packet starts a new flow. Flows are numbered from 1 in the order they
+    start and only the active flows are kept.
+    """
+    def __init__(self, bidirectional = False, idle_timeout = None, active_timeout = None):
+        self.bidirectional = bidirectional
+        self.idle_timeout = np.inf if idle_timeout is None else idle_timeout
+        self.active_timeout = np.inf if active_timeout is None else active_timeout
+        # 5-tuple -> [number, first timestamp, last timestamp]
+        self.flows = {}
+        self.nb_flows = 0
+        self.completed = []
+
+    def _keys(self, df):
+        src = df['src'].to_numpy(dtype = object)
+        psrc = df['psrc'].to_numpy()
+        dst = df['dst'].to_numpy(dtype = object)
+        pdst = df['pdst'].to_numpy()
+        if self.bidirectional:
+            # the lowest (address, port) first
+            swap = (src > dst) | ((src == dst) & (psrc > pdst))
+            src, dst = np.where(swap, dst, src), np.where(swap, src, dst)
+            psrc, pdst = np.where(swap, pdst, psrc), np.where(swap, psrc, pdst)
+        return zip(src.tolist(), psrc.tolist(), dst.tolist(), pdst.tolist(), df['protocol'].tolist())
+
+    def add(self, df):
+        """
+        Number of the flow of every packet of df, in timestamp order.
+        """
+        flows = self.flows
+        idle_timeout = self.idle_timeout
+        active_timeout = self.active_timeout
+        numbers = np.empty(len(df), dtype = np.int64)
+        for i, (key, timestamp) in enumerate(zip(self._keys(df), df['timestamp'].tolist())):
+            flow = flows.get(key)
+            if flow is None or timestamp - flow[2] > idle_timeout or timestamp - flow[1] > active_timeout:
+                if flow is not None:
+                    self.completed.append(flow[0])
+                self.nb_flows += 1
+                flow = [self.nb_flows, timestamp, timestamp]
+                flows[key] = flow
+            else:
+                flow[2] = timestamp
+            numbers[i] = flow[0]
+        return numbers
+
+    def expire(self, timestamp = np.inf):
+        """
+        Numbers of the flows completed since the last call, including the flows
+        that will not get any packet after timestamp, removed from the table.
+        """
+        for key, (number, first, last) in list(self.flows.items()):
+            if timestamp - last > self.idle_timeout or timestamp - first > self.active_timeout or timestamp == np.inf:
+                self.completed.append(number)
+                del self.flows[key]
+        completed = self.completed
+        self.completed = []
+        return completed
+
+def __flows(path, filename, bidirectional = False, idle_timeout = None, active_timeout = None):
+    """
+    Packets of filename sorted by flow, in the order of the capture within a flow,
+    with flow ids from 1, by pieces. Flows are numbered in the order of their
+    5-tuples (the lowest address first if bidirectional), or by a FlowTable in the
+    order they complete if a timeout is set: without timeouts no flow completes
+    before the end of the file, which is then read at once.
+    """
     print("opening", join(path, filename))
-    df = pd.read_csv(join(path, filename), names = ["packet_id", "timestamp", "iat", "src", "psrc", "dst", "pdst", "protocol", "length"], dtype={'packet_id': 'int', 'timestamp': 'float', 'iat': 'float', 'src': 'str', "psrc": 'int', 'dst':'str', 'pdst': 'int', 'protocol': 'int', 'length': 'int'},header = 0)
-    df['protocol'].replace('', np.nan, inplace = True) 
-    df = df.dropna(axis = 1)
-    df['flow_id'] = df.groupby(['src', 'psrc', 'dst', 'pdst', 'protocol']).ngroup()
-    df['flow_id'] = df['flow_id'].astype('int')
-    
-    print(df.shape)
-
-    # update flow_id to consecutive values
-    df = df.sort_values(by = ['flow_id'])
-    df.flow_id = df.flow_id.ne(df.flow_id.shift()).cumsum().add(first_flow_id).astype('int')
-    
-    r = df['flow_id'].max()
-    df.to_csv(join(outpath, filename), index = False)
+    if idle_timeout is None and active_timeout is None:
+        df = __read_packets(path, filename)
+        df = df.dropna(axis = 1)
+        flow_ids = __flow_ids(__lowest_first(df) if bidirectional else df)
+        print(df.shape)
+
+        order = np.argsort(flow_ids, kind = 'stable')
+        df = df.iloc[order]
+        df['flow_id'] = flow_ids[order] + 1
+        yield df
+        return
+
+    table = FlowTable(bidirectional, idle_timeout, active_timeout)
+    # packets of the flows not completed yet, by chunk
+    pending = []
+    nb_flows = 0
+    nb_packets = 0
+    chunks = __read_packet_chunks(path, filename)
+    while True:
+        df = next(chunks, None)
+        if df is not None:
+            df['flow_id'] = table.add(df)
+            pending.append(df)
+            nb_packets += len(df)
+        completed = table.expire(np.inf if df is None else df['timestamp'].max() if len(df) > 0 else -np.inf)
+        if df is None or len(completed) > 0:
+            # packets of the completed flows written, the others kept until their flow completes:
+            # only the chunks having packets of completed flows are split
+            done = []
+            _pending = []
+            for chunk in pending:
+                _done = chunk['flow_id'].isin(completed).to_numpy()
+                if _done.any():
+                    done.append(chunk[_done])
+                    chunk = chunk[~_done]
+                if len(chunk) > 0:
+                    _pending.append(chunk)
+            pending = _pending
+            flows = pd.concat(done) if len(done) > 0 else pd.DataFrame({c: [] for c in COLUMNS + ['flow_id']})
+            numbers, flow_ids = np.unique(flows['flow_id'].to_numpy(), return_inverse = True)
+            order = np.argsort(flow_ids, kind = 'stable')
+            flows = flows.iloc[order]
+            flows['flow_id'] = flow_ids[order] + nb_flows + 1
+            nb_flows += len(numbers)
+            yield flows
+        if df is None:
+            break
+    print((nb_packets, len(COLUMNS)), nb_flows, "flows")
+
+def __output_filename(outpath, filename):
+    return join(outpath, splitext(filename)[0] + ".csv" if filename.endswith(PCAP_EXTENSIONS) else filename)
+
+def __pkts2flow(path, outpath, filename, first_flow_id, **options):
+    r = first_flow_id
+    header = True
+    for df in __flows(path, filename, **options):
+        r = first_flow_id + df['flow_id'].max() if len(df) > 0 else r
+        df['flow_id'] += first_flow_id
+        df.to_csv(__output_filename(outpath, filename), index = False, header = header, mode = 'w' if header else 'a')
+        header = False
     return r
 
+def __sort_flows(path, outpath, filename, **options):
+    # kept in a temporary pickle until the first flow id of filename is known
+    nb_flows = 0
+    with open(__output_filename(outpath, filename) + ".pickle", "wb") as f:
+        for df in __flows(path, filename, **options):
+            nb_flows = df['flow_id'].max() if len(df) > 0 else nb_flows
+            pickle.dump(df, f)
+    return nb_flows
+
+def __pickled_flows(filename):
+    with open(filename, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+    remove(filename)
+
+def __write_flows(outpath, filename, first_flow_id):
+    header = True
+    for df in __pickled_flows(__output_filename(outpath, filename) + ".pickle"):
+        df['flow_id'] += first_flow_id
+        df.to_csv(__output_filename(outpath, filename), index = False, header = header, mode = 'w' if header else 'a')
+        header = False
+
+def pkts2flows(paths, output_path, first_flow_id = 0, jobs = 1, bidirectional = False, idle_timeout = None, active_timeout = None):
+    """
+    Add the flow_id column to the packets of every CSV or PCAP file of paths and
+    write them in output_path. Flow ids are consecutive over all the files, in
+    the order of the files, whatever the number of files processed in parallel.
+    With a timeout (in seconds), flows are assembled by a FlowTable reading the
+    packets by chunks. Returns the last flow id.
+    """
+    files = [(path, f) for path in paths for f in listdir(path) if "csv" in f or f.endswith(PCAP_EXTENSIONS)]
+    options = {'bidirectional': bidirectional, 'idle_timeout': idle_timeout, 'active_timeout': active_timeout}
+    if jobs <= 1 or len(files) <= 1:
+        for path, f in files:
+            first_flow_id = __pkts2flow(path, output_path, f, first_flow_id, **options)
+        return first_flow_id
+
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        nb_flows = list(executor.map(partial(__sort_flows, **options), [path for path, _ in files], [output_path] * len(files), [f for _, f in files]))
+        first_flow_ids = (first_flow_id + np.cumsum([0] + nb_flows[:-1])).tolist()
+        list(executor.map(__write_flows, [output_path] * len(files), [f for _, f in files], first_flow_ids))
+    return first_flow_id + sum(nb_flows)
+
 def main():    
     # change inputdir to the full name of the directory where the dataset CSV files are stored.
     paths = ["inputdir"]
     first_flow_id = 0
     # change outputdir to the full name of the directory where you want to store the new CSV files
     output_path = "outputdir"
-    
-    for path in paths:
-        for f in listdir(path):
-            if "csv" in f:
-                first_flow_id = __pkts2flow(path, output_path, f, first_flow_id)                
+    # number of files processed in parallel
+    jobs = cpu_count()
+    # set to True and/or to timeouts in seconds to assemble the flows with a FlowTable
+    bidirectional = False
+    idle_timeout = None
+    active_timeout = None
+
+    pkts2flows(paths, output_path, first_flow_id, jobs, bidirectional, idle_timeout, active_timeout)
  
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
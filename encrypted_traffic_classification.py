@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import gc
+import hashlib
 from os.path import isfile, join
 import os
 import io
 import json
 import pickle
+import re
 import sys
+import tempfile
 import time
 
 import seaborn as sns
@@ -20,17 +26,601 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, PolynomialFeatures
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import classification_report, f1_score, confusion_matrix, ConfusionMatrixDisplay
+from sklearn.metrics import accuracy_score, classification_report, f1_score, confusion_matrix, ConfusionMatrixDisplay
 from sklearn.model_selection import StratifiedKFold, train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 from sklearn.model_selection import GridSearchCV
 
-from xgboost import XGBClassifier        
+from artifact_store import ArtifactStore, data_hash
+from compiled_forest import CompiledForest
+from evaluation import Predictions, f1_scores, normalize_confusion_matrix
+from feature_binning import FeatureBins, load_feature_bins, save_feature_bins
+from switch_tables import compile_model
+from training_scheduler import TrainingScheduler
+from xgboost_training import QuantileTrainer
+
+# formats of the prepared folds: the flows are written once in a columnar file along with
+# the row indices of each fold, "pickle" writes the 4 historical pickle files per fold
+FOLD_STORAGES = ["parquet", "feather", "pickle"]
+# searches of the number of trees of RF_predict: every forest fitted, a forest per split grown with warm_start,
+# or the largest forest per split truncated to every number of trees
+RF_SEARCHES = ["grid", "warm_start", "truncation"]
+# iterations of GBoost_predict, stopped earlier on large folds when the validation loss no longer decreases
+GB_MAX_ITER = 500
+# name of the historical pickle files of the folds: <fold>_<X|y>_<train|test>_<prefix>_<nb packets>.pickle
+FOLD_PICKLE_PATTERN = re.compile(r'^(\d+)_(X|y)_(train|test)_(.+)\.pickle$')
 
 TICKS_LABEL_SIZE = 20
 FIGURES_LABEL_SIZE = 25
 FIGURES_LEGEND_SIZE = 14
 
+########################################
+# Flow features
+########################################
+# statistical features computed for each flow, in the order in which they are
+# added to the flows DataFrame
+FLOW_FEATURES = [
+    'nb_packets',
+    'min_iat',
+    'max_iat',
+    'sum_iat',
+    'mean_iat',
+    'median_iat',
+    'std_iat',
+    '1stQ_iat',
+    '3rdQ_iat',
+    'skew_iat',
+    'kurt_iat',
+    'min_length',
+    'max_length',
+    'sum_length',
+    'median_length',
+    'mean_length',
+    'std_length',
+    '1stQ_length',
+    '3rdQ_length',
+    'skew_length',
+    'kurt_length'
+]
+# version of the flows extracted from the data files, to increase when the features or the
+# way they are computed change so that the flows cached by _map_files are extracted again
+FLOW_FEATURES_VERSION = 2
+# widths compared by fixed_point_report, None for the float64 features
+FIXED_POINT_WIDTHS = [None, 32, 16, 12, 8]
+
+def _flows_sum(values, starts, counts):
+    # same pairwise summation as numpy (and pandas), vectorized over flows
+    result = np.zeros(len(counts), dtype = np.float64)
+    small = np.flatnonzero(counts < 8)
+    for j in range(7):
+        _m = small[counts[small] > j]
+        result[_m] += values[starts[_m] + j]
+    medium = np.flatnonzero((counts >= 8) & (counts <= 128))
+    if len(medium) > 0:
+        _starts = starts[medium]
+        _counts = counts[medium]
+        _blocks = _counts - _counts % 8
+        r = values[_starts[:, None] + np.arange(8)]
+        for i in range(8, 128, 8):
+            _m = np.flatnonzero(_blocks > i)
+            r[_m] += values[_starts[_m, None] + i + np.arange(8)]
+        res = ((r[:, 0] + r[:, 1]) + (r[:, 2] + r[:, 3])) + ((r[:, 4] + r[:, 5]) + (r[:, 6] + r[:, 7]))
+        for j in range(7):
+            _m = np.flatnonzero(_counts % 8 > j)
+            res[_m] += values[_starts[_m] + _blocks[_m] + j]
+        result[medium] = res
+    large = np.flatnonzero(counts > 128)
+    if len(large) > 0:
+        n2 = counts[large] // 2
+        n2 -= n2 % 8
+        result[large] = _flows_sum(values, starts[large], n2) + _flows_sum(values, starts[large] + n2, counts[large] - n2)
+    return result
+
+def _flows_quantile(values, starts, counts, q):
+    # same linear interpolation as np.quantile, values must be sorted within each flow
+    virtual_indexes = (counts - 1) * q
+    previous_indexes = np.floor(virtual_indexes)
+    gamma = virtual_indexes - previous_indexes
+    previous_indexes = previous_indexes.astype(np.int64)
+    next_indexes = np.minimum(previous_indexes + 1, counts - 1)
+    a = values[starts + previous_indexes]
+    b = values[starts + next_indexes]
+    diff_b_a = b - a
+    result = a + diff_b_a * gamma
+    above = gamma >= 0.5
+    result[above] = (b - diff_b_a * (1 - gamma))[above]
+    return result
+
+def _flows_median(values, starts, counts):
+    # same as np.median, values must be sorted within each flow
+    a = values[starts + (counts - 1) // 2]
+    b = values[starts + counts // 2]
+    return np.where(counts % 2 == 1, a, (a + b) / 2)
+
+def _flows_moments(values, starts, counts):
+    # same computation as pandas (sum, mean, std) and scipy.stats (skew, kurtosis)
+    total = _flows_sum(values, starts, counts)
+    mean = total / counts
+    deviation = values - np.repeat(mean, counts)
+    squares = deviation ** 2
+    m2 = _flows_sum(squares, starts, counts) / counts
+    m3 = _flows_sum(squares * deviation, starts, counts) / counts
+    m4 = _flows_sum(squares ** 2, starts, counts) / counts
+    std = np.sqrt(m2)
+    with np.errstate(all = 'ignore'):
+        zero = m2 <= (np.finfo(np.float64).eps * mean) ** 2
+        # scalar powers as in scipy, the vectorized ones may differ on the last bit
+        _skew = np.where(zero, np.nan, m3 / np.array([m ** 1.5 for m in m2.tolist()], dtype = np.float64))
+        _kurt = np.where(zero, np.nan, m4 / np.array([m ** 2.0 for m in m2.tolist()], dtype = np.float64)) - 3
+    return total, mean, std, _skew, _kurt
+
+def _flows_describe(values, starts, counts, suffix):
+    # values are grouped by flow, starts/counts delimit each flow
+    features = {}
+    _values = values.astype(np.float64)
+    total, mean, std, _skew, _kurt = _flows_moments(_values, starts, counts)
+    features['min_' + suffix] = np.minimum.reduceat(values, starts)
+    features['max_' + suffix] = np.maximum.reduceat(values, starts)
+    features['sum_' + suffix] = np.add.reduceat(values, starts) if np.issubdtype(values.dtype, np.integer) else total
+    features['mean_' + suffix] = mean
+    features['std_' + suffix] = std
+    # sort each flow by value for median and quartiles
+    flow_index = np.repeat(np.arange(len(counts)), counts)
+    _sorted = _values[np.lexsort((_values, flow_index))]
+    features['median_' + suffix] = _flows_median(_sorted, starts, counts)
+    features['1stQ_' + suffix] = _flows_quantile(_sorted, starts, counts, 0.25)
+    features['3rdQ_' + suffix] = _flows_quantile(_sorted, starts, counts, 0.75)
+    features['skew_' + suffix] = _skew
+    features['kurt_' + suffix] = _kurt
+    return features
+
+def _fixed_point_dtype(bits):
+    return np.int16 if bits <= 16 else np.int32 if bits <= 32 else np.int64
+
+def _saturate(values, bits):
+    # signed integers of bits bits, saturated as a counter of the data plane
+    high = (1 << (bits - 1)) - 1
+    return np.clip(values, -high - 1, high).astype(_fixed_point_dtype(bits))
+
+def _microseconds(iat):
+    return np.round(np.clip(iat, -2.0 ** 62, 2.0 ** 62) * 1e6).astype(np.int64)
+
+def _flows_describe_fixed(values, starts, counts, suffix, bits):
+    # same as _flows_describe with the integer arithmetic of a data plane on integer values, all saturated
+    # to bits bits: with n packets rounded up to 2^s, mean = sum >> s and variance = sumsq >> s - mean^2
+    # (never negative as 2^s >= n, exact but for the shifts when n is a power of 2), std is the integer
+    # square root of the variance, quartiles and median are the lower values. skew and kurtosis divide by
+    # powers of std, not computed by a data plane: they are 0
+    features = {}
+    values = np.clip(values, -(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+    # 2^s, s the number of bits of n - 1
+    divisor = 2.0 ** np.frexp((counts - 1).astype(np.float64))[1]
+    _values = values.astype(np.float64)
+    total = np.add.reduceat(_values, starts)
+    mean = np.floor(total / divisor)
+    variance = np.floor(np.add.reduceat(_values * _values, starts) / divisor) - mean * mean
+    features['min_' + suffix] = _saturate(np.minimum.reduceat(values, starts), bits)
+    features['max_' + suffix] = _saturate(np.maximum.reduceat(values, starts), bits)
+    features['sum_' + suffix] = _saturate(total, bits)
+    features['mean_' + suffix] = _saturate(mean, bits)
+    features['std_' + suffix] = _saturate(np.floor(np.sqrt(variance)), bits)
+    flow_index = np.repeat(np.arange(len(counts)), counts)
+    _sorted = values[np.lexsort((values, flow_index))]
+    features['median_' + suffix] = _saturate(_sorted[starts + (counts - 1) // 2], bits)
+    features['1stQ_' + suffix] = _saturate(_sorted[starts + (counts - 1) // 4], bits)
+    features['3rdQ_' + suffix] = _saturate(_sorted[starts + 3 * (counts - 1) // 4], bits)
+    features['skew_' + suffix] = _saturate(np.zeros(len(counts)), bits)
+    features['kurt_' + suffix] = _saturate(np.zeros(len(counts)), bits)
+    return features
+
+def _saturate_min_iat(min_iat, bits, in_microseconds = True):
+    # min_iat of flows without positive iat is 0
+    min_iat = np.nan_to_num(np.asarray(min_iat, dtype = np.float64))
+    return _saturate(min_iat if in_microseconds else _microseconds(min_iat), bits)
+
+def get_flows_statistical_features_per_prefix(df, nb_packets, sort_by = None, min_iat_per_flow = False, fixed_point = None):
+    """
+    Compute the statistical features of the first n packets of every flow of df for
+    every n of nb_packets. Packets are grouped and ordered by flow once, and each
+    prefix is then a truncation of this ordering. Returns a dict n -> DataFrame, each
+    DataFrame as returned by get_flows_statistical_features.
+    fixed_point: number of bits of the features computed as a data plane would, from
+    iat in microseconds (_flows_describe_fixed), None for float64 features
+    """
+    codes, _ = pd.factorize(df['flow_id'], sort = False)
+    valid = codes >= 0
+    if not valid.any():
+        d = df.iloc[0:0].copy()
+        for feature in FLOW_FEATURES:
+            d[feature] = np.nan
+        return {n: d.copy() for n in nb_packets}
+    if sort_by is None:
+        order = np.argsort(codes[valid], kind = 'stable')
+    else:
+        order = np.lexsort((df[sort_by].to_numpy()[valid], codes[valid]))
+    order = np.flatnonzero(valid)[order]
+    codes = codes[order]
+
+    counts = np.bincount(codes)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    first_packets = order[starts]
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+
+    iat = df['iat'].to_numpy(dtype = np.float64)
+    length = df['length']
+    if pd.api.types.is_integer_dtype(length.dtype):
+        length = length.to_numpy(dtype = np.int64)
+    else:
+        length = length.to_numpy(dtype = np.float64)
+    if not min_iat_per_flow:
+        min_iat = np.min(df[df['iat'] > 0]['iat'])
+    if fixed_point is not None:
+        iat = _microseconds(iat)
+        length = np.round(length).astype(np.int64)
+        describe = partial(_flows_describe_fixed, bits = fixed_point)
+    else:
+        describe = _flows_describe
+    first = df.iloc[first_packets]
+
+    flows = {}
+    all_packets = None
+    for n in nb_packets:
+        # prefixes longer than every flow all give the same features
+        full = n >= counts.max()
+        if full and all_packets is not None:
+            flows[n] = all_packets.copy()
+            continue
+        # keep only the first n packets of each flow
+        _order = order if full else order[rank < n]
+        _counts = np.minimum(counts, n)
+        _starts = np.concatenate(([0], np.cumsum(_counts)[:-1]))
+
+        features = {'nb_packets': _counts.astype(np.int64)}
+        _iat = iat[_order]
+        iat_features = describe(_iat, _starts, _counts, 'iat')
+        if min_iat_per_flow:
+            _min = np.minimum.reduceat(np.where(_iat > 0, _iat, np.inf), _starts)
+            iat_features['min_iat'] = np.where(np.isinf(_min), np.nan, _min)
+        else:
+            iat_features['min_iat'] = np.full(len(_counts), min_iat, dtype = np.float64)
+        if fixed_point is not None:
+            features['nb_packets'] = _saturate(features['nb_packets'], fixed_point)
+            iat_features['min_iat'] = _saturate_min_iat(iat_features['min_iat'], fixed_point, min_iat_per_flow)
+        features.update(iat_features)
+        features.update(describe(length[_order], _starts, _counts, 'length'))
+
+        d = first.copy()
+        for feature in FLOW_FEATURES:
+            d[feature] = features[feature]
+        flows[n] = d
+        if full:
+            all_packets = d.copy()
+    return flows
+
+def get_flows_statistical_features(df, n, sort_by = None, min_iat_per_flow = False, fixed_point = None):
+    """
+    Compute the statistical features of the first n packets of every flow of df in a
+    single pass. Flows are returned in order of first appearance in df, each one
+    represented by its first packet followed by the FLOW_FEATURES columns.
+    sort_by: column used to order the packets inside a flow, default is the order of df
+    min_iat_per_flow: if False min_iat is the minimum positive iat of the whole df
+    fixed_point: number of bits of the integer features, None for float64 features
+    """
+    return get_flows_statistical_features_per_prefix(df, [n], sort_by, min_iat_per_flow, fixed_point)[n]
+
+########################################
+# Flow records
+########################################
+class FlowRecords():
+    """
+    Accumulate flows (one row per flow) in typed NumPy columns growing geometrically,
+    the DataFrame is built only once by to_frame(). Flows are appended as DataFrames,
+    whose index and columns are kept, or as dicts column -> value(s).
+    """
+    def __init__(self, capacity = 1024):
+        self.capacity = capacity
+        self.size = 0
+        self.index = np.empty(capacity, dtype = np.int64)
+        self.columns = {}
+        # pandas dtype of each column, None if it changed between flows
+        self.dtypes = {}
+        # type of the last scalar stored in each column
+        self.types = {}
+
+    def __len__(self):
+        return self.size
+
+    def __reserve(self, nb_rows):
+        if self.size + nb_rows <= self.capacity:
+            return
+        while self.capacity < self.size + nb_rows:
+            self.capacity *= 2
+        self.index = self.__grow(self.index)
+        for name in self.columns:
+            self.columns[name] = self.__grow(self.columns[name])
+
+    def __grow(self, column):
+        _column = np.empty(self.capacity, dtype = column.dtype)
+        _column[:self.size] = column[:self.size]
+        return _column
+
+    def __store(self, column, values):
+        # upcast the column as pd.concat would do, nullable pandas dtypes are kept as objects
+        if values.dtype != column.dtype:
+            _dtype = np.promote_types(column.dtype, values.dtype) if column.dtype != object and values.dtype != object else np.dtype(object)
+            if _dtype != column.dtype:
+                column = column.astype(_dtype)
+        column[self.size:self.size + len(values)] = values
+        return column
+
+    def __store_values(self, name, values):
+        dtype = values.dtype
+        if not isinstance(dtype, np.dtype):
+            values = values.to_numpy(dtype = object)
+        elif isinstance(values, pd.Series):
+            values = values.to_numpy()
+        elif dtype.kind in 'SU':
+            # strings are stored as objects, as pandas does
+            values = values.astype(object)
+        if name not in self.columns:
+            if self.size > 0:
+                # the flows already appended do not have this column
+                column = np.empty(self.capacity, dtype = np.float64)
+                column[:self.size] = np.nan
+            else:
+                column = np.empty(self.capacity, dtype = values.dtype)
+            self.columns[name] = column
+            self.dtypes[name] = dtype
+        elif self.dtypes[name] != dtype:
+            self.dtypes[name] = None
+        self.columns[name] = self.__store(self.columns[name], values)
+
+    def __store_missing(self, names, nb_rows):
+        for name in self.columns:
+            if name not in names:
+                self.columns[name] = self.__store(self.columns[name], np.full(nb_rows, np.nan))
+                self.types.pop(name, None)
+
+    def __append_row(self, row, index):
+        self.__reserve(1)
+        self.index = self.__store(self.index, np.asarray([index]))
+        for name, v in row.items():
+            if self.types.get(name) is type(v):
+                # same type as the previous flow, the column can already hold it
+                self.columns[name][self.size] = v
+            else:
+                self.__store_values(name, np.asarray([v]))
+                self.types[name] = type(v)
+        if len(row) != len(self.columns):
+            self.__store_missing(row, 1)
+        self.size += 1
+
+    def append(self, flows, index = None):
+        if not isinstance(flows, pd.DataFrame):
+            if all(np.isscalar(v) for v in flows.values()):
+                self.__append_row(flows, self.size if index is None else index)
+                return
+            flows = {name: np.asarray(v).reshape(-1) for name, v in flows.items()}
+            nb_rows = len(next(iter(flows.values()))) if len(flows) > 0 else 0
+        else:
+            nb_rows = len(flows)
+            if index is None:
+                index = flows.index.to_numpy()
+        if index is None:
+            index = np.arange(self.size, self.size + nb_rows)
+        self.__reserve(nb_rows)
+        self.index = self.__store(self.index, np.broadcast_to(np.asarray(index), nb_rows))
+        for name in (flows.columns if isinstance(flows, pd.DataFrame) else flows):
+            self.__store_values(name, flows[name])
+            self.types.pop(name, None)
+        self.__store_missing(flows, nb_rows)
+        self.size += nb_rows
+
+    def to_frame(self):
+        df = pd.DataFrame({name: column[:self.size] for name, column in self.columns.items()}, index = self.index[:self.size])
+        # restore the nullable pandas dtypes
+        for name, dtype in self.dtypes.items():
+            if dtype is not None and not isinstance(dtype, np.dtype):
+                df[name] = df[name].astype(dtype)
+        return df
+
+########################################
+# Streaming of packets
+########################################
+# number of partitions of the packets spilled to disk, and of the partitions still too big
+NB_PARTITIONS = 16
+
+def read_csv_chunks(f, chunksize, **kwargs):
+    """
+    Packets of the CSV file f by DataFrames of at most chunksize rows, indexed as
+    when the whole file is read at once. kwargs are passed to pd.read_csv.
+    """
+    with pd.read_csv(f, chunksize = chunksize, **kwargs) as reader:
+        for chunk in reader:
+            yield chunk
+
+def _spill_partitions(pieces, directory, name, level):
+    # write the packets of pieces in NB_PARTITIONS files, all the packets of a flow in the same file
+    filenames = [join(directory, name + "_" + str(k)) for k in range(NB_PARTITIONS)]
+    sizes = [0] * NB_PARTITIONS
+    handles = [open(filename, 'wb') for filename in filenames]
+    try:
+        for positions, chunk in pieces:
+            hashes = pd.util.hash_pandas_object(chunk['flow_id'], index = False).to_numpy()
+            partitions = (hashes // (NB_PARTITIONS ** level)) % NB_PARTITIONS
+            for k in range(NB_PARTITIONS):
+                # empty pieces are kept for every partition to have the dtypes of the whole file
+                _m = partitions == k
+                piece = chunk[_m]
+                pickle.dump((positions[_m], piece), handles[k])
+                sizes[k] += piece.memory_usage(deep = True).sum()
+    finally:
+        for handle in handles:
+            handle.close()
+    return list(zip(filenames, sizes))
+
+def _load_partition(filename):
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+    os.remove(filename)
+
+def _flows_of_partitions(partitions, directory, nb_packets, sort_by, memory_budget, level, parent_size = np.inf, fixed_point = None):
+    # flows of every partition with the position in the file of their first packet
+    for filename, size in partitions:
+        if size > memory_budget and size < parent_size:
+            # split again the partitions too big, unless they are made of a single huge flow
+            sub_partitions = _spill_partitions(_load_partition(filename), directory, os.path.basename(filename), level + 1)
+            yield from _flows_of_partitions(sub_partitions, directory, nb_packets, sort_by, memory_budget, level + 1, size, fixed_point)
+            continue
+        positions, chunks = zip(*_load_partition(filename))
+        df = pd.concat(chunks)
+        positions = np.concatenate(positions)
+        del chunks
+        first = (~df['flow_id'].duplicated() & df['flow_id'].notna()).to_numpy()
+        yield positions[first], get_flows_statistical_features_per_prefix(df, nb_packets, sort_by, True, fixed_point)
+
+def get_flows_statistical_features_from_chunks(chunks, nb_packets, memory_budget = None, sort_by = None, min_iat_per_flow = False, fixed_point = None):
+    """
+    Same as get_flows_statistical_features_per_prefix on the concatenation of chunks,
+    holding about memory_budget bytes of packets in memory. Once the packets read are
+    above memory_budget they are spilled to disk in partitions of complete flows,
+    processed one at a time, and the flows are merged back in order of first appearance.
+    """
+    min_iat = np.nan
+    def read(chunk):
+        nonlocal min_iat
+        if not min_iat_per_flow:
+            # minimum positive iat of all the packets
+            _min = chunk.loc[chunk['iat'] > 0, 'iat'].min()
+            min_iat = _min if np.isnan(min_iat) else min(min_iat, _min)
+        return chunk
+
+    chunks = iter(chunks)
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(read(chunk))
+        pending_size += chunk.memory_usage(deep = True).sum()
+        if memory_budget is not None and pending_size > memory_budget:
+            break
+    else:
+        # all the packets fit in memory
+        return get_flows_statistical_features_per_prefix(pd.concat(pending), nb_packets, sort_by, min_iat_per_flow, fixed_point)
+
+    def pieces():
+        position = 0
+        while len(pending) > 0:
+            chunk = pending.pop(0)
+            yield np.arange(position, position + len(chunk)), chunk
+            position += len(chunk)
+        for chunk in chunks:
+            yield np.arange(position, position + len(chunk)), read(chunk)
+            position += len(chunk)
+
+    first_packets = []
+    flows = {n: [] for n in nb_packets}
+    with tempfile.TemporaryDirectory() as directory:
+        partitions = _spill_partitions(pieces(), directory, "packets", 0)
+        for _first_packets, _flows in _flows_of_partitions(partitions, directory, nb_packets, sort_by, memory_budget, 0, fixed_point = fixed_point):
+            first_packets.append(_first_packets)
+            for n in nb_packets:
+                flows[n].append(_flows[n])
+    # partitions without flows would change the dtypes of the features
+    partitions = [k for k in range(len(first_packets)) if len(first_packets[k]) > 0] or [0]
+    order = np.argsort(np.concatenate([first_packets[k] for k in partitions]), kind = 'stable')
+    for n in nb_packets:
+        d = pd.concat([flows[n][k] for k in partitions]).iloc[order]
+        if not min_iat_per_flow:
+            d['min_iat'] = np.full(len(d), min_iat, dtype = np.float64)
+            if fixed_point is not None:
+                d['min_iat'] = _saturate_min_iat(d['min_iat'], fixed_point, False)
+        flows[n] = d
+    return flows
+
+########################################
+# Fold views
+########################################
+class FoldViews(MutableMapping):
+    """
+    Train or test sets by (nb packets, fold) built by load(i) only when a fold is
+    read. The last fold read is kept, the folds set explicitly are stored as is.
+    version(i) identifies the data load(i) returns without loading it.
+    """
+    def __init__(self, load, keys, version = None):
+        self.__load = load
+        self.__version = version
+        self.__keys = list(keys)
+        self.__values = {}
+        self.__dropped = []
+        self.__last = None, None
+
+    def __getitem__(self, i):
+        if i in self.__values:
+            return self.__values[i]
+        if i not in self.__keys:
+            raise KeyError(i)
+        if self.__last[0] != i:
+            df = self.__load(i)
+            if len(self.__dropped) > 0:
+                df = df.drop([c for c in self.__dropped if c in df.columns], axis = 1)
+            self.__last = i, df
+        return self.__last[1]
+
+    def __setitem__(self, i, df):
+        if i not in self.__keys:
+            self.__keys.append(i)
+        self.__values[i] = df
+
+    def __delitem__(self, i):
+        self.__keys.remove(i)
+        self.__values.pop(i, None)
+        if self.__last[0] == i:
+            self.__last = None, None
+
+    def __iter__(self):
+        return iter(list(self.__keys))
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def version(self, i):
+        # None for the folds set explicitly
+        if i in self.__values or self.__version is None:
+            return None
+        return self.__version(i), tuple(self.__dropped)
+
+    def drop_columns(self, columns):
+        # applied to the folds read from now on
+        self.__dropped += [c for c in columns if c not in self.__dropped]
+        self.__last = None, None
+        for i, df in self.__values.items():
+            self.__values[i] = df.drop([c for c in columns if c in df.columns], axis = 1)
+
+########################################
+# Parallel processing of files
+########################################
+def _process_file(function, f):
+    # function returns the number of flows extracted from f and its result
+    start_time = time.time()
+    nb_flows, result = function(f)
+    return os.getpid(), nb_flows, time.time() - start_time, result
+
+def _flows_of(result, nb_packets):
+    # result of an extraction restricted to the numbers of packets nb_packets: its flows {n: flows} are the result or its last item
+    if isinstance(result, dict):
+        return {n: result[n] for n in nb_packets}
+    return result[:-1] + (_flows_of(result[-1], nb_packets),)
+
+def _merge_flows(results):
+    # result of extractions of different numbers of packets of a file, with the flows of all of them
+    if isinstance(results[0], dict):
+        return {n: flows for result in results for n, flows in result.items()}
+    return results[0][:-1] + (_merge_flows([result[-1] for result in results]),)
+
 ########################################
 # Iterator
 ########################################
@@ -73,7 +663,28 @@ class EncryptedTrafficClassifier:
         self.nb_packets_per_flow = nb_packets_per_flow
 
         self.force_rf_classification = False
+        # one of RF_SEARCHES, with the seconds each split of the warm_start search may use (None for no limit)
+        self.rf_search = "grid"
+        self.rf_search_time_budget = None
         self.features_used = []
+        # number of processes used to extract flows from the data files and to train the models
+        self.jobs = 1
+        # data files are read by chunks of chunksize packets, spilled to disk once the packets
+        # of a file are above memory_budget bytes (in each process)
+        self.chunksize = 1000000
+        self.memory_budget = 2 * 1024 * 1024 * 1024
+        # format used by _generate_data_folds, one of FOLD_STORAGES
+        self.fold_storage = "feather"
+        # flows extracted from each data file are cached in cache_dir, None to disable
+        self.cache_dir = self.processed_data_output_dir + "cache/"
+        # number of bits of the integer features computed as a data plane would, None for float64 features
+        self.fixed_point = None
+        # flows and folds read from the columnar files, by filename
+        self.flows_tables = {}
+        self.folds_indexes = {}
+        # features of the folds replaced by their uint8 codes in at most 256 bins fitted on the train flows of every fold (FeatureBins)
+        self.binned = False
+        self.feature_bins = {}
         
         self.results_filename = "results/results_" + self.filename_prefix + "_" + str(int(time.time())) + ".csv"        
         if isfile(self.results_filename):
@@ -98,35 +709,290 @@ class EncryptedTrafficClassifier:
         self.random_seed = 42
 
         self.classification_results = pd.DataFrame()
+        # predictions of RF_predict, GBoost_predict and XGBoost_predict ('rf', 'gb', 'xg')
+        self.predictions = {}
 
-    def __set_rf_pickle_filename(self):
-        self.rf_output = {}
-        feats = "none"
-        if self.features_used != None:            
-            feats = '_'.join(self.features_used)
-        for pkt in self.nb_packets_per_flow:
-            _p = str(pkt)
-            if pkt == 600000:
-                _p = "all"
-            self.rf_output[pkt] = "results/rf_" + self.filename_prefix + "_p" + _p + "_f" + str(self.nb_folds) + "_feats" + str(len(feats)) + ".pickle"
-
-    def __set_xg_pickle_filename(self):                   
-        self.xg_output = {}
-        feats = '_'.join(self.features_used)
-        for pkt in self.nb_packets_per_flow:
-            _p = str(pkt)
-            if pkt == 600000:
-                _p = "all"
-            self.xg_output[pkt] = "results/xg_" + self.filename_prefix + "_p" + _p + "_f" + str(self.nb_folds) + "_feats_" + str(len(feats)) + ".pickle"
+    def __artifact_store(self, model):
+        # artifacts of every (pkt, fold) of RF_predict ('rf'), GBoost_predict ('gb') or XGBoost_predict ('xg')
+        return ArtifactStore("results/" + model + "_" + self.filename_prefix + "/")
+
+    def __data_version(self, i, X_train, y_train, X_test, y_test):
+        # version of the data of fold i for the artifact keys: the files of the folds read from them,
+        # without loading them, a hash of the flows otherwise
+        folds = [X_train, y_train, X_test, y_test]
+        versions = [d.version(i) if isinstance(d, FoldViews) else None for d in folds]
+        if all(v is not None for v in versions):
+            return versions
+        return data_hash(*[d[i] for d in folds])
+
+    def _files_hashes(self, files):
+        # sha256 of the content of files, only read again when their size or modification time changed (kept in cache_dir)
+        filename = None if self.cache_dir is None else self.cache_dir + "files.json"
+        hashes = {}
+        if filename is not None and isfile(filename):
+            with open(filename) as f:
+                hashes = json.load(f)
+        result = []
+        for f in files:
+            stat = os.stat(f)
+            h = hashes.get(f)
+            if h is None or h[0] != stat.st_size or h[1] != stat.st_mtime_ns:
+                sha = hashlib.sha256()
+                with open(f, "rb") as _f:
+                    for block in iter(partial(_f.read, 1024 * 1024), b""):
+                        sha.update(block)
+                h = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+                hashes[f] = h
+            result.append(h[2])
+        if filename is not None:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            with open(filename + ".tmp", "w") as f:
+                json.dump(hashes, f)
+            os.replace(filename + ".tmp", filename)
+        return result
+
+    def _cache_key(self, function, f, content_hash, n):
+        """
+        Everything the flows of n packets extracted by function from the data file f
+        depend on: its content, the version of the features, n and the width of the
+        fixed-point features, but not the other numbers of packets extracted.
+        """
+        name = function.func.__qualname__
+        keywords = sorted((k, v) for k, v in function.keywords.items() if k != 'nb_packets')
+        key = (FLOW_FEATURES_VERSION, self.filename_prefix, name, keywords, n, f, content_hash)
+        if self.fixed_point is not None:
+            key += (self.fixed_point,)
+        return repr(key)
+
+    def _map_files(self, function, files):
+        """
+        Apply function, a partial of an extraction with the keyword nb_packets, to
+        every file, in a pool of self.jobs processes if self.jobs > 1. function(f)
+        returns the number of flows of f and its result, whose flows {n: flows} are
+        the result or its last item. Results are returned in the order of files
+        whatever the order in which the workers complete, so that the flows and the
+        folds do not depend on self.jobs. The flows of every number of packets are
+        cached by _cache_key in self.cache_dir: only the new or modified files, and
+        the numbers of packets not extracted yet, are processed again.
+        """
+        start_time = time.time()
+        nb_packets = list(function.keywords['nb_packets'])
+        results = {f: {} for f in files}
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            cache_filenames = {(f, n): self.cache_dir + hashlib.sha256(self._cache_key(function, f, h, n).encode()).hexdigest() + ".pickle" for f, h in zip(files, self._files_hashes(files)) for n in nb_packets}
+            for f in files:
+                for n in nb_packets:
+                    if isfile(cache_filenames[(f, n)]):
+                        with open(cache_filenames[(f, n)], "rb") as _f:
+                            results[f][n] = pickle.load(_f)
+            print("  flows of %d (file, nb packets) of %d read from the cache" % (sum(len(results[f]) for f in files), len(cache_filenames)))
+        # numbers of packets to extract from every file
+        missing = {f: [n for n in nb_packets if n not in results[f]] for f in files}
+        files_to_process = [f for f in files if len(missing[f]) > 0]
+        functions = [partial(function.func, *function.args, **dict(function.keywords, nb_packets = missing[f])) for f in files_to_process]
+
+        if self.jobs > 1 and len(files_to_process) > 1:
+            with ProcessPoolExecutor(max_workers = self.jobs) as executor:
+                outputs = list(executor.map(_process_file, functions, files_to_process))
+        else:
+            outputs = [_process_file(_function, f) for _function, f in zip(functions, files_to_process)]
+
+        workers = {}
+        for f, (pid, nb_flows, duration, result) in zip(files_to_process, outputs):
+            _files, _flows, _duration = workers.get(pid, (0, 0, 0))
+            workers[pid] = (_files + 1, _flows + nb_flows, _duration + duration)
+            for n in missing[f]:
+                results[f][n] = _flows_of(result, [n])
+                if self.cache_dir is not None:
+                    with open(cache_filenames[(f, n)] + ".tmp", "wb") as _f:
+                        pickle.dump(results[f][n], _f)
+                    os.replace(cache_filenames[(f, n)] + ".tmp", cache_filenames[(f, n)])
+        for pid, (_files, _flows, _duration) in workers.items():
+            print("  worker %d: %d files, %d flows in %.2f seconds (%.0f flows/s)" % (pid, _files, _flows, _duration, _flows / max(_duration, 1e-9)))
+        print("  %d files processed by %d workers in " % (len(files_to_process), len(workers)), time.time() - start_time, "seconds.")
+        return [_merge_flows([results[f][n] for n in nb_packets]) for f in files]
 
     def _pickle_dump(self, df, filename):
         with open(self.processed_data_output_dir + filename, "wb") as f:
             pickle.dump(df, f)
             
-    def _load_pickle(self, filename):
-        with open(self.processed_data_output_dir + filename, 'rb') as f:
-            df = pickle.load(f)
-            return df.fillna(0)
+    def _load_pickle(self, filename, binned = None):
+        # folds written in a columnar file by _generate_data_folds, the features binned if binned (self.binned by default)
+        m = FOLD_PICKLE_PATTERN.match(filename)
+        binned = (self.binned if binned is None else binned) and m is not None and m.group(2) == "X"
+        if m is not None and self._flows_stored(m.group(4) + ".pickle"):
+            fold, Xy, split, name = m.groups()
+            df = self._load_fold(name + ".pickle", int(fold), Xy, split).fillna(0)
+        else:
+            with open(self.processed_data_output_dir + filename, 'rb') as f:
+                df = pickle.load(f).fillna(0)
+        if binned:
+            return self._feature_bins(m.group(4) + ".pickle", int(m.group(1))).transform(df)
+        return df
+
+    def _flows_filenames(self, filename):
+        # filename is the suffix of the historical pickle files of the folds, e.g. iscxvpn2016_4.pickle
+        stem = self.processed_data_output_dir + filename[:-len(".pickle")]
+        return {storage: stem + "_flows." + storage for storage in FOLD_STORAGES}, stem + "_folds.npz"
+
+    def _bins_filename(self, filename):
+        return self.processed_data_output_dir + filename[:-len(".pickle")] + "_bins.npz"
+
+    def _flows_stored(self, filename):
+        flows_filenames, folds_filename = self._flows_filenames(filename)
+        return isfile(folds_filename) and any(isfile(f) for f in flows_filenames.values())
+
+    def _remove_stored_flows(self, filename):
+        flows_filenames, folds_filename = self._flows_filenames(filename)
+        for f in list(flows_filenames.values()) + [folds_filename, self._bins_filename(filename)]:
+            if isfile(f):
+                os.remove(f)
+        self.flows_tables.pop(filename, None)
+        self.folds_indexes.pop(filename, None)
+        self.feature_bins.pop(filename, None)
+
+    def _store_flows(self, df, filename, folds):
+        """
+        Write the flows once in the format self.fold_storage, and the row indexes
+        of every fold in a .npz file.
+        """
+        self._remove_stored_flows(filename)
+        flows_filenames, folds_filename = self._flows_filenames(filename)
+        try:
+            if self.fold_storage == "parquet":
+                df.to_parquet(flows_filenames["parquet"])
+            else:
+                # not compressed to be memory mapped by _load_fold
+                df.to_feather(flows_filenames["feather"], compression = "uncompressed")
+        except (ImportError, ValueError, TypeError) as e:
+            # pyarrow missing or column not supported (e.g. objects of different types)
+            print("  cannot write", flows_filenames[self.fold_storage], e, "using pickle")
+            with open(flows_filenames["pickle"], "wb") as f:
+                pickle.dump(df, f)
+        self._store_folds(filename, folds)
+
+    def _store_folds(self, filename, folds):
+        _, folds_filename = self._flows_filenames(filename)
+        indexes = {}
+        for _i, (train_index, test_index) in enumerate(folds):
+            indexes["train_" + str(_i)] = train_index.astype(np.int32)
+            indexes["test_" + str(_i)] = test_index.astype(np.int32)
+        np.savez(folds_filename, **indexes)
+
+    def _store_flows_by_chunks(self, chunks, filename, dtypes):
+        """
+        Same as _generate_data_folds on the concatenation of chunks without holding
+        it in memory: the chunks are written in the columnar file of
+        self.fold_storage (feather or parquet) each time they are above
+        self.memory_budget bytes, and the folds are split from the classes only.
+        dtypes: dtypes of the columns (DataFrame.astype) given to every chunk, the
+        dtypes inferred for a chunk of a CSV file depending on its values.
+        """
+        print("_store_flows_by_chunks")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        start_time = time.time()
+        self._remove_stored_flows(filename)
+        flows_filenames, _ = self._flows_filenames(filename)
+        writer = None
+        schema = None
+        pending = []
+        pending_size = 0
+        y = []
+        def write():
+            nonlocal writer, schema
+            # the index is written as a column, the RangeIndex of every batch being different
+            table = pa.Table.from_pandas(pd.concat(pending), preserve_index = True)
+            if writer is None:
+                schema = table.schema
+                if self.fold_storage == "parquet":
+                    writer = pq.ParquetWriter(flows_filenames["parquet"], schema)
+                else:
+                    # not compressed to be memory mapped by _load_fold
+                    writer = pa.ipc.new_file(flows_filenames["feather"], schema)
+            writer.write_table(table.cast(schema))
+        for chunk in chunks:
+            chunk = chunk.astype(dtypes)
+            y.append(chunk['type'].to_numpy())
+            pending.append(chunk)
+            pending_size += chunk.memory_usage(deep = True).sum()
+            if pending_size > self.memory_budget:
+                write()
+                pending = []
+                pending_size = 0
+        if len(pending) > 0 or writer is None:
+            write()
+        writer.close()
+        y = np.concatenate(y)
+        skf = StratifiedKFold(n_splits = self.nb_folds, shuffle = True, random_state = self.random_seed)
+        self._store_folds(filename, skf.split(np.zeros((len(y), 1)), y))
+        self._write_data_files()
+        print("  %d rows stored after: %f s" % (len(y), time.time() - start_time))
+
+    def _read_flows(self, filename):
+        # the flows and indexes are read once and kept for the other folds
+        flows_filenames, folds_filename = self._flows_filenames(filename)
+        if isfile(flows_filenames["feather"]):
+            # memory mapped Arrow table, only the rows of a fold are copied when it is read
+            import pyarrow.feather as feather
+            table = feather.read_table(flows_filenames["feather"], memory_map = True)
+            index_columns = [c for c in table.schema.pandas_metadata['index_columns'] if isinstance(c, str)]
+            tables = {"X": table.drop_columns(['type']),
+                      "y": table.select(['type'] + index_columns).to_pandas()['type']}
+        else:
+            if isfile(flows_filenames["parquet"]):
+                df = pd.read_parquet(flows_filenames["parquet"])
+            else:
+                with open(flows_filenames["pickle"], 'rb') as f:
+                    df = pickle.load(f)
+            tables = {"X": df.drop('type', axis = 1), "y": df['type']}
+        self.flows_tables.setdefault(filename, {}).update(tables)
+        self.folds_indexes[filename] = dict(np.load(folds_filename))
+
+    def _feature_bins(self, filename, fold):
+        """
+        FeatureBins of the flows of filename (a number of packets) for fold,
+        fitted on the train flows of the fold only and saved with those of the
+        other folds in a _bins.npz file next to them. The train and test flows of
+        the fold are binned with them when they are read.
+        """
+        bins = self.feature_bins.get(filename)
+        if bins is None:
+            bins_filename = self._bins_filename(filename)
+            bins = load_feature_bins(bins_filename) if isfile(bins_filename) else {}
+            self.feature_bins[filename] = bins
+        if fold not in bins:
+            print("  binning the features of", filename, "fold", fold)
+            start_time = time.time()
+            bins[fold] = FeatureBins().fit(self._load_pickle(str(fold) + "_X_train_" + filename, binned = False))
+            save_feature_bins(self._bins_filename(filename), bins)
+            print("  %d features binned in %s after %.2f seconds" % (len(bins[fold].edges), self._bins_filename(filename), time.time() - start_time))
+        return bins[fold]
+
+    def _load_fold(self, filename, fold, Xy, split):
+        if Xy not in self.flows_tables.get(filename, {}):
+            self._read_flows(filename)
+        index = self.folds_indexes[filename][split + "_" + str(fold)]
+        flows = self.flows_tables[filename][Xy]
+        if isinstance(flows, (pd.DataFrame, pd.Series)):
+            return flows.iloc[index]
+        return flows.take(index).to_pandas()
+
+    def _load_fold_view(self, Xy, split, i, binned = None):
+        pkt, fold = i
+        return self._load_pickle(str(fold) + "_" + Xy + "_" + split + "_" + self.filename_prefix + "_" + str(pkt) + ".pickle", binned)
+
+    def _fold_view_version(self, Xy, split, i):
+        # hashes of the files _load_fold_view reads the fold from, and the edges of its bins
+        pkt, fold = i
+        filename = self.filename_prefix + "_" + str(pkt) + ".pickle"
+        flows_filenames, folds_filename = self._flows_filenames(filename)
+        version = [Xy, split, self._files_hashes([f for f in flows_filenames.values() if isfile(f)] + [folds_filename])]
+        if self.binned and Xy == "X":
+            bins = self._feature_bins(filename, fold)
+            version.append((list(bins.edges), data_hash(*bins.edges.values())))
+        return version
         
     # encoding of class features (our y)
     def _hotencode_class(self, df):
@@ -158,6 +1024,12 @@ class EncryptedTrafficClassifier:
         X_train, X_test, y_train, y_test = train_test_split(X, y,
                                                             stratify=y, 
                                                             test_size=0.2)
+        if self.fold_storage != "pickle":
+            self._store_flows(df, filename, skf.split(X, y))
+            self._write_data_files()
+            print("  folds stored after: ", time.time() - start_time, "s")
+            return
+        self._remove_stored_flows(filename)
         # for _i, (train_index, test_index) in enumerate(skf.split(X_train_isolated, y_train_isolated)):
         #     print("  Generating fold #", _i, "after: ", time.time() - start_time, "s")
         #     X_train = X_train_isolated.iloc[train_index]
@@ -190,9 +1062,46 @@ class EncryptedTrafficClassifier:
             del y_train
             del y_test
             gc.collect()
+        self._write_data_files()
             
+    def _data_files(self):
+        # size and modification time of every file of the data directory
+        files = {}
+        for root, _, filenames in os.walk(self.data_dir):
+            for filename in filenames:
+                stat = os.stat(join(root, filename))
+                files[os.path.relpath(join(root, filename), self.data_dir)] = [stat.st_size, stat.st_mtime_ns]
+        return files
+
+    def _write_data_files(self):
+        # data files from which the folds were generated, checked by data_prepared
+        with open(self.processed_data_output_dir + self.filename_prefix + "_data_files.json", "w") as f:
+            json.dump(self._data_files(), f)
+
+    def _data_files_unchanged(self):
+        if not os.path.isdir(self.data_dir):
+            # only the folds are available
+            return True
+        filename = self.processed_data_output_dir + self.filename_prefix + "_data_files.json"
+        if not isfile(filename):
+            print(filename, "not found")
+            return False
+        with open(filename) as f:
+            previous = json.load(f)
+        current = self._data_files()
+        if previous != current:
+            print("data files changed: %d added, %d removed, %d modified" % (len(current.keys() - previous.keys()), len(previous.keys() - current.keys()), len([f for f in current.keys() & previous.keys() if current[f] != previous[f]])))
+            return False
+        return True
+
     def _test_data_prepared(self, test):
         pkt, fold = test
+        filename = self.filename_prefix + "_" + str(pkt) + ".pickle"
+        if self._flows_stored(filename):
+            _, folds_filename = self._flows_filenames(filename)
+            with np.load(folds_filename) as indexes:
+                if "test_" + str(fold) in indexes:
+                    return True
         for prefix in ["X_train_", "y_train_", "X_test_", "y_test_"]:
             filename = self.processed_data_output_dir + str(fold) + "_" + prefix + self.filename_prefix + "_" + str(pkt) + ".pickle"
             if not isfile(filename):
@@ -202,6 +1111,8 @@ class EncryptedTrafficClassifier:
             
     def data_prepared(self):
         print("data_prepared")
+        if not self._data_files_unchanged():
+            return False
         for pkt in self.nb_packets_per_flow:
             for fold in range(self.nb_folds):
                 if not self._test_data_prepared((pkt, fold)):
@@ -212,12 +1123,71 @@ class EncryptedTrafficClassifier:
     def data_preparation(self):
         return
 
+    def set_fixed_point(self, bits):
+        """
+        Extract the features as integers of bits bits (None for float64 features),
+        the folds being stored with the suffix _q<bits> of the filename prefix.
+        """
+        self.filename_prefix = re.sub(r"_q\d+$", "", self.filename_prefix)
+        if bits is not None:
+            self.filename_prefix += "_q" + str(bits)
+        self.fixed_point = bits
+
+    def fixed_point_report(self, widths = FIXED_POINT_WIDTHS, features = FLOW_FEATURES):
+        """
+        Test score of a RandomForest and memory used by the features of every fold for
+        every width of the fixed-point features (None for float64), the folds being
+        prepared for the widths not prepared yet. Written in
+        results/fixed_point_<prefix>.csv.
+        """
+        print("fixed_point_report")
+        bits = self.fixed_point
+        report = []
+        for width in widths:
+            self.set_fixed_point(width)
+            if not self.data_prepared():
+                self.data_preparation()
+            for pkt in self.nb_packets_per_flow:
+                for fold in range(self.nb_folds):
+                    suffix = self.filename_prefix + "_" + str(pkt) + ".pickle"
+                    X_train = self._load_pickle(str(fold) + "_X_train_" + suffix)[features]
+                    y_train = self._load_pickle(str(fold) + "_y_train_" + suffix)
+                    X_test = self._load_pickle(str(fold) + "_X_test_" + suffix)[features]
+                    y_test = self._load_pickle(str(fold) + "_y_test_" + suffix)
+                    model = RandomForestClassifier(random_state = self.random_seed, n_jobs = self.jobs)
+                    model.fit(X_train, y_train)
+                    _r = {
+                        'bits': 64 if width is None else width,
+                        'fixed_point': width is not None,
+                        'nb_packets': pkt,
+                        'fold_id': fold,
+                        'test_score': model.score(X_test, y_test),
+                        'features_MB': (X_train.memory_usage(index = False).sum() + X_test.memory_usage(index = False).sum()) / 1024 / 1024
+                    }
+                    print("  %s bits, (%d, %d): test score %f, features %.2f MB" % (_r['bits'], pkt, fold, _r['test_score'], _r['features_MB']))
+                    report.append(_r)
+        self.set_fixed_point(bits)
+        report = pd.DataFrame(report)
+        print(report.groupby(['bits', 'nb_packets'], sort = False)[['test_score', 'features_MB']].mean())
+        report.to_csv("results/fixed_point_" + self.filename_prefix + ".csv", sep = ",", header = True, index = False)
+        return report
+
     def load_data(self, suffix):
         return
     
     def load_flows(self):
         print("load_flows")
         start_time = time.time()
+        if all(self._flows_stored(self.filename_prefix + "_" + str(pkt) + ".pickle") for pkt in self.nb_packets_per_flow):
+            # the folds are built from the flows stored once per number of packets when they are used
+            ids = list(EncryptedTrafficClassifierIterator(self.flow_ids))
+            self.X_train_flows = FoldViews(partial(self._load_fold_view, "X", "train"), ids, partial(self._fold_view_version, "X", "train"))
+            self.y_train_flows = FoldViews(partial(self._load_fold_view, "y", "train"), ids, partial(self._fold_view_version, "y", "train"))
+            self.X_test_flows = FoldViews(partial(self._load_fold_view, "X", "test"), ids, partial(self._fold_view_version, "X", "test"))
+            self.y_test_flows = FoldViews(partial(self._load_fold_view, "y", "test"), ids, partial(self._fold_view_version, "y", "test"))
+            self.features_used = list(self.X_train_flows[ids[0]].columns)
+            print(f"  flows data mapped in {time.time() - start_time} seconds")
+            return
         features_set = False
         for i in EncryptedTrafficClassifierIterator(self.flow_ids):
             pkt, fold = i
@@ -252,14 +1222,17 @@ class EncryptedTrafficClassifier:
         
     def cleanup_data(self, X_train, y_train, X_test, y_test, results, non_needed_features):
         print("cleanup_data")
+        for folds in [X_train, X_test]:
+            if isinstance(folds, FoldViews):
+                folds.drop_columns(non_needed_features)
         for i in EncryptedTrafficClassifierIterator(results):
             for _f in non_needed_features:
                 if self.features_used != None:
                     if _f in self.features_used:
                         self.features_used.remove(_f)
-                if _f in X_train[i].columns:
+                if not isinstance(X_train, FoldViews) and _f in X_train[i].columns:
                     X_train[i] = X_train[i].drop(_f, axis = 1)
-                if _f in X_test[i].columns:
+                if not isinstance(X_test, FoldViews) and _f in X_test[i].columns:
                     X_test[i] = X_test[i].drop(_f, axis = 1)
         # for _f in non_needed_features:
         #     if _f in self.X_test_isolated_flows.columns:
@@ -283,6 +1256,9 @@ class EncryptedTrafficClassifier:
         cm_dict_normalized = {}
         output = ""
         for i in EncryptedTrafficClassifierIterator(results):
+            if i not in y_test_pred:
+                # fit failed
+                continue
             output += ("== %s ==\n" % str(i))
             cm_dict[i] = confusion_matrix(y_test[i], y_test_pred[i].astype(int))
             output += str(cm_dict[i]) + '\n'
@@ -293,7 +1269,7 @@ class EncryptedTrafficClassifier:
             # plt.savefig(str(i) + '_confusion_matrix.pdf', dpi = 300, format = "pdf")
 
             # plt.clf()
-            cm_dict_normalized[i] = confusion_matrix(y_test[i], y_test_pred[i].astype(int), normalize = 'true')
+            cm_dict_normalized[i] = normalize_confusion_matrix(cm_dict[i])
             output += str(cm_dict_normalized[i]) + '\n'
             # disp_normalized = ConfusionMatrixDisplay(confusion_matrix = cm_dict_normalized[i], 
             #                               display_labels = self.classes)
@@ -302,6 +1278,8 @@ class EncryptedTrafficClassifier:
             # plt.savefig(str(i) + '_confusion_matrix_normalized.pdf', dpi = 300, format = "pdf")
 
         for i in EncryptedTrafficClassifierIterator(results):
+            if i not in cm_dict:
+                continue
             pkt, fold = i
             memfile = io.BytesIO()
             np.save(memfile, cm_dict[i])
@@ -317,6 +1295,8 @@ class EncryptedTrafficClassifier:
         skl_F1 = {}
         output = ""
         for i in EncryptedTrafficClassifierIterator(results):
+            if i not in cm_dict:
+                continue
             output += ("== %s ==\n" % str(i))
             pkt, fold = i
             cm = cm_dict[i]
@@ -324,13 +1304,14 @@ class EncryptedTrafficClassifier:
             FN = cm.sum(axis=1) - np.diag(cm)
             TP = np.diag(cm)
             TN = cm.sum() - (FP + FN + TP)
-            rf_F1[i] = 2 * (TP) / (2 * TP + FP + FN) * 100
+            rf_F1[i] = f1_scores(cm) * 100
             output += ("FP = %s\n" % str(FP))
             output += ("FN = %s\n" % str(FN))
             output += ("TP = %s\n" % str(TP))
             output += ("TN = %s\n" % str(TN))
             if len(y) > 0:
-                skl_F1[i] = f1_score(y[i], y_pred[i], average = 'micro')
+                # micro F1 of single-label classes, the accuracy
+                skl_F1[i] = np.trace(cm) / cm.sum()
                 output += ("skl_F1 = %s\n" % str(skl_F1[i]))
             output += "\n"
             for j in range(len(self.classes)):
@@ -943,48 +1924,12 @@ class EncryptedTrafficClassifier:
         rf_y_test_predicted = {}
         rf_best_params = {}
         rf_features_importance = {}
-        should_save = {}
-        self.__set_rf_pickle_filename()
-        
-        for pkt in self.nb_packets_per_flow:
-            should_save[pkt] = True
-            if isfile(self.rf_output[pkt]):
-                print("Loading previously saved results for", pkt, "packets in", self.rf_output[pkt])
-                should_save[pkt] = False
-                rf_regr = None
-                with open(self.rf_output[pkt], "rb") as f:
-                    _X_train = pickle.load(f)
-                    _y_train = pickle.load(f)
-                    _rf_train_score = pickle.load(f)
-                    _rf_y_train_predicted = pickle.load(f)
-                    _X_test = pickle.load(f)
-                    _y_test = pickle.load(f)
-                    _rf_test_score = pickle.load(f)
-                    _rf_y_test_predicted = pickle.load(f)
-                    # _rf_test_isolated_score = pickle.load(f)
-                    # _rf_y_test_isolated_predicted = pickle.load(f)
-                    _rf_best_params = pickle.load(f)
-                    _rf_features_importance = pickle.load(f)
-                for fold in range(self.nb_folds):
-                    i = pkt, fold
-                    X_train[i] = _X_train[i]
-                    y_train[i] = _y_train[i]
-                    rf_train_score[i] = _rf_train_score[i]
-                    rf_y_train_predicted[i] = _rf_y_train_predicted[i]
-                    X_test[i] = _X_test[i]
-                    y_test[i] = _y_test[i]
-                    rf_test_score[i] = _rf_test_score[i]
-                    rf_y_test_predicted[i] = _rf_y_test_predicted[i]
-                    # rf_test_isolated_score[i] = _rf_test_isolated_score[i]
-                    # rf_y_test_isolated_predicted[i] = _rf_y_test_isolated_predicted[i]
-                    rf_best_params[i] = _rf_best_params[i]
-                    rf_features_importance[i] = _rf_features_importance[i]
-                    
-        rf_grid_search = {}
+        rf_predictions = self.predictions.setdefault("rf", Predictions())
+        rf_regr = {}
         nb_cores_to_use = max(1, os.cpu_count())
         rf_pipeline_logistic = Pipeline(
             steps = [                
-                ("rf", RandomForestClassifier(n_jobs = nb_cores_to_use))
+                ("rf", RandomForestClassifier(random_state = self.random_seed, n_jobs = nb_cores_to_use))
             ]
         )
         
@@ -993,96 +1938,79 @@ class EncryptedTrafficClassifier:
             # "rf__n_estimators": [10]
         }
 
+        store = self.__artifact_store("rf")
+        keys = {i: store.key(i, self.__data_version(i, X_train, y_train, X_test, y_test), (sorted(rf_param_grid.items()), self.rf_search, self.rf_search_time_budget, self.random_seed)) for i in EncryptedTrafficClassifierIterator(self.flow_ids)}
         for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            if self.force_rf_classification == False and i in rf_train_score.keys():
-                # print("skipping", i)
-                continue
-            rf_grid_search[i] = GridSearchCV(rf_pipeline_logistic,
-                                             param_grid = rf_param_grid,
-                                             cv = 2,
-                                             verbose = 3)
-            
-            rf_regr = {}
-            print("==" +  str(i) + "==")
-            X = X_train[i]  
-            y = y_train[i]
-            rf_regr[i] = rf_grid_search[i].fit(X, y)
-            print(i, rf_regr[i].best_params_)
-            
-            rf_train_score[i] = rf_regr[i].score(X_train[i], y_train[i])
-            rf_y_train_predicted[i] = rf_regr[i].predict(X_train[i])
-            rf_test_score[i] = rf_regr[i].score(X_test[i], y_test[i])
-            rf_y_test_predicted[i] = rf_regr[i].predict(X_test[i])
-            
-            # rf_test_isolated_score[i] = rf_regr[i].score(self.X_test_isolated_flows, self.y_test_isolated_flows)
-            # rf_y_test_isolated_predicted[i] = rf_regr[i].predict(self.X_test_isolated_flows)
-            # print("rf_y_test_isolated_predicted[i] =", rf_y_test_isolated_predicted[i])
-            # print("rf_y_test_isolated_predicted test score for (%s, %d) = %f" % (i[1], i[0], rf_test_isolated_score[i]))
-            rf_best_params[i] = rf_regr[i].best_params_
-            rf_features_importance[i] = [] #rf_regr[i].best_estimator_.named_steps["rf"].feature_importances_
-            print("test score for (%s, %d) = %f" % (i[1], i[0], rf_test_score[i]))
-            
-            print("Feature ranking:")
-            importances = rf_regr[i].best_estimator_.named_steps["rf"].feature_importances_
-            std = np.std([tree.feature_importances_ for tree in rf_regr[i].best_estimator_.named_steps["rf"].estimators_],
-                         axis=0)
-            indices = np.argsort(importances)[::-1]
-            _features = {}
-            for f in range(self.X_train_flows[i].shape[1]):
-                print("%d. feature %s (%f)" % (f + 1, self.X_train_flows[i].columns[indices[f]], importances[indices[f]]))
-                rf_features_importance[i].append((self.X_train_flows[i].columns[indices[f]], importances[indices[f]]))
-                _features[f] = (self.X_train_flows[i].columns[indices[f]], importances[indices[f]])
-            # print(_features)
-            # self.classification_results.loc[(self.classification_results['nb_packets'] == pkt) & (self.classification_results['fold_id'] == fold), 'feature_ranking'] = [_features]
+            artifacts = None if self.force_rf_classification == True else store.load(keys[i])
+            if artifacts is not None:
+                print("Loading previously saved results for", i, "in", store.filename(keys[i]))
+                rf_regr[i] = artifacts['model']
+                rf_predictions.update(artifacts['predictions'])
+                rf_best_params[i] = artifacts['best_params']
+                rf_features_importance[i] = artifacts['features_importance']
+
+        # same search as GridSearchCV(rf_pipeline_logistic, rf_param_grid, cv = 2), the fits of
+        # self.jobs (pkt, fold) at a time being run by self.jobs processes sharing the cores, the
+        # artifacts of each fold being saved once its batch is done
+        ids = [i for i in EncryptedTrafficClassifierIterator(self.flow_ids) if i not in rf_regr]
+        scheduler = TrainingScheduler(self.jobs, nb_cores_to_use)
+        for start in range(0, len(ids), max(1, self.jobs)):
+            batch = ids[start:start + max(1, self.jobs)]
+            data = {i: (X_train[i], y_train[i]) for i in batch}
+            start_time = time.time()
+            if self.rf_search == "warm_start":
+                rf_regr.update(scheduler.warm_start_search(rf_pipeline_logistic, "rf__n_estimators", rf_param_grid["rf__n_estimators"], data, cv = 2, time_budget = self.rf_search_time_budget))
+            elif self.rf_search == "truncation":
+                rf_regr.update(scheduler.truncation_search(rf_pipeline_logistic, "rf__n_estimators", rf_param_grid["rf__n_estimators"], data, cv = 2))
+            else:
+                rf_regr.update(scheduler.grid_search(rf_pipeline_logistic, rf_param_grid, data, cv = 2))
+            print(f"  {self.rf_search} search finished after {time.time() - start_time} seconds")
+            for i in batch:
+                print("==" +  str(i) + "==")
+                print(i, rf_regr[i].best_params_)
+                
+                # a single pass of the forest flattened in arrays per split (same predictions as sklearn, tests/test_compiled_forest.py)
+                forest = CompiledForest(rf_regr[i].best_estimator_.named_steps["rf"])
+                rf_predictions.add(i, "train", forest, X_train[i], y_train[i])
+                rf_predictions.add(i, "test", forest, X_test[i], y_test[i])
+                
+                # rf_test_isolated_score[i] = rf_regr[i].score(self.X_test_isolated_flows, self.y_test_isolated_flows)
+                # rf_y_test_isolated_predicted[i] = rf_regr[i].predict(self.X_test_isolated_flows)
+                # print("rf_y_test_isolated_predicted[i] =", rf_y_test_isolated_predicted[i])
+                # print("rf_y_test_isolated_predicted test score for (%s, %d) = %f" % (i[1], i[0], rf_test_isolated_score[i]))
+                rf_best_params[i] = rf_regr[i].best_params_
+                rf_features_importance[i] = [] #rf_regr[i].best_estimator_.named_steps["rf"].feature_importances_
+                print("test score for (%s, %d) = %f" % (i[1], i[0], rf_predictions.accuracy(i, "test")))
+                
+                print("Feature ranking:")
+                importances = rf_regr[i].best_estimator_.named_steps["rf"].feature_importances_
+                std = np.std([tree.feature_importances_ for tree in rf_regr[i].best_estimator_.named_steps["rf"].estimators_],
+                             axis=0)
+                indices = np.argsort(importances)[::-1]
+                _features = {}
+                for f in range(self.X_train_flows[i].shape[1]):
+                    print("%d. feature %s (%f)" % (f + 1, self.X_train_flows[i].columns[indices[f]], importances[indices[f]]))
+                    rf_features_importance[i].append((self.X_train_flows[i].columns[indices[f]], importances[indices[f]]))
+                    _features[f] = (self.X_train_flows[i].columns[indices[f]], importances[indices[f]])
+                # print(_features)
+                # self.classification_results.loc[(self.classification_results['nb_packets'] == pkt) & (self.classification_results['fold_id'] == fold), 'feature_ranking'] = [_features]
 
-        for pkt in self.nb_packets_per_flow:
-            if should_save[pkt]:
-                _X_train = {}
-                _y_train = {}
-                _rf_train_score = {}
-                _rf_y_train_predicted = {}
-                _X_test = {}
-                _y_test = {}
-                _rf_test_score = {}
-                _rf_y_test_predicted = {}
-                # _rf_test_isolated_score = {}
-                # _rf_y_test_isolated_predicted = {}
-                _rf_best_params = {}
-                _rf_features_importance = {}
-                for fold in range(self.nb_folds):
-                    i = pkt, fold 
-                    _X_train[i] = X_train[i]
-                    _y_train[i] = y_train[i]
-                    _rf_train_score[i] = rf_train_score[i]
-                    _rf_y_train_predicted[i] = rf_y_train_predicted[i]
-                    _X_test[i] = X_test[i]
-                    _y_test[i] = y_test[i]
-                    _rf_test_score[i] = rf_test_score[i]
-                    _rf_y_test_predicted[i] = rf_y_test_predicted[i]
-                    # _rf_test_isolated_score[i] = rf_test_isolated_score[i]
-                    # _rf_y_test_isolated_predicted[i] = rf_y_test_isolated_predicted[i]
-                    _rf_best_params[i] = rf_best_params[i]
-                    _rf_features_importance[i] = rf_features_importance[i]
                 try:
-                    print("Saving results for", pkt, "packets in", self.rf_output[pkt])
-                    with open(self.rf_output[pkt], "wb") as f:
-                        pickle.dump(_X_train, f)
-                        pickle.dump(_y_train, f)
-                        pickle.dump(_rf_train_score, f)
-                        pickle.dump(_rf_y_train_predicted, f)
-                        pickle.dump(_X_test, f)
-                        pickle.dump(_y_test, f)
-                        pickle.dump(_rf_test_score, f)
-                        pickle.dump(_rf_y_test_predicted, f)
-                        # pickle.dump(_rf_test_isolated_score, f)
-                        # pickle.dump(_rf_y_test_isolated_predicted, f)
-                        pickle.dump(_rf_best_params, f)
-                        pickle.dump(_rf_features_importance, f)
-                except Exception as e:
-                    print("Exception", e)
-                    pass
+                    print("Saving results for", i, "in", store.filename(keys[i]))
+                    store.save(keys[i], {
+                        'model': rf_regr[i],
+                        'predictions': rf_predictions.select(i),
+                        'best_params': rf_best_params[i],
+                        'features_importance': rf_features_importance[i]
+                    })
+                except OSError as e:
+                    print("  cannot write", store.filename(keys[i]), e)
 
         for i in EncryptedTrafficClassifierIterator(self.flow_ids):
+            rf_y_train_predicted[i] = rf_predictions.predict(i, "train")
+            rf_y_test_predicted[i] = rf_predictions.predict(i, "test")
+            rf_train_score[i] = rf_predictions.accuracy(i, "train")
+            rf_test_score[i] = rf_predictions.accuracy(i, "test")
             pkt, fold = i
             memfile = io.BytesIO()
             np.save(memfile, rf_features_importance[i])
@@ -1109,116 +2037,158 @@ class EncryptedTrafficClassifier:
         return rf_regr, rf_y_train_predicted, rf_y_test_predicted
     
     ########################################
-    # XGBoost
+    # Boosting
     ########################################
-    def XGBoost_predict(self, X_train, y_train, X_test, y_test):
-        print("XGBoost_predict")
+    def __boosting_predict(self, prefix, params, fit, X_train, y_train, X_test, y_test):
+        # models of fit(batch) = (models, fit times) on every (pkt, fold), or the ValueError of its fit, scored from a single pass per split, results in the prefix columns
+        y_train_predicted = {}
+        y_test_predicted = {}
+        train_score = {}
+        test_score = {}
+        predictions = self.predictions.setdefault(prefix, Predictions())
+        models = {}
+        fit_times = {}
+        nb_features = {}
 
-        xg_train_score = {}
-        xg_y_train_predicted = {}
-        xg_test_score = {}
-        xg_y_test_predicted = {}
-        should_save = {}
-        self.__set_xg_pickle_filename()
-        
-        for pkt in self.nb_packets_per_flow:
-            should_save[pkt] = True
-            if isfile(self.xg_output[pkt]):
-                print("Loading previously saved results for", pkt, "packets in", self.xg_output[pkt])
-                should_save[pkt] = False
-                xg_regr = None
-                with open(self.xg_output[pkt], "rb") as f:
-                    _X_train = pickle.load(f)
-                    _y_train = pickle.load(f)
-                    _xg_train_score = pickle.load(f)
-                    _xg_y_train_predicted = pickle.load(f)
-                    _X_test = pickle.load(f)
-                    _y_test = pickle.load(f)
-                    _xg_test_score = pickle.load(f)
-                    _xg_y_test_predicted = pickle.load(f)
-                for fold in range(self.nb_folds):
-                    i = pkt, fold
-                    X_train[i] = _X_train[i]
-                    y_train[i] = _y_train[i]
-                    xg_train_score[i] = _xg_train_score[i]
-                    xg_y_train_predicted[i] = _xg_y_train_predicted[i]
-                    X_test[i] = _X_test[i]
-                    y_test[i] = _y_test[i]
-                    xg_test_score[i] = _xg_test_score[i]
-                    xg_y_test_predicted[i] = _xg_y_test_predicted[i]
-        
-        xg_model = {}
-        
+        store = self.__artifact_store(prefix)
+        keys = {i: store.key(i, self.__data_version(i, X_train, y_train, X_test, y_test), params) for i in EncryptedTrafficClassifierIterator(self.flow_ids)}
         for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            nb_features = len(X_train[i].columns)
-            if i in xg_train_score.keys():
-                # print("skipping", i)
-                continue
-            xg_model[i] = XGBClassifier()
-
-            print("==",i,"==")
-            try:
-                start_time = time.time()
-                xg_model[i].fit(X_train[i], y_train[i])
-                print(f"  finished after {time.time() - start_time} seconds")
-            except ValueError as e:
-                print(e)
-                pass
+            artifacts = store.load(keys[i])
+            if artifacts is not None:
+                print("Loading previously saved results for", i, "in", store.filename(keys[i]))
+                models[i] = artifacts['model']
+                predictions.update(artifacts['predictions'])
+                fit_times[i] = artifacts.get('fit_time', np.nan)
+                nb_features[i] = artifacts.get('nb_features', np.nan)
         
-            xg_y_train_predicted[i] = xg_model[i].predict(X_train[i])
-            xg_y_test_predicted[i] = xg_model[i].predict(X_test[i])
-            xg_train_score[i] = xg_model[i].score(X_train[i], y_train[i])
-            xg_test_score[i] = xg_model[i].score(X_test[i], y_test[i])
-        
-        for pkt in self.nb_packets_per_flow:
-            if should_save[pkt]:
-                _X_train = {}
-                _y_train = {}
-                _xg_train_score = {}
-                _xg_y_train_predicted = {}
-                _X_test = {}
-                _y_test = {}
-                _xg_test_score = {}
-                _xg_y_test_predicted = {}
-                for fold in range(self.nb_folds):
-                    i = pkt, fold 
-                    _X_train[i] = X_train[i]
-                    _y_train[i] = y_train[i]
-                    _xg_train_score[i] = xg_train_score[i]
-                    _xg_y_train_predicted[i] = xg_y_train_predicted[i]
-                    _X_test[i] = X_test[i]
-                    _y_test[i] = y_test[i]
-                    _xg_test_score[i] = xg_test_score[i]
-                    _xg_y_test_predicted[i] = xg_y_test_predicted[i]
+        # self.jobs (pkt, fold) fitted at a time, the artifacts of each fold being saved once its batch is done
+        ids = [i for i in EncryptedTrafficClassifierIterator(self.flow_ids) if i not in models]
+        for start in range(0, len(ids), max(1, self.jobs)):
+            batch = ids[start:start + max(1, self.jobs)]
+            start_time = time.time()
+            _models, _fit_times = fit(batch)
+            print(f"  finished after {time.time() - start_time} seconds")
+            for i in batch:
+                print("==",i,"==")
+                if isinstance(_models[i], ValueError):
+                    # only this fold is left out
+                    print(_models[i])
+                    continue
+                models[i] = _models[i]
+                fit_times[i] = _fit_times[i]
+                # a single pass of the model per split
+                predictions.add(i, "train", models[i], X_train[i], y_train[i])
+                predictions.add(i, "test", models[i], X_test[i], y_test[i])
+                nb_features[i] = len(X_train[i].columns)
                 try:
-                    print("Saving results for", pkt, "packets in", self.xg_output[pkt])
-                    with open(self.xg_output[pkt], "wb") as f:
-                        pickle.dump(_X_train, f)
-                        pickle.dump(_y_train, f)
-                        pickle.dump(_xg_train_score, f)
-                        pickle.dump(_xg_y_train_predicted, f)
-                        pickle.dump(_X_test, f)
-                        pickle.dump(_y_test, f)
-                        pickle.dump(_xg_test_score, f)
-                        pickle.dump(_xg_y_test_predicted, f)
-                except Exception as e:
-                    print("Exception", e)
-                    pass
+                    print("Saving results for", i, "in", store.filename(keys[i]))
+                    store.save(keys[i], {
+                        'model': models[i],
+                        'predictions': predictions.select(i),
+                        'fit_time': fit_times[i],
+                        'nb_features': nb_features[i]
+                    })
+                except OSError as e:
+                    print("  cannot write", store.filename(keys[i]), e)
                 
+        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
+            if i not in models:
+                continue
+            y_train_predicted[i] = predictions.predict(i, "train")
+            y_test_predicted[i] = predictions.predict(i, "test")
+            train_score[i] = predictions.accuracy(i, "train")
+            test_score[i] = predictions.accuracy(i, "test")
+        
         for i in EncryptedTrafficClassifierIterator(self.flow_ids):
             pkt, fold = i
             _r = pd.DataFrame(
                 {
                     'nb_packets': [pkt],
                     'fold_id': [fold],
-                    'xg_train_score': [xg_train_score[i]],
-                    'xg_test_score': [xg_test_score[i]],
-                    'xg_nb_features': [nb_features],
+                    # NaN for the folds whose fit failed
+                    prefix + '_train_score': [train_score.get(i, np.nan)],
+                    prefix + '_test_score': [test_score.get(i, np.nan)],
+                    prefix + '_nb_features': [nb_features.get(i, np.nan)],
+                    prefix + '_rounds': [getattr(models[i], 'n_iter_', np.nan) if i in models else np.nan],
+                    prefix + '_fit_time': [fit_times.get(i, np.nan)],
                 }
             )
             self.classification_results = pd.concat([_r, self.classification_results])
 
-        return xg_model, xg_y_train_predicted, xg_y_test_predicted
+        return models, y_train_predicted, y_test_predicted
+
+    def __scheduled_fit(self, estimator, X_train, y_train, batch):
+        # estimator fitted on the folds of batch by the processes of a TrainingScheduler
+        scheduler = TrainingScheduler(self.jobs)
+        models = scheduler.fit({i: estimator for i in batch}, {i: (X_train[i], y_train[i]) for i in batch}, errors = (ValueError,))
+        return models, {key: duration for key, _, _, _, duration in scheduler.durations}
+
+    def __quantile_fit(self, trainer, X_train, y_train, batch):
+        # boosters trained on the folds of batch, with the bins of their train flows
+        models = trainer.fit({i: (X_train[i], y_train[i]) for i in batch}, errors = (ValueError,))
+        return models, {i: getattr(model, 'fit_time', np.nan) for i, model in models.items()}
+
+    def GBoost_predict(self, X_train, y_train, X_test, y_test):
+        """
+        Histogram gradient boosting, multi-threaded. Above 10000 train flows, the
+        number of iterations is chosen by early stopping on 10% of them.
+        """
+        print("GBoost_predict")
+        estimator = HistGradientBoostingClassifier(max_iter = GB_MAX_ITER, early_stopping = 'auto', random_state = self.random_seed)
+        return self.__boosting_predict("gb", sorted(estimator.get_params().items()), partial(self.__scheduled_fit, estimator, X_train, y_train), X_train, y_train, X_test, y_test)
+
+    def XGBoost_predict(self, X_train, y_train, X_test, y_test):
+        """
+        XGBoost 'hist' boosters (QuantileTrainer), the bins of the features of
+        every fold being computed from its train flows.
+        """
+        print("XGBoost_predict")
+        trainer = QuantileTrainer(self.jobs, random_seed = self.random_seed)
+        return self.__boosting_predict("xg", trainer.params(), partial(self.__quantile_fit, trainer, X_train, y_train), X_train, y_train, X_test, y_test)
+
+    ########################################
+    # Switch tables
+    ########################################
+    def switch_tables(self, models, X_test, y_test, prefix, bits = None):
+        """
+        Compile the model of every fold of models (returned by RF_predict or
+        XGBoost_predict) into SwitchTables and classify the test flows with the
+        tables: size of the tables, lookups per flow and accuracy compared with the
+        model. bits: number of bits of the features if they are integers. With
+        binned features, the tables classify the values of the features, read
+        before binning.
+        """
+        print("switch_tables")
+        tables = {}
+        for i in models:
+            pkt, fold = i
+            X = X_test[i]
+            if self.binned:
+                bins = self._feature_bins(self.filename_prefix + "_" + str(pkt) + ".pickle", fold)
+                tables[i] = compile_model(models[i], bins.thresholds(X_test[i].columns))
+                X = self._load_fold_view("X", "test", i, binned = False)[X_test[i].columns]
+            else:
+                tables[i] = compile_model(models[i])
+            start_time = time.time()
+            y_tables_predicted = tables[i].predict(X)
+            duration = time.time() - start_time
+            y_model_predicted = models[i].predict(X_test[i])
+            size = tables[i].size(bits)
+            print(i, size)
+            print("  %s test score for (%d, %d): model %f, tables %f, same class for %f of the flows, %.0f flows/s" % (
+                prefix,
+                pkt,
+                fold,
+                accuracy_score(y_test[i], y_model_predicted),
+                accuracy_score(y_test[i], y_tables_predicted),
+                np.mean(y_tables_predicted == np.asarray(y_model_predicted)),
+                len(y_tables_predicted) / max(duration, 1e-9)))
+            _r = {'nb_packets': [pkt], 'fold_id': [fold]}
+            for k, v in size.items():
+                _r[prefix + '_switch_' + k] = [v]
+            _r[prefix + '_switch_test_score'] = [accuracy_score(y_test[i], y_tables_predicted)]
+            self.classification_results = pd.concat([pd.DataFrame(_r), self.classification_results])
+        return tables
     
 if __name__ == "__main__":
     sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+def normalize_confusion_matrix(cm):
+    # same as sklearn confusion_matrix(normalize = 'true'): rates per true class, 0 for the classes without flows
+    with np.errstate(all = 'ignore'):
+        return np.nan_to_num(cm / cm.sum(axis = 1, keepdims = True))
+
+def f1_scores(cm):
+    # F1 of every class of a confusion matrix, nan for the classes neither present nor predicted
+    TP = np.diag(cm)
+    FP = cm.sum(axis = 0) - TP
+    FN = cm.sum(axis = 1) - TP
+    with np.errstate(all = 'ignore'):
+        return 2 * TP / (2 * TP + FP + FN)
+
+def _label_codes(labels, values):
+    # position of every value in labels, and whether it is one of the labels
+    order = np.argsort(labels, kind = 'stable')
+    positions = np.minimum(np.searchsorted(labels[order], values), len(labels) - 1)
+    return order.take(positions), labels[order].take(positions) == values
+
+########################################
+# Predictions
+########################################
+class Predictions():
+    """
+    Class probabilities of the model of every (pkt, fold) on the flows of a split
+    (train or test), from a single predict_proba per split, with the true classes.
+    Predicted classes, accuracy, confusion matrices and F1 scores are derived from
+    them without running the models again.
+    """
+    def __init__(self):
+        # (i, split) -> probabilities, classes of the columns, true classes
+        self.proba = {}
+        self.classes = {}
+        self.y = {}
+
+    def add(self, i, split, model, X, y):
+        self.proba[(i, split)] = np.asarray(model.predict_proba(X))
+        self.classes[(i, split)] = np.asarray(model.classes_)
+        self.y[(i, split)] = np.asarray(y)
+
+    def __contains__(self, key):
+        return key in self.proba
+
+    def predict(self, i, split):
+        # same as model.predict for the classifiers predicting the class of highest probability
+        return self.classes[(i, split)].take(np.argmax(self.proba[(i, split)], axis = 1))
+
+    def accuracy(self, i, split):
+        return np.mean(self.predict(i, split) == self.y[(i, split)])
+
+    def confusion_matrix(self, i, split, labels = None, normalize = False):
+        """
+        Same as sklearn confusion_matrix(y, predictions, labels), labels being by
+        default the classes of the model.
+        """
+        labels = self.classes[(i, split)] if labels is None else np.asarray(labels)
+        y, known = _label_codes(labels, self.y[(i, split)])
+        y_predicted, known_predicted = _label_codes(labels, self.predict(i, split))
+        known &= known_predicted
+        cm = np.bincount(y[known] * len(labels) + y_predicted[known], minlength = len(labels) ** 2).reshape(len(labels), len(labels))
+        return normalize_confusion_matrix(cm) if normalize else cm
+
+    def f1(self, i, split, labels = None, average = None):
+        """
+        F1 of every class (average None), or 'micro', 'macro' or 'weighted' F1 over
+        the classes present, as sklearn f1_score with zero_division = 0.
+        """
+        cm = self.confusion_matrix(i, split, labels)
+        if average == 'micro':
+            return np.trace(cm) / max(cm.sum(), 1)
+        f1 = np.nan_to_num(f1_scores(cm))
+        if average is None:
+            return f1
+        present = (cm.sum(axis = 0) + cm.sum(axis = 1)) > 0
+        if average == 'weighted':
+            return np.average(f1, weights = cm.sum(axis = 1)) if cm.sum() > 0 else 0.0
+        return f1[present].mean() if present.any() else 0.0
+
+    def select(self, i):
+        # predictions of the (pkt, fold) i
+        predictions = Predictions()
+        predictions.update(self, [key for key in self.proba if key[0] == i])
+        return predictions
+
+    def update(self, predictions, keys = None):
+        for key in predictions.proba if keys is None else keys:
+            self.proba[key] = predictions.proba[key]
+            self.classes[key] = predictions.classes[key]
+            self.y[key] = predictions.y[key]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+# bins of a feature, codes 0 to MAX_BINS - 1 held by a uint8
+MAX_BINS = 256
+
+def bin_edges(values, max_bins = MAX_BINS):
+    """
+    Upper bounds (float32, increasing) of the bins of values but the last one:
+    every distinct value when there are at most max_bins of them, the quantiles of
+    values otherwise, so that the bins hold about the same number of flows.
+    """
+    values = np.asarray(values, dtype = np.float32)
+    values = values[~np.isnan(values)]
+    distinct = np.unique(values)
+    if len(distinct) <= max_bins:
+        return distinct[:-1]
+    # values of the flows, so that the thresholds between two codes are values of the features
+    return np.unique(np.quantile(values, np.arange(1, max_bins) / max_bins, method = 'inverted_cdf')).astype(np.float32)
+
+def bin_codes(values, edges):
+    # number of edges below every value: x <= edges[k] if and only if code <= k, NaN in the last bin
+    return np.searchsorted(edges, np.asarray(values, dtype = np.float32), side = 'left').astype(np.uint8)
+
+########################################
+# Feature bins
+########################################
+class FeatureBins():
+    """
+    Quantization of the numeric features of flows into at most max_bins bins, the
+    flows being replaced by uint8 codes (bin_codes) which the tree models split as
+    the float64 features. The edges are fitted on the train flows of a fold, and
+    give back the thresholds of the models on the values of the features
+    (compile_model). The other columns are kept as is.
+    """
+    def __init__(self, max_bins = MAX_BINS):
+        self.max_bins = max_bins
+        # column -> edges
+        self.edges = {}
+
+    def fit(self, X):
+        self.edges = {c: bin_edges(X[c], self.max_bins) for c in X.columns if X[c].dtype.kind in 'biuf'}
+        return self
+
+    def codes(self, X):
+        # uint8 codes of the binned columns of X, one column per binned feature
+        codes = np.empty((len(X), len(self.edges)), dtype = np.uint8)
+        for k, (c, edges) in enumerate(self.edges.items()):
+            codes[:, k] = bin_codes(X[c], edges)
+        return codes
+
+    def frame(self, codes, index, columns = None, others = None):
+        # DataFrame of the codes and of the columns not binned of others, in the order of columns
+        df = pd.DataFrame(codes, index = index, columns = list(self.edges), copy = False)
+        if others is not None and len(others.columns) > 0:
+            df = pd.concat([df, others], axis = 1)
+        return df if columns is None else df[list(columns)]
+
+    def transform(self, X):
+        return self.frame(self.codes(X), X.index, X.columns, X[[c for c in X.columns if c not in self.edges]])
+
+    def thresholds(self, columns):
+        # edges of every column, None for those not binned, as compile_model(edges = ...)
+        return [self.edges.get(c) for c in columns]
+
+def save_feature_bins(filename, bins):
+    # FeatureBins of every fold of bins (fold -> FeatureBins) in one .npz file
+    arrays = {}
+    for fold, _bins in bins.items():
+        arrays["max_bins_" + str(fold)] = _bins.max_bins
+        arrays["columns_" + str(fold)] = np.array(list(_bins.edges), dtype = str)
+        for k, e in enumerate(_bins.edges.values()):
+            arrays["edges_" + str(fold) + "_" + str(k)] = e
+    np.savez(filename, **arrays)
+
+def load_feature_bins(filename):
+    """
+    FeatureBins of every fold saved in filename by save_feature_bins, fold -> FeatureBins.
+    """
+    bins = {}
+    with np.load(filename) as arrays:
+        for name in arrays.files:
+            if name.startswith("columns_"):
+                fold = int(name[len("columns_"):])
+                bins[fold] = FeatureBins(int(arrays["max_bins_" + str(fold)]))
+                bins[fold].edges = {c: arrays["edges_" + str(fold) + "_" + str(k)] for k, c in enumerate(arrays[name].tolist())}
+    return bins
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import copy
+import json
+import os
+from os.path import isfile
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.pipeline import Pipeline
+
+from training_scheduler import TrainingScheduler
+
+# columns of the results, as in the CSV files of analyze_models
+SWEEP_COLUMNS = ['depth', 'tree', 'n_feat', 'Macro_F1', 'Weighted_F1', 'Accuracy', 'feats', 'c_report']
+
+def first_trees(forest, n):
+    # forest of the first n trees of a fitted RandomForest: the forest fitted with n_estimators = n and the same random_state
+    forest = copy.copy(forest)
+    forest.estimators_ = forest.estimators_[:n]
+    forest.n_estimators = n
+    return forest
+
+def importance_ranking(forest, features):
+    # features by decreasing importance in forest
+    return pd.Series(forest.feature_importances_, index = features).sort_values(ascending = False, kind = 'stable').index.tolist()
+
+########################################
+# Feature sweep
+########################################
+class FeatureSweep():
+    """
+    Sweep of analyze_models: for every depth and number of trees, the features are
+    ranked by the importances of a RandomForest using all of them, then a
+    RandomForest (max_leaf leaves, no bootstrap) is fitted on every prefix of the
+    ranking and scored on the test flows. The rankings of all the numbers of trees
+    of a depth are given by a single forest of the largest number of trees
+    (first_trees), and cached in output.rankings.json. The fits of each prefix size
+    are jobs of a TrainingScheduler of processes workers, all the features first
+    then from the fewest. With early_stop, the longer prefixes of a (depth, number
+    of trees) are skipped once a prefix reaches the weighted F1 of all the
+    features. Results (SWEEP_COLUMNS) are written in the parquet file output after
+    each prefix size, the sweep resuming from them when run again.
+    """
+    def __init__(self, X_train, y_train, X_test, y_test, output, classes = None, max_leaf = 500, processes = 1, early_stop = True, random_seed = 42):
+        self.features = list(X_train.columns)
+        # train then test rows, shared by the workers
+        self.data = (pd.concat([X_train, X_test]), pd.concat([y_train, y_test]))
+        self.train = np.arange(len(X_train))
+        self.test = np.arange(len(X_train), len(X_train) + len(X_test))
+        self.output = output
+        self.classes = classes
+        self.max_leaf = max_leaf
+        self.early_stop = early_stop
+        self.random_seed = random_seed
+        self.scheduler = TrainingScheduler(processes)
+
+    def _forest(self, depth, n_tree):
+        return RandomForestClassifier(max_depth = depth, n_estimators = n_tree, max_leaf_nodes = self.max_leaf, random_state = self.random_seed, bootstrap = False)
+
+    def rankings(self, depths, n_trees):
+        """
+        Features ranked by importance for every (depth, number of trees).
+        """
+        filename = self.output + ".rankings.json"
+        rankings = {}
+        if isfile(filename):
+            with open(filename) as f:
+                rankings = json.load(f)
+        depths_to_fit = [depth for depth in depths if any("%s_%s" % (depth, n_tree) not in rankings for n_tree in n_trees)]
+        if len(depths_to_fit) > 0:
+            X, y = self.data
+            forests = self.scheduler.fit({depth: self._forest(depth, max(n_trees)) for depth in depths_to_fit}, {depth: (X.iloc[self.train], y.iloc[self.train]) for depth in depths_to_fit})
+            for depth, forest in forests.items():
+                for n_tree in n_trees:
+                    rankings["%s_%s" % (depth, n_tree)] = importance_ranking(first_trees(forest, n_tree), self.features)
+            with open(filename + ".tmp", "w") as f:
+                json.dump(rankings, f)
+            os.replace(filename + ".tmp", filename)
+        return {(depth, n_tree): rankings["%s_%s" % (depth, n_tree)] for depth in depths for n_tree in n_trees}
+
+    def __skipped(self, results, depth, n_tree, size):
+        # a shorter prefix already reached the weighted F1 of all the features
+        if not self.early_stop or size == len(self.features):
+            return False
+        _results = results[(results['depth'] == depth) & (results['tree'] == n_tree)]
+        full = _results.loc[_results['n_feat'] == len(self.features), 'Weighted_F1']
+        return len(full) > 0 and (_results.loc[_results['n_feat'] < size, 'Weighted_F1'] >= full.iloc[0]).any()
+
+    def __row(self, depth, n_tree, feats, y_predicted):
+        y_test = self.data[1].iloc[self.test]
+        if self.classes is None:
+            report = classification_report(y_test, y_predicted, output_dict = True, zero_division = 0)
+        else:
+            report = classification_report(y_test, y_predicted, labels = np.arange(len(self.classes)), target_names = self.classes, output_dict = True, zero_division = 0)
+        return {
+            'depth': depth,
+            'tree': n_tree,
+            'n_feat': len(feats),
+            'Macro_F1': report['macro avg']['f1-score'],
+            'Weighted_F1': report['weighted avg']['f1-score'],
+            'Accuracy': accuracy_score(y_test, y_predicted),
+            'feats': str(list(feats)),
+            'c_report': str(report)
+        }
+
+    def __write(self, results):
+        results.to_parquet(self.output + ".tmp", index = False)
+        os.replace(self.output + ".tmp", self.output)
+
+    def run(self, depths, n_trees):
+        """
+        Results of the sweep over depths and n_trees, as a DataFrame of SWEEP_COLUMNS.
+        """
+        results = pd.read_parquet(self.output) if isfile(self.output) else pd.DataFrame(columns = SWEEP_COLUMNS)
+        if len(results) > 0:
+            print("  %d results read from %s" % (len(results), self.output))
+        rankings = self.rankings(depths, n_trees)
+        for size in [len(self.features)] + list(range(1, len(self.features))):
+            done = set(zip(results['depth'].tolist(), results['tree'].tolist(), results['n_feat'].tolist()))
+            estimators = {}
+            for depth in depths:
+                for n_tree in n_trees:
+                    if (depth, n_tree, size) in done or self.__skipped(results, depth, n_tree, size):
+                        continue
+                    feats = rankings[(depth, n_tree)][:size]
+                    estimators[(depth, n_tree, size)] = Pipeline(steps = [
+                        ("feats", ColumnTransformer([("feats", "passthrough", feats)])),
+                        ("rf", self._forest(depth, n_tree))
+                    ])
+            if len(estimators) == 0:
+                continue
+            predictions = self.scheduler.fit_predict(estimators, {key: self.data for key in estimators}, self.train, self.test)
+            rows = [self.__row(depth, n_tree, rankings[(depth, n_tree)][:size], predictions[(depth, n_tree, size)]) for depth, n_tree, size in estimators]
+            results = pd.concat([results, pd.DataFrame(rows, columns = SWEEP_COLUMNS)], ignore_index = True) if len(results) > 0 else pd.DataFrame(rows, columns = SWEEP_COLUMNS)
+            self.__write(results)
+        return results
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from functools import partial
 import itertools
 from os import listdir
 from os.path import isfile, join
@@ -22,7 +23,8 @@ from sklearn.metrics import classification_report, f1_score, confusion_matrix, C
 import seaborn as sns
 import matplotlib.pyplot as plt 
 
-from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator
+from feature_sweep import FeatureSweep
+from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator, FOLD_STORAGES, RF_SEARCHES, FLOW_FEATURES, FlowRecords, get_flows_statistical_features_from_chunks, read_csv_chunks
 
 filename_patterns = { 
     "_aim_chat": "CHAT", 
@@ -77,14 +79,39 @@ class ISCXVPN2016Classifier(EncryptedTrafficClassifier):
             result = [x+[y] for x in result for y in pool]
         self.packet_ids = result
 
+    def _read_packets(self, f, c, keep_dns = False):
+        """
+        Packets of file f, of class c, by chunks of self.chunksize packets.
+        """
+        for df_new in read_csv_chunks(f, 
+                                      self.chunksize,
+                                      names = [
+                                          'flow_id',
+                                          'timestamp', 
+                                          'iat',                                                         
+                                          'source',
+                                          'sport',
+                                          'dest', 
+                                          'dport',
+                                          'protocol', 
+                                          'length'
+                                      ],
+                                      header = 0
+                                      ):
+            if not keep_dns:
+                # drop DNS traffic
+                df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
+                df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
+            df_new['class'] = c
+            yield df_new
+
     def _get_flows_with_all_packets(self):
         print("_get_flows_with_all_packets")
 
         self.classes = set()
         nb_flows = 0
-        df_flows = pd.DataFrame()
         start_time = time.time()
-        dfs = []
+        records = FlowRecords()
         
         files = [f for f in listdir(self.data_dir) if isfile(join(self.data_dir, f))]
         for _i in range(len(files)):
@@ -92,26 +119,10 @@ class ISCXVPN2016Classifier(EncryptedTrafficClassifier):
             if 'voipbuster' in f:            
                 continue
             else:
-                df_new = pd.read_csv(f, 
-                                     names = [
-                                         'flow_id',
-                                         'timestamp', 
-                                         'iat',                                                         
-                                         'source',
-                                         'sport',
-                                         'dest', 
-                                         'dport',
-                                         'protocol', 
-                                         'length'
-                                     ],
-                                     header = 0
-                                     )   
-                print(f, df_new.shape)
-            
+                print(f)
                 found = False
                 for k, v in filename_patterns.items():
                     if k in f:
-                        df_new['class'] = v
                         self.classes.add(v)
                         found = True
                         break
@@ -119,28 +130,18 @@ class ISCXVPN2016Classifier(EncryptedTrafficClassifier):
                     print("Type for file", f, "not found")
                     sys.exit(1)
                     
-                for flow_id in df_new['flow_id'].unique():                    
-                    nb_flows += 1
-                    d = df_new[df_new['flow_id'] == flow_id].head(n = 1)
-                    d['nb_packets'] = len(df_new[df_new['flow_id'] == flow_id])
-                    c = d['class'].tolist()
-                    dport = d.dport.tolist()
-                    sport = d.sport.tolist()
-                    #print(d)
-                    _df = df_new.loc[df_new['flow_id'] == flow_id, 'iat']
-                    d['sum_iat'] = np.sum(_df)
-                    
-                    _df = df_new.loc[df_new['flow_id'] == flow_id, 'length']
-                    d['sum_length'] = np.sum(_df)
-                    if dport[0] in [80, 443] or sport[0] in [80, 443]:                    
-                        if c[0] != 'STREAMING': #'netflix' not in f:
-                            d['class'] = 'BROWSING'                        
-                            self.classes.add('BROWSING')
-                    dfs.append(d)
-
-            _d = pd.concat(dfs)
-            df_flows = pd.concat([_d, df_flows])
-            dfs = []
+                # extract flows with all their packets
+                d = get_flows_statistical_features_from_chunks(self._read_packets(f, v, keep_dns = True), [sys.maxsize], self.memory_budget, min_iat_per_flow = True)[sys.maxsize]
+                d = d[[c for c in d.columns if c not in FLOW_FEATURES] + ['nb_packets', 'sum_iat', 'sum_length']]
+                nb_flows += len(d)
+                browsing = (d['dport'].isin([80, 443]) | d['sport'].isin([80, 443])) & (d['class'] != 'STREAMING') #'netflix' not in f:
+                if browsing.any():
+                    d.loc[browsing, 'class'] = 'BROWSING'
+                    self.classes.add('BROWSING')
+                # flows of each file were prepended to the ones of the previous files
+                records.append(d.iloc[::-1])
+
+        df_flows = records.to_frame().iloc[::-1]
         df_flows = df_flows.fillna(0)
         print("  processing took ", time.time() - start_time, "seconds.")
         self.classes = list(self.classes)
@@ -164,121 +165,73 @@ class ISCXVPN2016Classifier(EncryptedTrafficClassifier):
         # for _i in range(len(processed_files)):
         #     files.append(PROCESSED_PATH + processed_files[_i])
 
-        for i in self.nb_packets_per_flow:
-            self.__generate_pickle_for_n_packets(i, files)
+        # each file is read once for all the numbers of packets per flow
+        self.__generate_pickles(self.nb_packets_per_flow, files)
 
-    def __generate_pickle_for_n_packets(self, n, files):
-        print("__generate_pickle_for_n_packets n =", n)
+    def _extract_flows(self, f, nb_packets):
+        """
+        Flows of file f for every number of packets, run in a worker process when
+        self.jobs > 1: the classes found are returned instead of added to self.classes.
+        """
+        start_time = time.time()
+        classes = []
+        # elif str(n) + "_" in f or (n == 600000 and PROCESSED_PATH not in f): 
+        #elif 'spotify' in f and (str(i) + "_" in f or (n == 600000 and PROCESSED_PATH not in f)): 
+        print(f)
+        found = False
+        for k, v in filename_patterns.items():
+            if k in f:
+                classes.append(v)
+                found = True
+                break
+        if found == False:
+            print("Type for file", f, "not found")
+            sys.exit(1)
+    
+        # extract flows and add statistical features for every number of packets
+        flows = get_flows_statistical_features_from_chunks(self._read_packets(f, v), nb_packets, self.memory_budget, fixed_point = self.fixed_point)
+        # previous code was just using np.min which was always returning 0 as iat of first packet of flow is 0
+        # min_iat is now the minimum positive iat of the whole file, kept as is to allow comparison with previous results
+        for n, d in flows.items():
+            d['src'] = f
+            # There is no file with BROWSING content: consider all traffic on port 80 or 443 to be BROWSING
+            browsing = (d['dport'].isin([80, 443]) | d['sport'].isin([80, 443])) & (d['class'] != 'STREAMING')
+            if browsing.any():
+                d.loc[browsing, 'class'] = 'BROWSING'
+                classes.append('BROWSING')
+        print("  %d flows processed in " % (len(d)), time.time() - start_time, "seconds.")            
+        return len(d), (classes, flows)
+
+    def __generate_pickles(self, nb_packets, files):
+        print("__generate_pickles nb_packets =", nb_packets)
         nb_flows = 0
-        df_flows = pd.DataFrame()
+        records = {n: FlowRecords() for n in nb_packets}
         # PROCESSED_PATH = "data/ISCXVPN2016-20230713/processed/"
         self.classes = set()
         
-        for f in files:
-            # print(f)
-            start_time = time.time()
-            if 'voipbuster' in f:            
-                continue
-            else:
-            # elif str(n) + "_" in f or (n == 600000 and PROCESSED_PATH not in f): 
-                #elif 'spotify' in f and (str(i) + "_" in f or (n == 600000 and PROCESSED_PATH not in f)): 
-                df_new = pd.read_csv(f, 
-                                     names = [
-                                         'flow_id',
-                                         'timestamp', 
-                                         'iat',                                                         
-                                         'source',
-                                         'sport',
-                                         'dest', 
-                                         'dport',
-                                         'protocol', 
-                                         'length'
-                                     ],
-                                     header = 0
-                                     )   
-                print(n, f, df_new.shape)
-            
-                # drop DNS traffic
-                df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-                df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-                
-                found = False
-                for k, v in filename_patterns.items():
-                    if k in f:
-                        df_new['class'] = v
-                        self.classes.add(v)
-                        found = True
-                        break
-                if found == False:
-                    print("Type for file", f, "not found")
-                    sys.exit(1)
-            
-                # extract flow and add statistical features
-                for flow_id in df_new['flow_id'].unique():                    
-                    nb_flows += 1
-                    _df_new = df_new[df_new['flow_id'] == flow_id].head(n = n)
-                    d = _df_new.head(n = 1)
-                    d['nb_packets'] = len(_df_new) #[df_new['flow_id'] == flow_id])
-                    c = d['class'].tolist()
-                    dport = d.dport.tolist()
-                    sport = d.sport.tolist()
-                    #print(d)
-                    _df = _df_new.loc[_df_new['flow_id'] == flow_id, 'iat']
-                    
-                    d['min_iat'] = np.min(df_new[df_new['iat'] > 0]['iat'])
-                    # previous code was just using np.min which was always returning 0 as iat of first packet of flow is 0
-                    # code kept commented here to allow comparison with previous results
-                    # d['min_iat'] = np.min(_df) # probably useless as most probably always 0 for the first packet
-                    
-                    d['max_iat'] = np.max(_df)
-                    d['sum_iat'] = np.sum(_df)
-                    d['mean_iat'] = np.mean(_df)
-                    d['median_iat'] = np.median(_df)
-                    d['std_iat'] = np.std(_df)
-                    d['1stQ_iat'] = np.quantile(_df, 0.25)
-                    d['3rdQ_iat'] = np.quantile(_df, 0.75)
-                    _a = list(_df)
-                    d['skew_iat'] = skew(_a)
-                    d['kurt_iat'] = kurtosis(_a)
-                    
-                    _df = _df_new.loc[_df_new['flow_id'] == flow_id, 'length']
-                    d['min_length'] = np.min(_df)
-                    d['max_length'] = np.max(_df)
-                    d['sum_length'] = np.sum(_df)
-                    d['median_length'] = np.median(_df)
-                    d['mean_length'] = np.mean(_df)
-                    d['std_length'] = np.std(_df)
-                    d['1stQ_length'] = np.quantile(_df, 0.25)
-                    d['3rdQ_length'] = np.quantile(_df, 0.75)
-                    _a = list(_df)
-                    d['skew_length'] = skew(_a)
-                    # d['skew_length'] = skew(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'length']))
-                    d['kurt_length'] = kurtosis(_a)
-                    d['src'] = f
-                    # There is no file with BROWSING content: consider all traffic on port 80 or 443 to be BROWSING
-                    # d_netflix_as_browsing = d
-                    # d_no_browsing = d.copy()
-                    if dport[0] in [80, 443] or sport[0] in [80, 443]:                    
-                        if c[0] != 'STREAMING': #'netflix' not in f:
-                            d['class'] = 'BROWSING'                        
-                            self.classes.add('BROWSING')
-                        # else:
-                        #     d_netflix_as_browsing = d.copy()
-                        #     d_netflix_as_browsing['class'] = "BROWSING"  
-                                
-                    # df_flows_netflix_as_browsing = pd.concat([d_netflix_as_browsing, df_flows_netflix_as_browsing])
-                    df_flows = pd.concat([d, df_flows])                            
-                    # df_flows_no_browsing = pd.concat([d_no_browsing, df_flows_no_browsing])
-                
-            # print("%d flows processed" % nb_flows)            
-            print("  %d flows processed in " % (nb_flows), time.time() - start_time, "seconds.")            
+        files = [f for f in files if 'voipbuster' not in f]
+        # files are processed in parallel, results are merged in the order of files
+        for classes, flows in self._map_files(partial(self._extract_flows, nb_packets = nb_packets), files):
+            for c in classes:
+                self.classes.add(c)
+            for n, d in flows.items():
+                records[n].append(d)
+            nb_flows += len(d)
+        print("%d flows processed" % nb_flows)            
+        self.classes = list(self.classes)
+        for n in nb_packets:
+            self.__generate_pickle_for_n_packets(n, records[n])
+
+    def __generate_pickle_for_n_packets(self, n, records):
+        print("__generate_pickle_for_n_packets n =", n)
         # Finish processing the data, create the train/tests split and save as pickle files
+        # flows were historically prepended one by one, keep the same (reversed) order
+        df_flows = records.to_frame().iloc[::-1]
         df_flows = df_flows.fillna(0)
         # df_flows_netflix_as_browsing = df_flows_netflix_as_browsing.fillna(0)
         # df_flows_no_browsing = df_flows_no_browsing.fillna(0)        
         
         # self.__hotencode_class(df_flows_netflix_as_browsing)
-        self.classes = list(self.classes)
         self._hotencode_class(df_flows)
         # self.__hotencode_class(df_flows_no_browsing)
         
@@ -412,158 +365,24 @@ class ISCXVPN2016Classifier(EncryptedTrafficClassifier):
     ########################################
     # Akem's methods
     ########################################
-    # Feature Importance
-    """
-    Function to Fit model based on optimal values of depth and number of estimators and use it
-    to compute feature importance for all the features.
-    """
-    def get_feature_importance(depth, n_tree, max_leaf, X_train, y_train):
-        from sklearn.ensemble import RandomForestClassifier
-        
-        # rf_opt = RandomForestClassifier(max_depth = depth, n_estimators = n_tree, random_state=42, bootstrap=False)
-        rf_opt = RandomForestClassifier(max_depth = depth, n_estimators = n_tree, max_leaf_nodes=max_leaf, random_state=42, bootstrap=False)
-        rf_opt.fit(X_train, y_train)
-        feature_importance = pd.DataFrame(rf_opt.feature_importances_)
-        feature_importance.index = X_train.columns
-        feature_importance = feature_importance.sort_values(by=list(feature_importance.columns),axis=0,ascending=False)
-        
-        return feature_importance
-
-
-    """
-    Function to Fit model based on optimal values of depth and number of estimators and feature importance
-    to find the fewest possible features to exceed the previously attained score with all selected features
-    """
-    def get_fewest_features(depth, n_tree, max_leaf, importance):    
-        sorted_feature_names = importance.index
-        # print('sorted_feature_names: ', sorted_feature_names)
-        features = []
-        for f in range(1,len(sorted_feature_names)+1):
-            features.append(sorted_feature_names[0:f])
-            # print('features:', features)
-        return features
-
-
-    def get_result_scores(classes, cl_report):
-        precision=[]
-        recall=[]
-        f1_score=[]
-        supports=[]
-        for a_class in classes:
-            precision.append(cl_report[a_class]['precision'])
-            recall.append(cl_report[a_class]['recall'])
-            f1_score.append(cl_report[a_class]['f1-score'])
-            supports.append(cl_report[a_class]['support'])
-        return precision, recall, f1_score, supports
-
-
-    def get_scores(classes, depth, n_tree, feats, max_leaf, X_train, y_train, X_test, y_test):
-        from sklearn.ensemble import RandomForestClassifier
-        model = RandomForestClassifier(max_depth=depth, n_estimators = n_tree, max_leaf_nodes=max_leaf, n_jobs=4,
-                                       random_state=42, bootstrap=False)                              
-
-        model.fit(X_train[feats], y_train)
-        y_pred = model.predict(X_test[feats])
-        
-        class_report = classification_report(y_test, y_pred, target_names=classes, output_dict = True)
-        
-        accurac = model.score(X_test[feats], y_test)
-        macro_score = class_report['macro avg']['f1-score']
-        weighted_score = class_report['weighted avg']['f1-score']
-
-        return model, class_report, macro_score, weighted_score, y_pred, accurac
-
-    def get_x_y(Dataset, classes, feats):
-        Dataset = Dataset[Dataset["Label"].isin(classes)]    
-        X = Dataset[feats]
-        y = Dataset['Label'].replace(classes, range(len(classes)))
-        #     y = Dataset.columns[-1].replace(classes, range(len(classes)))
-        
-        return X, y
-
-    def analyze_models(classes, model_type, depths, n_trees, X_train, y_train, X_test, y_test, max_leaf, filename_out):
-        
-        with open(filename_out, "w") as res_file:
-            print('depth;tree;n_feat;Macro_F1;Weighted_F1;Accuracy;feats;c_report', file=res_file)
-            if model_type == 'RF':
-                # FOR EACH (depth, n_tree, feat)
-                for depth in depths:
-                    for n_tree in n_trees:
-                        # get feature orders to use
-                        importance = get_feature_importance(depth, n_tree, max_leaf, X_train, y_train)
-
-                        m_feats = get_fewest_features(depth, n_tree, max_leaf, importance) 
-                        for feats in m_feats:
-                            # Get the scores with the given (depth, n_tree, feat)
-                            model, c_report, macro_f1, weight_f1, y_pred, accuracs = get_scores(classes, depth, n_tree, feats, max_leaf, X_train, y_train, X_test, y_test)
-                            
-                            print(str(depth)+';'+str(n_tree)+';'+str(len(feats))+';'+str(macro_f1)+';'+str(weight_f1)+';'+str(accuracs)+';'+str(list(feats))+';'+str(c_report), file=res_file)
-        print("Analysis Complete. Check output file.")
-        return []
-
     # N = number of packets in flows, feats = array of feature names to use, feat_name = string to add to output file name
     def analyze_models_for_npkts(self, N, feats, feat_name):
-        #for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-        i = (N, self.filenames[0], 0)
+        i = (N, 0)
         print("Number of packets per flow: ", N)
         
-        X_trains, y_trains = X_train[i][feats], y_train[i]
-        X_tests,  y_tests  = X_test[i][feats], y_test[i]
+        X_trains, y_trains = self.X_train_flows[i][feats], self.y_train_flows[i]
+        X_tests,  y_tests  = self.X_test_flows[i][feats], self.y_test_flows[i]
         
-        results_file = "Models_" + feat_name + "_" + str(N) + "_pkts_.csv"
-        analyze_models(self.classes, "RF", range(7, 20, 1), range(1, 8, 2), X_trains, y_trains, X_tests, y_tests, 500, results_file)
+        # parallel and resumed from the results already in results_file
+        results_file = "Models_" + feat_name + "_" + str(N) + "_pkts_" + ("binned_" if self.binned else "") + ".parquet"
+        sweep = FeatureSweep(X_trains, y_trains, X_tests, y_tests, results_file, classes = list(self.classes), max_leaf = 500, processes = self.jobs)
+        results = sweep.run(range(7, 20, 1), range(1, 8, 2))
         
-        results = pd.read_csv(results_file, sep=';')
         results = results.sort_values(by=['Weighted_F1','Macro_F1'],ascending=False)
         print(results.head(10))
         print("******")
         print(results.head(1)['c_report'].values)
 
-    ########################################
-    # GBoost
-    ########################################
-    def GBoost_predict(self, feats, df_score):
-        print("GBoost_predict")
-        from sklearn.ensemble import GradientBoostingClassifier
-        gb_model = {}
-        
-        for i in EncryptedTrafficClassifierIterator(classifier.flow_ids): # for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-            gb_model[i] = GradientBoostingClassifier(n_estimators=100, learning_rate=1.0, max_depth=1, random_state = 42)
-
-        for i in EncryptedTrafficClassifierIterator(classifier.flow_ids): # for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-            print("==",i,"==")
-            try:
-                gb_model[i].fit(X_train[i][feats], y_train[i])
-            except ValueError as e:
-                print(e)
-                pass
-        
-        gb_y_train_predicted = {}
-        gb_y_test_predicted = {}
-        gb_train_score = {}
-        gb_test_score = {}
-        for i in EncryptedTrafficClassifierIterator(classifier.flow_ids): # for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-            print("==",i,"==")
-            gb_y_train_predicted[i] = gb_model[i].predict(X_train[i][feats])
-            gb_y_test_predicted[i] = gb_model[i].predict(X_test[i][feats])
-            gb_train_score[i] = gb_model[i].score(X_train[i][feats], y_train[i])
-            gb_test_score[i] = gb_model[i].score(X_test[i][feats], y_test[i])
-
-        self._get_scores_from_models(gb_model, y_test, gb_y_test_predicted, feats)
-
-        gb_cm_dict = {}
-        for i in EncryptedTrafficClassifierIterator(classifier.flow_ids): # for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-            print("==",i,"==")
-            gb_cm_dict[i] = confusion_matrix(y_test[i], gb_y_test_predicted[i].astype(int))
-            print(gb_cm_dict[i])
-
-        for i in EncryptedTrafficClassifierIterator(classifier.flow_ids): # for i in itertools.product(NB_PACKETS, self.filenames, range(NB_FOLDS)):
-            n = i[0]
-            df_score[filename].loc[df_score[filename]['nb_packets'] == n, 'gb_train_score'] = gb_train_score[i]
-            df_score[filename].loc[df_score[filename]['nb_packets'] == n, 'gb_test_score'] = gb_test_score[i]
-        
-        return gb_model, gb_y_train_predicted, gb_y_test_predicted
-
 ########################################
 # Entry point
 ########################################
@@ -579,6 +398,15 @@ if __name__ == "__main__":
     parser.add_argument('-v', '--visualization', action = 'store_true', required = False, default = False)
     parser.add_argument('-r', '--report', action = 'store_true', required = False, default = False)
     parser.add_argument('-F', '--force_rf_classification', action = 'store_true', required = False, default = False)
+    parser.add_argument('-j', '--jobs', action = 'store', default = 1, type = int)
+    parser.add_argument('-s', '--storage', action = 'store', default = 'feather', choices = FOLD_STORAGES)
+    parser.add_argument('--rf_search', action = 'store', default = 'grid', choices = RF_SEARCHES)
+    parser.add_argument('--rf_search_time_budget', action = 'store', default = None, type = float)
+    parser.add_argument('--binned', action = 'store_true', required = False, default = False)
+    parser.add_argument('-m', '--memory_budget', action = 'store', default = 2048, type = int)
+    parser.add_argument('-q', '--fixed_point', action = 'store', default = None, type = int)
+    parser.add_argument('--fixed_point_report', action = 'store_true', required = False, default = False)
+    parser.add_argument('--analyze_models', action = 'store_true', required = False, default = False)
     args = parser.parse_args(sys.argv[1:])
 
     VISUALIZATION_ENABLED = False
@@ -606,6 +434,13 @@ if __name__ == "__main__":
     
     if args.force_rf_classification == True:
         classifier.force_rf_classification = True
+    classifier.jobs = args.jobs
+    classifier.fold_storage = args.storage
+    classifier.rf_search = args.rf_search
+    classifier.rf_search_time_budget = args.rf_search_time_budget
+    classifier.binned = args.binned
+    classifier.memory_budget = args.memory_budget * 1024 * 1024
+    classifier.set_fixed_point(args.fixed_point)
 
     classifier.all_classes = {
         0: 'BROWSING',
@@ -698,6 +533,10 @@ if __name__ == "__main__":
     ]
     feats_flows = all_features_flows
     
+    if args.fixed_point_report == True:
+        classifier.fixed_point_report()
+        sys.exit(0)
+
     # Preprocessing
     if not classifier.data_prepared():
         classifier.data_preparation()
@@ -735,8 +574,9 @@ if __name__ == "__main__":
     classifier.X_train_flows_fitted = classifier.X_train_flows
     classifier.X_test_flows_fitted = classifier.X_test_flows
     # __correlation()
-    # feats = all_features
-    # analyze_models_for_npkts(10, all_features, "all_feats")
+    if args.analyze_models == True:
+        for n in classifier.nb_packets_per_flow:
+            classifier.analyze_models_for_npkts(n, all_features_flows, "all_feats")
 
     if args.report == True:
         classifier._viz(distribution = 0, class_distribution = -1, nb_packets = -1, min_iat = -1, max_iat = -1)
@@ -879,11 +719,31 @@ if __name__ == "__main__":
 
 
     if GB_ENABLED:
-        gb_regr, gb_y_train_predicted, gb_y_test_predicted  = classifier.GBoost_predict(feats_flows, df_score)
-        gb_cm_dict = classifier.confusion_matrix(gb_regr, gb_y_test_predicted, False)
-        gb_f1_scores = classifier.get_F1_score(df_score, gb_cm_dict,  y_test, gb_y_test_predicted, "gb", False)
-        classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids_without_folds)
-        # classifier.avg_f1_scores(gb_f1_scores)
+        print("==== GradientBoosting =====")
+        gb_regr, gb_y_train_predicted, gb_y_test_flows_predicted = classifier.GBoost_predict(
+            classifier.X_train_flows_fitted,
+            classifier.y_train_flows,
+            classifier.X_test_flows_fitted,
+            classifier.y_test_flows
+        )
+        
+        gb_cm_dict_flows, output = classifier.confusion_matrix(gb_regr,
+                                                               classifier.y_test_flows,
+                                                               gb_y_test_flows_predicted,
+                                                               classifier.flow_ids,
+                                                               "gb"
+                                                               )
+        print(output)
+            
+        gb_f1_scores_flows, output = classifier.get_F1_score(
+            gb_cm_dict_flows,
+            classifier.y_test_flows,
+            gb_y_test_flows_predicted,
+            classifier.flow_ids,
+            "gb_flows")
+        print(output)
+        avg_scores, output = classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids)
+        print(output)
 
     if XG_ENABLED:
         print("==== XGBoost =====")
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from functools import partial
 import itertools
 from os import listdir
 from os.path import isfile, join
@@ -19,7 +20,7 @@ from sklearn.metrics import classification_report, f1_score, confusion_matrix
 import seaborn as sns
 import matplotlib.pyplot as plt 
 
-from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator
+from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator, FOLD_STORAGES, RF_SEARCHES, FLOW_FEATURES, FlowRecords, get_flows_statistical_features_from_chunks, read_csv_chunks
 
 filename_patterns = { 
     "youtube_": "STREAMING",
@@ -63,80 +64,70 @@ class NetFlowQUICClassifier(EncryptedTrafficClassifier):
     ########################################
     # Preprocessing
     ########################################
+    def _read_packets(self, f, c):
+        """
+        Packets of file f but DNS traffic, of class c, by chunks of self.chunksize packets.
+        """
+        for df_new in read_csv_chunks(f, 
+                                      self.chunksize,
+                                      names = [
+                                          'packet_id',
+                                          'timestamp', 
+                                          'iat',                                                         
+                                          'source',
+                                          'sport',
+                                          'dest', 
+                                          'dport',
+                                          'protocol', 
+                                          'length',
+                                          'flow_id'
+                                      ],
+                                      dtype = {
+                                          'flow_id': 'Int32',
+                                          'timestamp': np.float64, 
+                                          'iat': np.float64,                                                         
+                                          'source':str,
+                                          'sport': 'Int32',
+                                          'dest': str, 
+                                          'dport': 'Int32',
+                                          'protocol': 'Int32',
+                                          'length': 'Int64',
+                                          'flow_id': 'Int64'
+                                      },
+                                      header = 0
+                                      ):
+            # drop DNS traffic
+            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
+            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
+            df_new['class'] = c
+            yield df_new
+
     def _get_flows_with_all_packets(self):
         print("_get_flows_with_all_packets")
-        df_flows = {}
         start_time = time.time()
         nb_flows = 0
-        df_flows = pd.DataFrame()
+        records = FlowRecords()
         self.classes = set()
         files = [f for f in listdir(self.data_dir) if isfile(join(self.data_dir, f))]
         for _i in range(len(files)):
             f = self.data_dir + "/" + files[_i]
             print("f=", f)
             start_time = time.time()
-            df_new = pd.read_csv(f, 
-                                 names = [
-                                     'packet_id',
-                                     'timestamp', 
-                                     'iat',                                                         
-                                     'source',
-                                     'sport',
-                                     'dest', 
-                                     'dport',
-                                     'protocol', 
-                                     'length',
-                                     'flow_id'
-                                 ],
-                                 dtype = {
-                                     'flow_id': 'Int32',
-                                     'timestamp': np.float64, 
-                                     'iat': np.float64,                                                         
-                                     'source':str,
-                                     'sport': 'Int32',
-                                     'dest': str, 
-                                     'dport': 'Int32',
-                                     'protocol': 'Int32',
-                                     'length': 'Int64',
-                                     'flow_id': 'Int64'
-                                 },
-                                 header = 0
-                                 )   
-            print(f, df_new.shape)
-            
-            # drop DNS traffic
-            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-            
             found = False
             for k, v in filename_patterns.items():
                 if k in f:
-                    df_new['class'] = v
                     self.classes.add(v)
                     found = True
                     break
             if found == False:
                 print("Type for file", f, "not found")
                 sys.exit(1)
-            dfs = []
             # extract flow and add statistical features
-            for flow_id in df_new['flow_id'].unique():                    
-                nb_flows += 1
-                df_new = df_new.sort_values(by = ['packet_id'])
-                d = df_new[df_new['flow_id'] == flow_id].head(n = 1)
-                d['nb_packets'] = len(df_new[df_new['flow_id'] == flow_id])
-                c = d['class'].tolist()
-                dport = d.dport.tolist()
-                sport = d.sport.tolist()
-                #print(d)
-                _df = df_new.loc[df_new['flow_id'] == flow_id, 'iat']
-                d['sum_iat'] = np.sum(_df)
-                
-                _df = df_new.loc[df_new['flow_id'] == flow_id, 'length']
-                d['sum_length'] = np.sum(_df)
-                dfs.append(d)
-            _d = pd.concat(dfs)
-            df_flows = pd.concat([_d, df_flows])
+            d = get_flows_statistical_features_from_chunks(self._read_packets(f, v), [sys.maxsize], self.memory_budget, sort_by = 'packet_id', min_iat_per_flow = True)[sys.maxsize]
+            d = d[[c for c in d.columns if c not in FLOW_FEATURES] + ['nb_packets', 'sum_iat', 'sum_length']]
+            nb_flows += len(d)
+            # flows of each file were prepended to the ones of the previous files
+            records.append(d.iloc[::-1])
 
             print(f, "processed in ", time.time() - start_time, "seconds.")            
             
@@ -146,6 +137,7 @@ class NetFlowQUICClassifier(EncryptedTrafficClassifier):
         print("  processing took ", time.time() - start_time, "seconds.")
         print("%d flows processed" % nb_flows)            
         # Finish processing the data, create the train/tests split and save as pickle files
+        df_flows = records.to_frame().iloc[::-1]
         df_flows = df_flows.fillna(0)
         
         self.classes = list(self.classes)
@@ -163,127 +155,82 @@ class NetFlowQUICClassifier(EncryptedTrafficClassifier):
             files[_i] = self.data_dir + "/" + files[_i]
 
         # print(files)
-        for i in self.nb_packets_per_flow:
-            self.__generate_pickle_for_n_packets(i, files)
-
-    def __generate_pickle_for_n_packets(self, n, files):
-        print("__generate_pickle_for_n_packets n =", n)
-
-        for fold in range(self.nb_folds):
-            if self._test_data_prepared((n, fold)):
+        nb_packets = []
+        for n in self.nb_packets_per_flow:
+            if any(self._test_data_prepared((n, fold)) for fold in range(self.nb_folds)):
                 print("pickle files detected for ", n, "packets")
-                return 
+            else:
+                nb_packets.append(n)
+        if len(nb_packets) == 0:
+            return
+        # each file is read once for all the numbers of packets per flow
+        self.__generate_pickles(nb_packets, files)
+
+    def _extract_flows(self, f, nb_packets):
+        """
+        Flows of file f for every number of packets, run in a worker process when
+        self.jobs > 1: the classes found are returned instead of added to self.classes.
+        """
+        start_time = time.time()
+        classes = []
+        print(f)
+        found = False
+        for k, v in filename_patterns.items():
+            if k in f:
+                classes.append(v)
+                found = True
+                break
+        if found == False:
+            print("Type for file", f, "not found")
+            sys.exit(1)
+        
+        # extract flows and add statistical features for every number of packets
+        flows = get_flows_statistical_features_from_chunks(self._read_packets(f, v), nb_packets, self.memory_budget, sort_by = 'packet_id', min_iat_per_flow = True, fixed_point = self.fixed_point)
+        # flows are represented by the same first packet whatever the number of packets
+        d = flows[nb_packets[0]]
+        nb_flows = len(d)
+        negative_iat = d['iat'] < 0
+        if negative_iat.any():
+            print(d[negative_iat]['flow_id'].tolist(), "have negative iat")
+        long_iat = d['iat'] > 120
+        if long_iat.any():
+            print(d[long_iat]['flow_id'].tolist(), "have iat > 120")
+        for n, d in flows.items():
+            d = d[~(negative_iat | long_iat)]
+            d['src'] = f
+            flows[n] = d
+
+        print(f, "processed in ", time.time() - start_time, "seconds.")            
+        return nb_flows, (nb_flows, classes, flows)
+
+    def __generate_pickles(self, nb_packets, files):
+        print("__generate_pickles nb_packets =", nb_packets)
         nb_flows = 0
-        df_flows = pd.DataFrame()
+        records = {n: FlowRecords() for n in nb_packets}
         self.classes = set()
-        for f in files:
-            # print("f=", f)
-            start_time = time.time()
-            df_new = pd.read_csv(f, 
-                                 names = [
-                                     'packet_id',
-                                     'timestamp', 
-                                     'iat',                                                         
-                                     'source',
-                                     'sport',
-                                     'dest', 
-                                     'dport',
-                                     'protocol', 
-                                     'length',
-                                     'flow_id'
-                                 ],
-                                 dtype = {
-                                     'flow_id': 'Int32',
-                                     'timestamp': np.float64, 
-                                     'iat': np.float64,                                                         
-                                     'source':str,
-                                     'sport': 'Int32',
-                                     'dest': str, 
-                                     'dport': 'Int32',
-                                     'protocol': 'Int32',
-                                     'length': 'Int64',
-                                     'flow_id': 'Int64'
-                                 },
-                                 header = 0
-                                 )   
-            print(n, f, df_new.shape)
-            
-            # drop DNS traffic
-            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-            
-            found = False
-            for k, v in filename_patterns.items():
-                if k in f:
-                    df_new['class'] = v
-                    self.classes.add(v)
-                    found = True
-                    break
-            if found == False:
-                print("Type for file", f, "not found")
-                sys.exit(1)
-            
-            # extract flow and add statistical features
-            for flow_id in df_new['flow_id'].unique():                    
-                nb_flows += 1
-                df_new = df_new.sort_values(by = ['packet_id'])
-                _df_new = df_new[df_new['flow_id'] == flow_id].head(n = n)
-                d = _df_new.head(n = 1)
-                d['nb_packets'] = len(_df_new) #df_new[df_new['flow_id'] == flow_id])
-                c = d['class'].tolist()
-                dport = d.dport.tolist()
-                sport = d.sport.tolist()
-                #print(d)
-                _df = _df_new['iat']
-                d['min_iat'] = 0
-                d['min_iat'] = np.min(_df_new[_df_new['iat'] > 0]['iat'])
-                if len(d[d['iat'] < 0]) > 0:
-                    print(_df_new, "has negative iat")
-                    continue
-                if len(d[d['iat'] > 120]) > 0:
-                    print(_df_new, "has iat > 120")
-                    continue
-                d['max_iat'] = np.max(_df)
-                d['sum_iat'] = np.sum(_df)
-                d['mean_iat'] = np.mean(_df)
-                d['median_iat'] = np.median(_df)
-                d['std_iat'] = np.std(_df)
-                d['1stQ_iat'] = np.quantile(_df, 0.25)
-                d['3rdQ_iat'] = np.quantile(_df, 0.75)
-                _a = list(_df)
-                d['skew_iat'] = skew(_a)
-                d['kurt_iat'] = kurtosis(_a)
-                # d['skew_iat'] = skew(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'iat']))
-                # d['kurt_iat'] = kurtosis(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'iat']))
-                
-                _df = _df_new['length']
-                d['min_length'] = np.min(_df)
-                d['max_length'] = np.max(_df)
-                d['sum_length'] = np.sum(_df)
-                d['median_length'] = np.median(_df)
-                d['mean_length'] = np.mean(_df)
-                d['std_length'] = np.std(_df)
-                d['1stQ_length'] = np.quantile(_df, 0.25)
-                d['3rdQ_length'] = np.quantile(_df, 0.75)
-                _a = list(_df)
-                d['skew_length'] = skew(_a)
-                # d['skew_length'] = skew(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'length']))
-                d['kurt_length'] = kurtosis(_a)
-                # d['kurt_length'] = kurtosis(np.array(df_new.loc[df_new['flow_id'] == flow_id, 'length']))
-                
-                d['src'] = f
-                df_flows = pd.concat([d, df_flows])
-
-            print(f, "processed in ", time.time() - start_time, "seconds.")            
+        # files are processed in parallel, results are merged in the order of files
+        for _nb_flows, classes, flows in self._map_files(partial(self._extract_flows, nb_packets = nb_packets), files):
+            nb_flows += _nb_flows
+            for c in classes:
+                self.classes.add(c)
+            for n, d in flows.items():
+                records[n].append(d)
             
             # uncomment following line to stop after the first file during debug
             # break
                 
         print("%d flows processed" % nb_flows)            
+        self.classes = list(self.classes)
+        for n in nb_packets:
+            self.__generate_pickle_for_n_packets(n, records[n])
+
+    def __generate_pickle_for_n_packets(self, n, records):
+        print("__generate_pickle_for_n_packets n =", n)
         # Finish processing the data, create the train/tests split and save as pickle files
+        # flows were historically prepended one by one, keep the same (reversed) order
+        df_flows = records.to_frame().iloc[::-1]
         df_flows = df_flows.fillna(0)
         
-        self.classes = list(self.classes)
         self._hotencode_class(df_flows)
         
         filename = self.filename_prefix + "_" + str(n) + ".pickle"
@@ -448,52 +395,6 @@ class NetFlowQUICClassifier(EncryptedTrafficClassifier):
     #     print("******")
     #     print(results.head(1)['c_report'].values)
 
-    ########################################
-    # GBoost
-    ########################################
-    def GBoost_predict(self, feats):
-        print("GBoost_predict")
-        from sklearn.ensemble import GradientBoostingClassifier
-        gb_model = {}
-        
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            gb_model[i] = GradientBoostingClassifier(n_estimators=100, learning_rate=1.0, max_depth=1, random_state = 42)
-
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            try:
-                gb_model[i].fit(X_train[i][feats], y_train[i])
-            except ValueError as e:
-                print(e)
-                pass
-        
-        gb_y_train_predicted = {}
-        gb_y_test_predicted = {}
-        gb_train_score = {}
-        gb_test_score = {}
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            gb_y_train_predicted[i] = gb_model[i].predict(X_train[i][feats])
-            gb_y_test_predicted[i] = gb_model[i].predict(X_test[i][feats])
-            gb_train_score[i] = gb_model[i].score(X_train[i][feats], y_train[i])
-            gb_test_score[i] = gb_model[i].score(X_test[i][feats], y_test[i])
-
-        self._get_scores_from_models(gb_model, y_test, gb_y_test_predicted, feats)
-
-        gb_cm_dict = {}
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            gb_cm_dict[i] = confusion_matrix(y_test[i], gb_y_test_predicted[i].astype(int))
-            print(gb_cm_dict[i])
-
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            pkt, _ = i
-            classification_results.loc[classification_results['nb_packets'] == pkt, 'gb_train_score'] = gb_train_score[i]
-            classification_results.loc[classification_results['nb_packets'] == pkt, 'gb_test_score'] = gb_test_score[i]
-        
-        return gb_model, gb_y_train_predicted, gb_y_test_predicted
-
-
 ########################################
 # Entry point
 ########################################
@@ -509,6 +410,14 @@ if __name__ == "__main__":
     parser.add_argument('-v', '--visualization', action = 'store_true', required = False, default = False)
     parser.add_argument('-r', '--report', action = 'store_true', required = False, default = False)
     parser.add_argument('-F', '--force_rf_classification', action = 'store_true', required = False, default = False)
+    parser.add_argument('-j', '--jobs', action = 'store', default = 1, type = int)
+    parser.add_argument('-s', '--storage', action = 'store', default = 'feather', choices = FOLD_STORAGES)
+    parser.add_argument('--rf_search', action = 'store', default = 'grid', choices = RF_SEARCHES)
+    parser.add_argument('--rf_search_time_budget', action = 'store', default = None, type = float)
+    parser.add_argument('--binned', action = 'store_true', required = False, default = False)
+    parser.add_argument('-m', '--memory_budget', action = 'store', default = 2048, type = int)
+    parser.add_argument('-q', '--fixed_point', action = 'store', default = None, type = int)
+    parser.add_argument('--fixed_point_report', action = 'store_true', required = False, default = False)
     args = parser.parse_args(sys.argv[1:])
 
     VISUALIZATION_ENABLED = False
@@ -536,6 +445,13 @@ if __name__ == "__main__":
 
     if args.force_rf_classification == True:
         classifier.force_rf_classification = True
+    classifier.jobs = args.jobs
+    classifier.fold_storage = args.storage
+    classifier.rf_search = args.rf_search
+    classifier.rf_search_time_budget = args.rf_search_time_budget
+    classifier.binned = args.binned
+    classifier.memory_budget = args.memory_budget * 1024 * 1024
+    classifier.set_fixed_point(args.fixed_point)
 
     classifier.all_classes = [
         "youtube",
@@ -623,6 +539,10 @@ if __name__ == "__main__":
     ]
     feats_flows = all_features_flows
     
+    if args.fixed_point_report == True:
+        classifier.fixed_point_report()
+        sys.exit(0)
+
     # Preprocessing
     if not classifier.data_prepared():
         classifier.data_preparation()
@@ -779,11 +699,32 @@ if __name__ == "__main__":
 
     if GB_ENABLED:
         print("==== GradientBoosting =====")
-        gb_regr, gb_y_train_predicted, gb_y_test_predicted  = classifier.GBoost_predict(feats_flows, classification_results)
-        gb_cm_dict = classifier.confusion_matrix(gb_regr, classifier.y_test_flows, gb_y_test_predicted, classifier.flow_ids, "gb")
-        gb_f1_scores = classifier.get_F1_score(gb_cm_dict,  y_test, gb_y_test_predicted, "gb", False)
-        classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids_without_folds)
-        # classifier.avg_f1_scores(gb_f1_scores)
+        gb_regr, gb_y_train_predicted, gb_y_test_flows_predicted = classifier.GBoost_predict(
+            classifier.X_train_flows_fitted,
+            classifier.y_train_flows,
+            classifier.X_test_flows_fitted,
+            classifier.y_test_flows
+        )
+        
+        gb_cm_dict_flows, output = classifier.confusion_matrix(gb_regr,
+                                                               classifier.y_test_flows,
+                                                               gb_y_test_flows_predicted,
+                                                               classifier.flow_ids,
+                                                               "gb"
+                                                               )
+        print(output)
+            
+        gb_f1_scores_flows, output = classifier.get_F1_score(
+            gb_cm_dict_flows,
+            classifier.y_test_flows,
+            gb_y_test_flows_predicted,
+            classifier.flow_ids,
+            "gb_flows")
+        print(output)
+        # gb_cm_dict, classifier.y_test_flows, gb_y_test_predicted, "gb", False)
+        avg_scores, output = classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids)
+        print(output)
+        # print(gb_f1_scores)
 
     if XG_ENABLED:
         print("==== XGBoost =====")
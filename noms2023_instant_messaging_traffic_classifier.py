@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from functools import partial
 import itertools
 from os import listdir
 from os.path import isfile, join
@@ -22,7 +23,8 @@ from sklearn.metrics import classification_report, f1_score, confusion_matrix, C
 import seaborn as sns
 import matplotlib.pyplot as plt 
 
-from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator
+from feature_sweep import FeatureSweep
+from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator, FOLD_STORAGES, RF_SEARCHES, FlowRecords, FLOW_FEATURES, get_flows_statistical_features_from_chunks, read_csv_chunks
 
 ########################################
 # Data preparation: convert RAW data
@@ -69,8 +71,45 @@ class NOMS2023InstantMessagingClassifier(EncryptedTrafficClassifier):
             files[_i] = self.data_dir + "/" + files[_i]
 
         # print(files)
-        for i in self.nb_packets_per_flow:
-            self.__generate_pickle_for_n_packets(i, files)
+        nb_packets = []
+        for n in self.nb_packets_per_flow:
+            if any(self._test_data_prepared((n, fold)) for fold in range(self.nb_folds)):
+                print("pickle files detected for ", n, "packets")
+            else:
+                nb_packets.append(n)
+        if len(nb_packets) == 0:
+            return
+        # each file is read once for all the numbers of packets per flow
+        self.__generate_pickles(nb_packets, files)
+
+    def _read_packets(self, f, c):
+        """
+        Packets of file f but DNS traffic, of class c if not None, by chunks of self.chunksize packets.
+        """
+        # same format as written by data_preparation/pkts2flows.py
+        for df_new in read_csv_chunks(f, 
+                                      self.chunksize,
+                                      names = [
+                                          'packet_id',
+                                          'timestamp', 
+                                          'iat',                                                         
+                                          'source',
+                                          'sport',
+                                          'dest', 
+                                          'dport',
+                                          'protocol', 
+                                          'length',
+                                          'flow_id',
+                                      ],
+                                      header = 0,
+                                      index_col = False
+                                      ):
+            # drop DNS traffic
+            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
+            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
+            if c is not None:
+                df_new['class'] = c
+            yield df_new
 
     def _get_flows_with_all_packets(self):
         print("_get_flows_with_all_packets")
@@ -78,64 +117,33 @@ class NOMS2023InstantMessagingClassifier(EncryptedTrafficClassifier):
         self.classes = set()
         start_time = time.time()
         nb_flows = 0
-        df_flows = pd.DataFrame()
+        records = FlowRecords()
         files = [f for f in listdir(self.data_dir) if isfile(join(self.data_dir, f))]
         for _i in range(len(files)):
             f = self.data_dir + "/" + files[_i]
             # print("f=", f)
-            df_new = pd.read_csv(f, 
-                                 names = [
-                                     'flow_id',
-                                     'timestamp', 
-                                     'iat',                                                         
-                                     'source',
-                                     'sport',
-                                     'dest', 
-                                     'dport',
-                                     'protocol', 
-                                     'length'
-                                 ],
-                                 header = 0
-                                 )   
-            print(f, df_new.shape)
-            
-            # drop DNS traffic
-            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-            
-            found = False
+            # same format as in data_preparation, as written by data_preparation/pkts2flows.py
+            print(f)
+            c = None
             for _c in self.all_classes:
                 if _c in f:
-                    found = True
-                    df_new['class'] = _c
+                    c = _c
                     self.classes.add(_c)
                     break
-            if found == False:
+            if c is None:
                 print("class not identified for", f)
-            dfs = []
             # extract flow and add statistical features
-            for flow_id in df_new['flow_id'].unique():                    
-                nb_flows += 1
-                d = df_new[df_new['flow_id'] == flow_id].head(n = 1)
-                d['nb_packets'] = len(df_new[df_new['flow_id'] == flow_id])
-                c = d['class'].tolist()
-                dport = d.dport.tolist()
-                sport = d.sport.tolist()
-                #print(d)
-                _df = df_new.loc[df_new['flow_id'] == flow_id, 'iat']
-                d['sum_iat'] = np.sum(_df)
-                
-                _df = df_new.loc[df_new['flow_id'] == flow_id, 'length']
-                d['sum_length'] = np.sum(_df)
-                dfs.append(d)
-            _d = pd.concat(dfs)
-            df_flows = pd.concat([df_flows, _d])
+            d = get_flows_statistical_features_from_chunks(self._read_packets(f, c), [sys.maxsize], self.memory_budget, min_iat_per_flow = True)[sys.maxsize]
+            d = d[[_c for _c in d.columns if _c not in FLOW_FEATURES] + ['nb_packets', 'sum_iat', 'sum_length']]
+            nb_flows += len(d)
+            records.append(d)
             # uncomment for debugging
             # break
                 
         print(f, "processed in ", time.time() - start_time, "seconds.")            
         print("%d flows processed" % nb_flows)            
         # Finish processing the data, create the train/tests split and save as pickle files
+        df_flows = records.to_frame()
         df_flows = df_flows.fillna(0)
         
         self.classes = list(self.classes)
@@ -189,133 +197,69 @@ class NOMS2023InstantMessagingClassifier(EncryptedTrafficClassifier):
             print(df_flows.columns)
         return d
         
-    def __generate_pickle_for_n_packets(self, n, files):
-        print("__generate_pickle_for_n_packets n =", n)
-
-        for fold in range(self.nb_folds):
-            if self._test_data_prepared((n, fold)):
-                print("pickle files detected for ", n, "packets")
-                return
+    def _extract_flows(self, f, nb_packets):
+        """
+        Flows of file f for every number of packets, run in a worker process when
+        self.jobs > 1: the classes found are returned instead of added to self.classes.
+        """
+        classes = []
+        print(f)
+        c = None
+        for _c in self.all_classes:
+            if _c in f:
+                c = _c
+                classes.append(_c)
+                break
+        if c is None:
+            print("class not identified for", f)
+
+        #df_new.groupby(by = 'flow_id', group_keys = False).apply(self.__statistical_features, n, df_flows, f, nb_flows)
+        # extract flows and add statistical features for every number of packets
+        flows = get_flows_statistical_features_from_chunks(self._read_packets(f, c), nb_packets, self.memory_budget, fixed_point = self.fixed_point)
+        nb_flows = len(flows[nb_packets[0]])
+        print("nb flows = ", nb_flows)
+        for n, d in flows.items():
+            if n != 600000:
+                too_short = d['nb_packets'] != n
+                for flow_id, _nb_packets in zip(d[too_short]['flow_id'], d[too_short]['nb_packets']):
+                    print("Flow #", flow_id," has only", _nb_packets," packets, skipping...")
+                d = d[~too_short]
+            no_duration = d['sum_iat'] == 0
+            for flow_id in d[no_duration]['flow_id']:
+                print("Total duration is 0 for flow #", flow_id, ", skipping...")
+            d = d[~no_duration]
+            # sum_iat was historically computed before the other features
+            d = d[[c for c in d.columns if c not in FLOW_FEATURES] + ['nb_packets', 'sum_iat'] + [c for c in FLOW_FEATURES if c not in ['nb_packets', 'sum_iat']]]
+            d['src'] = f
+            flows[n] = d
+        return nb_flows, (nb_flows, classes, flows)
+
+    def __generate_pickles(self, nb_packets, files):
+        print("__generate_pickles nb_packets =", nb_packets)
         nb_flows = [0]
-        df_flows = pd.DataFrame()
-        dfs = []
+        records = {n: FlowRecords() for n in nb_packets}
         self.classes = set()
         start_time = time.time()
-        for f in files:
-            # print("f=", f)
-            df_new = pd.read_csv(f, 
-                                 names = [
-                                     'packet_id',
-                                     'timestamp', 
-                                     'iat',                                                         
-                                     'source',
-                                     'sport',
-                                     'dest', 
-                                     'dport',
-                                     'protocol', 
-                                     'length',
-                                     'flow_id',
-                                 ],
-                                 header = 0,
-                                 index_col = False
-                                 )   
-            print(n, f, df_new.shape)
-            #print(df_new) 
-            # drop DNS traffic
-            df_new = df_new.drop(df_new[df_new['sport'] == 53].index)
-            df_new = df_new.drop(df_new[df_new['dport'] == 53].index)
-            
-            found = False
-            for _c in self.all_classes:
-                if _c in f:
-                    found = True
-                    df_new['class'] = _c
-                    self.classes.add(_c)
-                    break
-            if found == False:
-                print("class not identified for", f)
-
-            print("nb flows = ", len(df_new['flow_id'].unique()))
-            #df_new.groupby(by = 'flow_id', group_keys = False).apply(self.__statistical_features, n, df_flows, f, nb_flows)
-            # extract flow and add statistical features
-            for flow_id in df_new['flow_id'].unique():                    
-                 nb_flows[0] += 1
-                 d = df_new[df_new['flow_id'] == flow_id].head(n = 1)
-                 _df_new = df_new[df_new['flow_id'] == flow_id].head(n = n)
-                 d['nb_packets'] = len(_df_new) #df_new[df_new['flow_id'] == flow_id])
-                 if n != 600000 and d['nb_packets'].iloc[0] != n:
-                     print("Flow #", flow_id," has only", d['nb_packets'].iloc[0]," packets, skipping...")
-                     continue
-                 c = d['class'].tolist()
-                 dport = d.dport.tolist()
-                 sport = d.sport.tolist()
-                 #print(d)
-                 _df = _df_new['iat']
-                 d['sum_iat'] = np.sum(_df)
-                 if d['sum_iat'].iloc[0] == 0:
-                     print("Total duration is 0 for flow #", flow_id, ", skipping...")
-                     continue
-                 d['min_iat'] = np.min(df_new[df_new['iat'] > 0]['iat']) # probably useless as most probably always 0 for the first packet
-                 d['max_iat'] = np.max(_df)
-                 d['mean_iat'] = np.mean(_df)
-                 d['median_iat'] = np.median(_df)
-                 d['std_iat'] = np.std(_df)
-                 try:     
-                    d['1stQ_iat'] = np.quantile(_df, 0.25)
-                 except Exception as e:
-                    d['1stQ_iat'] = 0
-
-                 try:     
-                    d['3rdQ_iat'] = np.quantile(_df, 0.75)
-                 except Exception as e:
-                    d['3rdQ_iat'] = 0
-                 _a = list(_df)
-                 try:     
-                     d['skew_iat'] = skew(_a)
-                 except Exception as e:
-                     d['skew_iat'] = 0
-                 try:     
-                    d['kurt_iat'] = kurtosis(_a)
-                 except Exception as e:
-                    d['kurt_iat'] = 0
-                
-                 _df = _df_new['length']
-                 d['min_length'] = np.min(_df)
-                 d['max_length'] = np.max(_df)
-                 d['sum_length'] = np.sum(_df)
-                 d['median_length'] = np.median(_df)
-                 d['mean_length'] = np.mean(_df)
-                 d['std_length'] = np.std(_df)
-                 try:     
-                    d['1stQ_length'] = np.quantile(_df, 0.25)
-                 except Exception as e:
-                    d['1stQ_length'] = 0
-                 try:     
-                    d['3rdQ_length'] = np.quantile(_df, 0.75)
-                 except Exception as e:
-                    d['3rdQ_length'] = 0
-                 _a = list(_df)
-                 try:     
-                    d['skew_length'] = skew(_a)
-                 except Exception as e:
-                    d['skew_length'] = 0
-                 try:     
-                    d['kurt_length'] = kurtosis(_a)
-                 except Exception as e:
-                    d['kurt_length'] = 0
-               
-                 d['src'] = f
-                 dfs.append(d)
-                 # df_flows = pd.concat([d, df_flows])
+        # files are processed in parallel, results are merged in the order of files
+        for _nb_flows, classes, flows in self._map_files(partial(self._extract_flows, nb_packets = nb_packets), files):
+            nb_flows[0] += _nb_flows
+            for c in classes:
+                self.classes.add(c)
+            for n, d in flows.items():
+                records[n].append(d)
                  
-        df_flows = pd.concat(dfs)
-                
-        print(f, "processed in ", time.time() - start_time, "seconds.")            
+        print(len(files), "files processed in ", time.time() - start_time, "seconds.")            
         print("%d flows processed" % nb_flows[0])            
+        self.classes = list(self.classes)
+        for n in nb_packets:
+            self.__generate_pickle_for_n_packets(n, records[n])
+
+    def __generate_pickle_for_n_packets(self, n, records):
+        print("__generate_pickle_for_n_packets n =", n)
+        df_flows = records.to_frame()
         # Finish processing the data, create the train/tests split and save as pickle files
         df_flows = df_flows.fillna(0)
         
-        self.classes = list(self.classes)
         self._hotencode_class(df_flows)
         
         filename = self.filename_prefix + "_" + str(n) + ".pickle"
@@ -378,159 +322,24 @@ class NOMS2023InstantMessagingClassifier(EncryptedTrafficClassifier):
     ########################################
     # Akem's methods
     ########################################
-    # Feature Importance
-    """
-    Function to Fit model based on optimal values of depth and number of estimators and use it
-    to compute feature importance for all the features.
-    """
-    def get_feature_importance(depth, n_tree, max_leaf, X_train, y_train):
-        from sklearn.ensemble import RandomForestClassifier
-        
-        # rf_opt = RandomForestClassifier(max_depth = depth, n_estimators = n_tree, random_state=42, bootstrap=False)
-        rf_opt = RandomForestClassifier(max_depth = depth, n_estimators = n_tree, max_leaf_nodes=max_leaf, random_state=42, bootstrap=False)
-        rf_opt.fit(X_train, y_train)
-        feature_importance = pd.DataFrame(rf_opt.feature_importances_)
-        feature_importance.index = X_train.columns
-        feature_importance = feature_importance.sort_values(by=list(feature_importance.columns),axis=0,ascending=False)
-        
-        return feature_importance
-
-
-    """
-    Function to Fit model based on optimal values of depth and number of estimators and feature importance
-    to find the fewest possible features to exceed the previously attained score with all selected features
-    """
-    def get_fewest_features(depth, n_tree, max_leaf, importance):    
-        sorted_feature_names = importance.index
-        # print('sorted_feature_names: ', sorted_feature_names)
-        features = []
-        for f in range(1,len(sorted_feature_names)+1):
-            features.append(sorted_feature_names[0:f])
-            # print('features:', features)
-        return features
-
-
-    def get_result_scores(classes, cl_report):
-        precision=[]
-        recall=[]
-        f1_score=[]
-        supports=[]
-        for a_class in classes:
-            precision.append(cl_report[a_class]['precision'])
-            recall.append(cl_report[a_class]['recall'])
-            f1_score.append(cl_report[a_class]['f1-score'])
-            supports.append(cl_report[a_class]['support'])
-        return precision, recall, f1_score, supports
-
-
-    def get_scores(classes, depth, n_tree, feats, max_leaf, X_train, y_train, X_test, y_test):
-        from sklearn.ensemble import RandomForestClassifier
-        model = RandomForestClassifier(max_depth=depth, n_estimators = n_tree, max_leaf_nodes=max_leaf, n_jobs=4,
-                                       random_state=42, bootstrap=False)                              
-
-        model.fit(X_train[feats], y_train)
-        y_pred = model.predict(X_test[feats])
-        
-        class_report = classification_report(y_test, y_pred, target_names=classes, output_dict = True)
-        
-        accurac = model.score(X_test[feats], y_test)
-        macro_score = class_report['macro avg']['f1-score']
-        weighted_score = class_report['weighted avg']['f1-score']
-
-        return model, class_report, macro_score, weighted_score, y_pred, accurac
-
-
-    def get_x_y(Dataset, classes, feats):
-        Dataset = Dataset[Dataset["Label"].isin(classes)]    
-        X = Dataset[feats]
-        y = Dataset['Label'].replace(classes, range(len(classes)))
-        #     y = Dataset.columns[-1].replace(classes, range(len(classes)))
-        
-        return X, y
-
-    def analyze_models(classes, model_type, depths, n_trees, X_train, y_train, X_test, y_test, max_leaf, filename_out):
-        
-        with open(filename_out, "w") as res_file:
-            print('depth;tree;n_feat;Macro_F1;Weighted_F1;Accuracy;feats;c_report', file=res_file)
-            if model_type == 'RF':
-                # FOR EACH (depth, n_tree, feat)
-                for depth in depths:
-                    for n_tree in n_trees:
-                        # get feature orders to use
-                        importance = get_feature_importance(depth, n_tree, max_leaf, X_train, y_train)
-
-                        m_feats = get_fewest_features(depth, n_tree, max_leaf, importance) 
-                        for feats in m_feats:
-                            # Get the scores with the given (depth, n_tree, feat)
-                            model, c_report, macro_f1, weight_f1, y_pred, accuracs = get_scores(classes, depth, n_tree, feats, max_leaf, X_train, y_train, X_test, y_test)
-                            
-                            print(str(depth)+';'+str(n_tree)+';'+str(len(feats))+';'+str(macro_f1)+';'+str(weight_f1)+';'+str(accuracs)+';'+str(list(feats))+';'+str(c_report), file=res_file)
-        print("Analysis Complete. Check output file.")
-        return []
-
     # N = number of packets in flows, feats = array of feature names to use, feat_name = string to add to output file name
     def analyze_models_for_npkts(self, N, feats, feat_name):
-        i = (N, self.filenames[0], 0)
+        i = (N, 0)
         print("Number of packets per flow: ", N)
         
-        X_trains, y_trains = X_train[i][feats], y_train[i]
-        X_tests,  y_tests  = X_test[i][feats], y_test[i]
+        X_trains, y_trains = self.X_train_flows[i][feats], self.y_train_flows[i]
+        X_tests,  y_tests  = self.X_test_flows[i][feats], self.y_test_flows[i]
         
-        results_file = "Models_" + feat_name + "_" + str(N) + "_pkts_.csv"
-        analyze_models(self.classes, "RF", range(7, 20, 1), range(1, 8, 2), X_trains, y_trains, X_tests, y_tests, 500, results_file)
+        # parallel and resumed from the results already in results_file
+        results_file = "Models_" + feat_name + "_" + str(N) + "_pkts_" + ("binned_" if self.binned else "") + ".parquet"
+        sweep = FeatureSweep(X_trains, y_trains, X_tests, y_tests, results_file, classes = list(self.classes), max_leaf = 500, processes = self.jobs)
+        results = sweep.run(range(7, 20, 1), range(1, 8, 2))
         
-        results = pd.read_csv(results_file, sep=';')
         results = results.sort_values(by=['Weighted_F1','Macro_F1'],ascending=False)
         print(results.head(10))
         print("******")
         print(results.head(1)['c_report'].values)
 
-    ########################################
-    # GBoost
-    ########################################
-    def GBoost_predict(self, feats):
-        print("GBoost_predict")
-        from sklearn.ensemble import GradientBoostingClassifier
-        gb_model = {}
-        
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            gb_model[i] = GradientBoostingClassifier(n_estimators=100, learning_rate=1.0, max_depth=1, random_state = 42)
-
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            try:
-                gb_model[i].fit(X_train[i][feats], y_train[i])
-            except ValueError as e:
-                print(e)
-                pass
-        
-        gb_y_train_predicted = {}
-        gb_y_test_predicted = {}
-        gb_train_score = {}
-        gb_test_score = {}
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            gb_y_train_predicted[i] = gb_model[i].predict(X_train[i][feats])
-            gb_y_test_predicted[i] = gb_model[i].predict(X_test[i][feats])
-            gb_train_score[i] = gb_model[i].score(X_train[i][feats], y_train[i])
-            gb_test_score[i] = gb_model[i].score(X_test[i][feats], y_test[i])
-
-        self._get_scores_from_models(gb_model, y_test, gb_y_test_predicted, feats)
-
-        gb_cm_dict = {}
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            print("==",i,"==")
-            gb_cm_dict[i] = confusion_matrix(y_test[i], gb_y_test_predicted[i].astype(int))
-            print(gb_cm_dict[i])
-
-        for i in EncryptedTrafficClassifierIterator(self.flow_ids):
-            pkt, _ = i
-            classification_results.loc[classification_results['nb_packets'] == pkt, 'gb_train_score'] = gb_train_score[i]
-            classification_results.loc[classification_results['nb_packets'] == pkt, 'gb_test_score'] = gb_test_score[i]
-        
-        return gb_model, gb_y_train_predicted, gb_y_test_predicted
-
-
 ########################################
 # Entry point
 ########################################
@@ -546,6 +355,15 @@ if __name__ == "__main__":
     parser.add_argument('-v', '--visualization', action = 'store_true', required = False, default = False)
     parser.add_argument('-r', '--report', action = 'store_true', required = False, default = False)
     parser.add_argument('-F', '--force_rf_classification', action = 'store_true', required = False, default = False)
+    parser.add_argument('-j', '--jobs', action = 'store', default = 1, type = int)
+    parser.add_argument('-s', '--storage', action = 'store', default = 'feather', choices = FOLD_STORAGES)
+    parser.add_argument('--rf_search', action = 'store', default = 'grid', choices = RF_SEARCHES)
+    parser.add_argument('--rf_search_time_budget', action = 'store', default = None, type = float)
+    parser.add_argument('--binned', action = 'store_true', required = False, default = False)
+    parser.add_argument('-m', '--memory_budget', action = 'store', default = 2048, type = int)
+    parser.add_argument('-q', '--fixed_point', action = 'store', default = None, type = int)
+    parser.add_argument('--fixed_point_report', action = 'store_true', required = False, default = False)
+    parser.add_argument('--analyze_models', action = 'store_true', required = False, default = False)
     args = parser.parse_args(sys.argv[1:])
 
     # NB_PACKETS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 600000]
@@ -574,6 +392,13 @@ if __name__ == "__main__":
 
     if args.force_rf_classification == True:
         classifier.force_rf_classification = True
+    classifier.jobs = args.jobs
+    classifier.fold_storage = args.storage
+    classifier.rf_search = args.rf_search
+    classifier.rf_search_time_budget = args.rf_search_time_budget
+    classifier.binned = args.binned
+    classifier.memory_budget = args.memory_budget * 1024 * 1024
+    classifier.set_fixed_point(args.fixed_point)
         
     classifier.all_classes = [
         "discord",
@@ -667,6 +492,10 @@ if __name__ == "__main__":
     ]
     feats_flows = all_features_flows
     
+    if args.fixed_point_report == True:
+        classifier.fixed_point_report()
+        sys.exit(0)
+
     # Preprocessing
     if not classifier.data_prepared():
         classifier.data_preparation()
@@ -737,7 +566,9 @@ if __name__ == "__main__":
     classifier.X_test_flows_fitted = classifier.X_test_flows
     
     # __correlation()
-    # analyze_models_for_npkts(10, all_features, "all_feats")
+    if args.analyze_models == True:
+        for n in classifier.nb_packets_per_flow:
+            classifier.analyze_models_for_npkts(n, all_features_flows, "all_feats")
     if args.report == True:
         classifier._viz(distribution = 0, class_distribution = -1, nb_packets = -1, min_iat = -1, max_iat = -1)
         for n in classifier.nb_packets_per_flow:
@@ -823,11 +654,33 @@ if __name__ == "__main__":
 
     if GB_ENABLED:
         print("==== GradientBoosting =====")
-        gb_regr, gb_y_train_predicted, gb_y_test_predicted  = classifier.GBoost_predict(feats_flows, classification_results)
-        gb_cm_dict = classifier.confusion_matrix(gb_regr, classifier.y_test_flows, gb_y_test_predicted, classifier.flow_ids, "gb")
-        gb_f1_scores = classifier.get_F1_score(gb_cm_dict,  y_test, gb_y_test_predicted, "gb", False)
-        classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids_without_folds)
-        classifier.avg_f1_scores(gb_f1_scores)
+        gb_regr, gb_y_train_predicted, gb_y_test_flows_predicted = classifier.GBoost_predict(
+            classifier.X_train_flows_fitted,
+            classifier.y_train_flows,
+            classifier.X_test_flows_fitted,
+            classifier.y_test_flows
+        )
+        
+        # feats_flows, classification_results)
+        # gb_cm_dict = classifier.confusion_matrix(gb_regr, gb_y_test_predicted, False)
+        gb_cm_dict_flows, output = classifier.confusion_matrix(gb_regr,
+                                                               classifier.y_test_flows,
+                                                               gb_y_test_flows_predicted,
+                                                               classifier.flow_ids,
+                                                               "gb"
+                                                               )
+        print(output)
+            
+        gb_f1_scores_flows, output = classifier.get_F1_score(
+            gb_cm_dict_flows,
+            classifier.y_test_flows,
+            gb_y_test_flows_predicted,
+            classifier.flow_ids,
+            "gb_flows")
+        print(output)
+        # gb_cm_dict, classifier.y_test_flows, gb_y_test_predicted, "gb", False)
+        avg_scores, output = classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids)
+        print(output)
 
     if XG_ENABLED:
         print("==== XGBoost =====")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from bisect import bisect_right
+import math
+
+import numpy as np
+
+########################################
+# Quantile sketch
+########################################
+class QuantileSketch():
+    """
+    Bounded memory summary of a stream of values (deterministic compactors of
+    Manku, Rajagopalan and Lindsay, as in KLL): level h keeps values of weight
+    2 ** h. Once a level holds size values, they are sorted and every other one,
+    alternately from the first or the second, goes to the next level. The rank
+    of the value returned for a rank is off by at most about
+    n * log2(n / size) / size, for size * log2(n / size) values kept.
+    """
+    def __init__(self, size = 256):
+        # even, so that the weight of a level is kept by its compaction
+        self.size = size + size % 2
+        self.levels = [[]]
+        self.offsets = [0]
+        self.n = 0
+        self.__sorted = None
+
+    def __compact(self, h):
+        # every other value of an even number of values of level h to level h + 1, the largest one staying if they are odd
+        if h + 1 == len(self.levels):
+            self.levels.append([])
+            self.offsets.append(0)
+        values = sorted(self.levels[h])
+        even = len(values) - len(values) % 2
+        self.levels[h + 1].extend(values[self.offsets[h]:even:2])
+        self.offsets[h] ^= 1
+        self.levels[h] = values[even:]
+
+    def update(self, x):
+        self.n += 1
+        self.__sorted = None
+        self.levels[0].append(x)
+        h = 0
+        while len(self.levels[h]) >= self.size:
+            self.__compact(h)
+            h += 1
+
+    def merge(self, other):
+        """
+        Add the values summarized by other (a QuantileSketch of the same size), the
+        levels of the same weight being compacted together.
+        """
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append([])
+                self.offsets.append(0)
+            self.levels[h].extend(level)
+        self.n += other.n
+        self.__sorted = None
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) >= self.size:
+                self.__compact(h)
+            h += 1
+        return self
+
+    def value(self, rank):
+        # value of rank (from 0) among the sorted values seen
+        if self.__sorted is None:
+            self.__sorted = sorted((x, 1 << h) for h, level in enumerate(self.levels) for x in level)
+        for x, weight in self.__sorted:
+            if rank < weight:
+                return x
+            rank -= weight
+        return self.__sorted[-1][0]
+
+########################################
+# Online statistics
+########################################
+def _quantile(value, n, q):
+    # same linear interpolation as np.quantile, value(i) is the i-th smallest value
+    virtual_index = (n - 1) * q
+    previous_index = math.floor(virtual_index)
+    gamma = virtual_index - previous_index
+    a = value(previous_index)
+    b = value(min(previous_index + 1, n - 1))
+    diff_b_a = b - a
+    if gamma >= 0.5:
+        return b - diff_b_a * (1 - gamma)
+    return a + diff_b_a * gamma
+
+class OnlineStatistics():
+    """
+    Statistics of a stream of values updated one value at a time: count, min, max
+    and sum, and the central moments of Welford/Terriberry for mean, std, skew and
+    kurtosis (same definitions as pandas std(ddof = 0) and scipy.stats skew and
+    kurtosis). Median and quartiles are exact while at most exact_size values have
+    been seen (same as np.median and np.quantile), then given by a QuantileSketch
+    of sketch_size values per level, so the memory used only grows with the
+    logarithm of the number of values.
+    """
+    def __init__(self, exact_size = 256, sketch_size = 256):
+        self.exact_size = exact_size
+        self.sketch_size = sketch_size
+        self.n = 0
+        self.min = math.nan
+        self.max = math.nan
+        # exact for integers, compensated (Neumaier) for floats
+        self.sum = 0
+        self.__compensation = 0.0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.__m3 = 0.0
+        self.__m4 = 0.0
+        self.values = []
+        self.sketch = None
+
+    def __len__(self):
+        return self.n
+
+    def update(self, x):
+        n1 = self.n
+        self.n += 1
+        n = self.n
+        if n1 == 0 or x < self.min:
+            self.min = x
+        if n1 == 0 or x > self.max:
+            self.max = x
+        if isinstance(x, (int, np.integer)):
+            self.sum += int(x)
+        else:
+            total = self.sum + x
+            if abs(self.sum) >= abs(x):
+                self.__compensation += (self.sum - total) + x
+            else:
+                self.__compensation += (x - total) + self.sum
+            self.sum = total
+
+        delta = x - self.__mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term1 = delta * delta_n * n1
+        self.__mean += delta_n
+        self.__m4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self.__m2 - 4 * delta_n * self.__m3
+        self.__m3 += term1 * delta_n * (n - 2) - 3 * delta_n * self.__m2
+        self.__m2 += term1
+
+        if self.sketch is None:
+            self.values.insert(bisect_right(self.values, x), x)
+            if len(self.values) > self.exact_size:
+                self.sketch = QuantileSketch(self.sketch_size)
+                for value in self.values:
+                    self.sketch.update(value)
+                self.values = []
+        else:
+            self.sketch.update(x)
+
+    def update_many(self, values):
+        for x in values.tolist() if isinstance(values, np.ndarray) else values:
+            self.update(x)
+
+    @property
+    def total(self):
+        return self.sum + self.__compensation if isinstance(self.sum, float) else self.sum
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n > 0 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.__m2 / self.n) if self.n > 0 else math.nan
+
+    def __zero_variance(self):
+        # same threshold as scipy.stats for a nan skew and kurtosis
+        return self.n == 0 or self.__m2 / self.n <= (np.finfo(np.float64).eps * self.mean) ** 2
+
+    @property
+    def skew(self):
+        if self.__zero_variance():
+            return math.nan
+        return (self.__m3 / self.n) / (self.__m2 / self.n) ** 1.5
+
+    @property
+    def kurt(self):
+        if self.__zero_variance():
+            return math.nan
+        return (self.__m4 / self.n) / (self.__m2 / self.n) ** 2.0 - 3
+
+    def quantile(self, q):
+        if self.n == 0:
+            return math.nan
+        if self.sketch is None:
+            return _quantile(self.values.__getitem__, self.n, q)
+        return _quantile(self.sketch.value, self.n, q)
+
+    @property
+    def median(self):
+        if self.n == 0 or self.sketch is not None:
+            return self.quantile(0.5)
+        return (self.values[(self.n - 1) // 2] + self.values[self.n // 2]) / 2
+
+    def describe(self, suffix):
+        """
+        Same features as get_flows_statistical_features for the values seen.
+        """
+        return {
+            'min_' + suffix: self.min,
+            'max_' + suffix: self.max,
+            'sum_' + suffix: self.total,
+            'mean_' + suffix: self.mean,
+            'median_' + suffix: self.median,
+            'std_' + suffix: self.std,
+            '1stQ_' + suffix: self.quantile(0.25),
+            '3rdQ_' + suffix: self.quantile(0.75),
+            'skew_' + suffix: self.skew,
+            'kurt_' + suffix: self.kurt
+        }
+
+########################################
+# Online flow features
+########################################
+class OnlineFlowFeatures():
+    """
+    Statistical features of a flow (FLOW_FEATURES) updated packet by packet, with
+    min_iat the minimum positive iat of the flow (min_iat_per_flow = True).
+    """
+    def __init__(self, exact_size = 256, sketch_size = 256):
+        self.iat = OnlineStatistics(exact_size, sketch_size)
+        self.length = OnlineStatistics(exact_size, sketch_size)
+        self.min_positive_iat = math.inf
+
+    def __len__(self):
+        return len(self.iat)
+
+    def update(self, iat, length):
+        self.iat.update(iat)
+        self.length.update(length)
+        if 0 < iat < self.min_positive_iat:
+            self.min_positive_iat = iat
+
+    def features(self):
+        features = {'nb_packets': len(self)}
+        features.update(self.iat.describe('iat'))
+        features['min_iat'] = math.nan if math.isinf(self.min_positive_iat) else self.min_positive_iat
+        features.update(self.length.describe('length'))
+        return features
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+from collections import OrderedDict
+import csv
+import pickle
+import select
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from compiled_forest import CompiledForest
+from online_statistics import OnlineFlowFeatures
+from data_preparation.pcapreader import PCAP_EXTENSIONS, read_packets
+
+# features that can be computed from the first packets of a flow at line rate, min_iat
+# left out: it is the minimum iat of the whole file in the prepared data, not of the flow
+ONLINE_FEATURES = [
+    'sum_iat',
+    'sum_length',
+    'max_length',
+    'mean_iat',
+    'max_iat',
+    'mean_length',
+    'min_length'
+]
+
+DECISION_FIELDS = ['src', 'sport', 'dst', 'dport', 'protocol', 'nb_packets', 'timestamp', 'class', 'latency_ms']
+
+########################################
+# Packet sources
+########################################
+def pcap_batches(filename, batch_size):
+    # packets of a pcap or pcapng file as (timestamp, src, sport, dst, dport, protocol, iat, length)
+    for packets in read_packets(filename, batch_size):
+        yield zip(packets['time_epoch'].tolist(),
+                  packets['src'].tolist(),
+                  packets['sport'].tolist(),
+                  packets['dst'].tolist(),
+                  packets['dport'].tolist(),
+                  packets['proto'].tolist(),
+                  packets['time_delta'].tolist(),
+                  packets['frame_len'].tolist())
+
+def csv_batches(f, batch_size):
+    """
+    Same as pcap_batches for the lines written by pcap2csv.sh (tshark) in f, e.g. a
+    pipe from a live capture: a batch ends once no more line is available yet.
+    """
+    reader = csv.reader(f)
+    next(reader, None)
+    batch = []
+    for _, epoch, delta, src, sport, dst, dport, protocol, length in reader:
+        batch.append((float(epoch), src, int(sport or -1), dst, int(dport or -1), int(protocol or -1), float(delta), int(length)))
+        if len(batch) >= batch_size or not select.select([f], [], [], 0)[0]:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+########################################
+# OnlineTrafficClassifier
+########################################
+class OnlineTrafficClassifier():
+    """
+    Classify the flows (5-tuples) of a stream of packets as soon as they have
+    nb_packets packets, with the features of their first packets updated packet by
+    packet. Flows ready in the same batch of packets, or batch_size flows, are
+    classified by a single call to model.predict. Flows still having fewer packets
+    at the end of the stream, or idle for idle_timeout seconds, are classified with
+    their packets. As in the prepared data, iat is the time since the previous
+    packet of the capture and DNS packets are ignored unless keep_dns. Only the
+    5-tuples of the last max_decided flows classified are kept, to ignore their
+    next packets: a flow seen again after them is classified again.
+    """
+    def __init__(self, model, features, nb_packets, classes = {}, batch_size = 1024, keep_dns = False, idle_timeout = None, max_decided = 1000000):
+        self.model = model
+        self.features = features
+        self.nb_packets = nb_packets
+        self.classes = classes
+        self.batch_size = batch_size
+        self.keep_dns = keep_dns
+        self.idle_timeout = idle_timeout
+        self.max_decided = max_decided
+        # 5-tuple -> [OnlineFlowFeatures, timestamp of the last packet] of the flows not classified yet, and
+        # 5-tuple -> timestamp of the last packet of the flows classified, both from the least recently seen
+        self.flows = OrderedDict()
+        self.decided = OrderedDict()
+        self.pending = []
+        self.nb_packets_read = 0
+        self.nb_flows = 0
+        self.latencies = []
+        self.duration = 0
+
+    def _add_packet(self, timestamp, src, sport, dst, dport, protocol, iat, length):
+        if src == '' or (not self.keep_dns and (sport == 53 or dport == 53)):
+            return
+        key = (src, sport, dst, dport, protocol)
+        if key in self.decided:
+            self.decided[key] = timestamp
+            self.decided.move_to_end(key)
+            return
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = [OnlineFlowFeatures(exact_size = self.nb_packets), timestamp]
+            self.flows[key] = flow
+            self.nb_flows += 1
+        else:
+            flow[1] = timestamp
+            self.flows.move_to_end(key)
+        flow[0].update(iat, length)
+        if len(flow[0]) == self.nb_packets:
+            self._ready(key, flow[0], timestamp)
+            del self.flows[key]
+            self.decided[key] = timestamp
+            if len(self.decided) > self.max_decided:
+                self.decided.popitem(last = False)
+
+    def _ready(self, key, flow, timestamp):
+        # flow: OnlineFlowFeatures
+        self.pending.append((key, flow.features(), timestamp, time.perf_counter()))
+
+    def _expire(self, timestamp):
+        # flows idle for more than idle_timeout seconds at timestamp, found from the least recently seen
+        while len(self.flows) > 0:
+            key, (flow, last) = next(iter(self.flows.items()))
+            if timestamp - last <= self.idle_timeout:
+                break
+            self._ready(key, flow, last)
+            del self.flows[key]
+        while len(self.decided) > 0 and timestamp - next(iter(self.decided.values())) > self.idle_timeout:
+            self.decided.popitem(last = False)
+
+    def _decide(self):
+        X = pd.DataFrame([features for _, features, _, _ in self.pending], columns = self.features)
+        y = self.model.predict(X)
+        now = time.perf_counter()
+        for (key, features, timestamp, arrival), c in zip(self.pending, y.tolist()):
+            self.latencies.append(now - arrival)
+            yield key + (features['nb_packets'], timestamp, self.classes.get(c, c), (now - arrival) * 1000)
+        self.pending = []
+
+    def classify(self, batches):
+        """
+        Decisions (DECISION_FIELDS) for the flows of batches of packets (timestamp,
+        src, sport, dst, dport, protocol, iat, length), e.g. from pcap_batches.
+        """
+        start_time = time.perf_counter()
+        timestamp = None
+        for batch in batches:
+            for packet in batch:
+                self._add_packet(*packet)
+                self.nb_packets_read += 1
+                timestamp = packet[0]
+                if len(self.pending) >= self.batch_size:
+                    yield from self._decide()
+            if self.idle_timeout is not None and timestamp is not None:
+                self._expire(timestamp)
+            if len(self.pending) > 0:
+                yield from self._decide()
+        # end of the stream
+        for key, (flow, last) in self.flows.items():
+            self._ready(key, flow, last)
+            if len(self.pending) >= self.batch_size:
+                yield from self._decide()
+        if len(self.pending) > 0:
+            yield from self._decide()
+        self.duration = time.perf_counter() - start_time
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000 if len(self.latencies) > 0 else np.full(1, np.nan)
+        return {
+            'packets': self.nb_packets_read,
+            'flows': self.nb_flows,
+            'decisions': len(self.latencies),
+            'seconds': self.duration,
+            'packets/s': self.nb_packets_read / max(self.duration, 1e-9),
+            'latency_ms_p50': np.percentile(latencies, 50),
+            'latency_ms_p99': np.percentile(latencies, 99),
+            'latency_ms_max': np.max(latencies)
+        }
+
+########################################
+# Model
+########################################
+def train(processed_data_output_dir, filename_prefix, nb_packets, features, fold = 0, n_estimators = 100, random_seed = 42):
+    """
+    RandomForest trained on the flows of a fold prepared by one of the classifiers
+    (data_preparation) with their first nb_packets packets, as a CompiledForest.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from encrypted_traffic_classification import EncryptedTrafficClassifier
+    classifier = EncryptedTrafficClassifier(nb_folds = fold + 1,
+                                            nb_packets_per_flow = [nb_packets],
+                                            filename_prefix = filename_prefix,
+                                            processed_data_output_dir = processed_data_output_dir,
+                                            data_dir = None)
+    suffix = filename_prefix + "_" + str(nb_packets) + ".pickle"
+    X_train = classifier._load_pickle(str(fold) + "_X_train_" + suffix)
+    y_train = classifier._load_pickle(str(fold) + "_y_train_" + suffix)
+    X_test = classifier._load_pickle(str(fold) + "_X_test_" + suffix)
+    y_test = classifier._load_pickle(str(fold) + "_y_test_" + suffix)
+    model = RandomForestClassifier(n_estimators = n_estimators, random_state = random_seed, n_jobs = 1)
+    model.fit(X_train[features], y_train)
+    print("test score for (%d, %d) = %f" % (nb_packets, fold, model.score(X_test[features], y_test)))
+    # flattened forest, faster for the small batches of flows classified at once
+    forest = CompiledForest(model)
+    if np.array_equal(forest.predict(X_test[features]), model.predict(X_test[features])):
+        model = forest
+    else:
+        print("compiled forest predictions differ from sklearn, keeping the sklearn model")
+    classes = {}
+    if 'class' in X_train.columns:
+        classes = dict(zip(y_train.tolist(), X_train['class'].tolist()))
+    return {'model': model, 'features': features, 'nb_packets': nb_packets, 'classes': classes}
+
+########################################
+# Main
+########################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+    parser_train = subparsers.add_parser('train')
+    parser_train.add_argument('-d', '--processed_data_output_dir', required = True)
+    parser_train.add_argument('-p', '--filename_prefix', required = True)
+    parser_train.add_argument('-n', '--nb_packets', type = int, default = 4)
+    parser_train.add_argument('-f', '--fold', type = int, default = 0)
+    parser_train.add_argument('-e', '--n_estimators', type = int, default = 100)
+    parser_train.add_argument('-o', '--output', required = True)
+    parser_classify = subparsers.add_parser('classify')
+    parser_classify.add_argument('-m', '--model', required = True)
+    parser_classify.add_argument('-i', '--input', default = '-')
+    parser_classify.add_argument('-b', '--batch_size', type = int, default = 1024)
+    parser_classify.add_argument('-t', '--idle_timeout', type = float, default = None)
+    parser_classify.add_argument('--max_decided', type = int, default = 1000000)
+    parser_classify.add_argument('--keep_dns', action = 'store_true')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        trained = train(args.processed_data_output_dir, args.filename_prefix, args.nb_packets, ONLINE_FEATURES, args.fold, args.n_estimators)
+        with open(args.output, "wb") as f:
+            pickle.dump(trained, f)
+        sys.exit(0)
+
+    with open(args.model, "rb") as f:
+        trained = pickle.load(f)
+    classifier = OnlineTrafficClassifier(trained['model'], trained['features'], trained['nb_packets'], trained['classes'], args.batch_size, args.keep_dns, args.idle_timeout, args.max_decided)
+    if args.input.endswith(PCAP_EXTENSIONS):
+        batches = pcap_batches(args.input, args.batch_size)
+    elif args.input == '-':
+        batches = csv_batches(sys.stdin, args.batch_size)
+    else:
+        batches = csv_batches(open(args.input, newline = ''), args.batch_size)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(DECISION_FIELDS)
+    for decision in classifier.classify(batches):
+        writer.writerow(decision)
+    for k, v in classifier.metrics().items():
+        print(k, v, file = sys.stderr)
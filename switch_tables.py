@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import math
+
+import numpy as np
+
+from compiled_forest import float32_floor
+
+# (row, rule, field) triples matched at once by the simulator
+CHUNK_SIZE = 1 << 22
+
+########################################
+# Ternary rules
+########################################
+def range_to_ternary(low, high, bits):
+    """
+    Ternary (value, mask) rules matching the integers of [low, high] on bits bits,
+    the prefixes of the range.
+    """
+    rules = []
+    while low <= high:
+        size = low & -low if low > 0 else 1 << bits
+        while size > high - low + 1:
+            size >>= 1
+        rules.append((low, ((1 << bits) - 1) ^ (size - 1)))
+        low += size
+    return rules
+
+########################################
+# Trees of the models
+########################################
+def _random_forest_trees(forest):
+    # every tree votes for the class of its leaf
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        outputs = np.zeros((tree.node_count, forest.n_classes_))
+        outputs[np.arange(tree.node_count), np.argmax(tree.value[:, 0, :forest.n_classes_], axis = 1)] = 1
+        yield tree.feature, float32_floor(tree.threshold), tree.children_left, tree.children_right, outputs
+
+def _xgboost_trees(model):
+    # every tree adds the value of its leaf to the score of its class, x < split going left
+    learner = json.loads(model.get_booster().save_raw(raw_format = 'json'))['learner']
+    booster = learner['gradient_booster']['model']
+    nb_outputs = max(1, int(learner['learner_model_param']['num_class']))
+    base_score = np.array(json.loads(learner['learner_model_param']['base_score']), dtype = np.float64)
+    if learner['objective']['name'] in ('binary:logistic', 'reg:logistic'):
+        # stored as a probability
+        base_score = np.log(base_score / (1 - base_score))
+    trees = []
+    for tree, c in zip(booster['trees'], booster['tree_info']):
+        left = np.array(tree['left_children'])
+        split = np.array(tree['split_conditions'], dtype = np.float32)
+        threshold = np.nextafter(split, np.float32(-np.inf))
+        outputs = np.zeros((len(left), nb_outputs))
+        outputs[:, c] = np.where(left == -1, split, 0)
+        trees.append((np.array(tree['split_indices']), threshold, left, np.array(tree['right_children']), outputs))
+    return trees, np.broadcast_to(base_score, (nb_outputs,)).copy()
+
+########################################
+# Switch tables
+########################################
+class SwitchTables():
+    """
+    Match-action tables classifying flows as a tree ensemble, for the pipeline of a
+    programmable switch. The range table of a feature gives the code of its value,
+    the number of thresholds of the feature in all the trees below the value, and
+    as action the code word of the feature for every tree, the number of the
+    thresholds of the tree below the value. The table of a tree matches the code
+    words of its features, one rule of ranges per leaf, and adds the vote
+    (RandomForest) or the score (XGBoost) of the leaf to its class. The class with
+    the highest total is chosen. Thresholds are float32 and a feature goes left if
+    x <= threshold, NaN features are above every threshold.
+    """
+    def __init__(self, trees, base_score, classes):
+        trees = list(trees)
+        self.classes_ = classes
+        self.base_score = base_score
+        # thresholds of every feature used, in the order of the features of X
+        self.features = np.unique(np.concatenate([feature[left != -1] for feature, _, left, _, _ in trees]).astype(np.int64))
+        self.thresholds = [np.unique(np.concatenate([threshold[(feature == f) & (left != -1)] for feature, threshold, left, _, _ in trees])) for f in self.features]
+        # per tree: fields (positions in self.features), code word of every code of the fields,
+        # low and high code words of every rule, leaf and outputs of every rule
+        self.trees = [self.__tree_rules(*tree) for tree in trees]
+
+    def __tree_rules(self, feature, threshold, left, right, outputs):
+        internal = left != -1
+        fields = np.searchsorted(self.features, np.unique(feature[internal]))
+        position = {f: k for k, f in enumerate(fields.tolist())}
+        thresholds = [np.unique(threshold[internal & (feature == self.features[f])]) for f in fields]
+        code_words = [np.searchsorted(_thresholds, self.thresholds[f], side = 'left').tolist() + [len(_thresholds)] for f, _thresholds in zip(fields, thresholds)]
+        low = []
+        high = []
+        leaves = []
+        nodes = [(0, np.zeros(len(fields), dtype = np.int64), np.array([len(t) for t in thresholds], dtype = np.int64))]
+        while len(nodes) > 0:
+            node, _low, _high = nodes.pop()
+            if left[node] == -1:
+                low.append(_low)
+                high.append(_high)
+                leaves.append(node)
+                continue
+            k = position[np.searchsorted(self.features, feature[node])]
+            code_word = np.searchsorted(thresholds[k], threshold[node])
+            _left_high = _high.copy()
+            _left_high[k] = min(_high[k], code_word)
+            _right_low = _low.copy()
+            _right_low[k] = max(_low[k], code_word + 1)
+            nodes.append((right[node], _right_low, _high))
+            nodes.append((left[node], _low, _left_high))
+        leaves = np.array(leaves)
+        return fields, [np.array(c) for c in code_words], np.array(low).reshape(len(leaves), len(fields)), np.array(high).reshape(len(leaves), len(fields)), leaves, outputs[leaves]
+
+    def feature_rules(self, k, bits = None):
+        """
+        Rules (low, high, code) of the range table of the k-th feature used, matching
+        low < x <= high. For a feature of integers on bits bits, ternary rules
+        (value, mask, code) instead.
+        """
+        bounds = np.concatenate(([-np.inf], self.thresholds[k].astype(np.float64), [np.inf]))
+        if bits is None:
+            return [(bounds[code], bounds[code + 1], code) for code in range(len(bounds) - 1)]
+        rules = []
+        for code in range(len(bounds) - 1):
+            low = 0 if code == 0 else max(0, math.floor(bounds[code]) + 1)
+            high = (1 << bits) - 1 if code == len(bounds) - 2 else min((1 << bits) - 1, math.floor(bounds[code + 1]))
+            rules.extend((value, mask, code) for value, mask in range_to_ternary(low, high, bits))
+        return rules
+
+    def feature_code_words(self, k):
+        """
+        Action of the range table of the k-th feature used: (tree, code word of every
+        code) for the trees using the feature.
+        """
+        return [(t, code_words[list(fields).index(k)]) for t, (fields, code_words, _, _, _, _) in enumerate(self.trees) if k in fields]
+
+    def tree_rules(self, t):
+        """
+        Rules (low code words, high code words, outputs) of the table of the t-th
+        tree, the code words being those of the features self.features[fields].
+        """
+        fields, _, low, high, _, outputs = self.trees[t]
+        return list(zip(low.tolist(), high.tolist(), outputs.tolist()))
+
+    def codes(self, X):
+        """
+        Codes given by the range tables for every row of X, one column per feature used.
+        """
+        X = np.asarray(X, dtype = np.float32)
+        codes = np.empty((X.shape[0], len(self.features)), dtype = np.int64)
+        for k, f in enumerate(self.features):
+            codes[:, k] = np.searchsorted(self.thresholds[k], X[:, f], side = 'left')
+        return codes
+
+    def leaves(self, X):
+        """
+        Leaf (node of the tree) of the rule matched by every row of X in every tree
+        table, as an array of shape (number of rows, number of trees).
+        """
+        codes = self.codes(X)
+        leaves = np.empty((len(codes), len(self.trees)), dtype = np.int64)
+        for t, (fields, code_words, low, high, nodes, _) in enumerate(self.trees):
+            leaves[:, t] = nodes[self.__match(codes, fields, code_words, low, high)]
+        return leaves
+
+    def __match(self, codes, fields, code_words, low, high):
+        # first rule matched by the code words of every row, as a TCAM does
+        codes = np.stack([code_words[k][codes[:, f]] for k, f in enumerate(fields.tolist())], axis = 1) if len(fields) > 0 else codes[:, :0]
+        rules = np.empty(len(codes), dtype = np.int64)
+        chunk = max(1, CHUNK_SIZE // max(1, low.size))
+        for start in range(0, len(codes), chunk):
+            _codes = codes[start:start + chunk, None, :]
+            match = ((low[None] <= _codes) & (_codes <= high[None])).all(axis = 2)
+            rules[start:start + chunk] = np.argmax(match, axis = 1)
+        return rules
+
+    def decision_function(self, X):
+        codes = self.codes(X)
+        scores = np.tile(self.base_score, (len(codes), 1))
+        for fields, code_words, low, high, _, outputs in self.trees:
+            scores += outputs[self.__match(codes, fields, code_words, low, high)]
+        return scores
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.shape[1] == 1:
+            return self.classes_.take((scores[:, 0] > 0).astype(np.int64))
+        return self.classes_.take(np.argmax(scores, axis = 1))
+
+    def size(self, bits = None):
+        """
+        Number of tables, rules and lookups per flow, width of the code words and of
+        the keys of the tree tables. With the number of bits of the features
+        (integers), number of ternary rules of the feature tables.
+        """
+        # bits of the code words of every tree
+        code_word_bits = [[max(1, int(c[-1]).bit_length()) for c in code_words] for _, code_words, _, _, _, _ in self.trees]
+        size = {
+            'feature_tables': len(self.features),
+            'feature_rules': sum(len(thresholds) + 1 for thresholds in self.thresholds),
+            'code_word_bits': sum(sum(bits) for bits in code_word_bits),
+            'tree_tables': len(self.trees),
+            'tree_rules': sum(len(low) for _, _, low, _, _, _ in self.trees),
+            'lookups_per_flow': len(self.features) + len(self.trees),
+            'tree_key_bits': max([sum(bits) for bits in code_word_bits] + [0])
+        }
+        # ranges of code words as prefixes
+        size['tree_ternary_rules'] = sum(
+            math.prod(len(range_to_ternary(l, h, b)) for l, h, b in zip(_low, _high, bits))
+            for (_, _, low, high, _, _), bits in zip(self.trees, code_word_bits)
+            for _low, _high in zip(low.tolist(), high.tolist())
+        )
+        if bits is not None:
+            size['feature_ternary_rules'] = sum(len(self.feature_rules(k, bits)) for k in range(len(self.features)))
+        return size
+
+def _value_thresholds(trees, edges):
+    # a binned feature goes left if code <= threshold, that is if x <= edges[floor(threshold)]
+    for feature, threshold, left, right, outputs in trees:
+        threshold = threshold.copy()
+        for f in np.unique(feature[left != -1]):
+            if edges[f] is None:
+                continue
+            nodes = (feature == f) & (left != -1)
+            bounds = np.concatenate(([-np.inf], edges[f], [np.inf])).astype(np.float32)
+            threshold[nodes] = bounds[np.clip(np.floor(threshold[nodes]).astype(np.int64), -1, len(edges[f])) + 1]
+        yield feature, threshold, left, right, outputs
+
+def compile_model(model, edges = None):
+    """
+    SwitchTables of a fitted RandomForestClassifier, XGBClassifier or
+    BoosterClassifier (XGBoost_predict), possibly the GridSearchCV of a Pipeline
+    (RF_predict). For a model fitted on binned features (feature_binning), edges
+    gives the edges of every feature (None for those not binned) and the tables
+    classify the values of the features instead of their codes.
+    """
+    if hasattr(model, 'best_estimator_'):
+        model = model.best_estimator_
+    if hasattr(model, 'steps'):
+        model = model.steps[-1][1]
+    if hasattr(model, 'get_booster'):
+        trees, base_score = _xgboost_trees(model)
+        classes = np.asarray(model.classes_)
+    else:
+        trees, base_score, classes = _random_forest_trees(model), np.zeros(model.n_classes_), model.classes_
+    if edges is not None:
+        trees = _value_thresholds(trees, edges)
+    return SwitchTables(trees, base_score, classes)
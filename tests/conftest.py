@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules of the classifiers are at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the scripts of data_preparation import each other as top-level modules
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_preparation"))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# python tests/data/write_captures.py writes packets.pcap and packets.pcapng (Ethernet, the same packets,
+# timestamps in us and ns) and packets.csv, the fields printed by data_preparation/pcap2csv.sh (tshark)
+import os
+import socket
+import struct
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TSHARK_HEADER = "frame.number,frame.time_epoch,frame.time_delta,ip.src,_ws.col.SP,ip.dst,_ws.col.DP,ip.proto,frame.len"
+
+def ipv4(src, dst, proto, payload, fragment = 0):
+    return struct.pack('>BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), 1, fragment, 64, proto, 0, socket.inet_aton(src), socket.inet_aton(dst)) + payload
+
+def ipv6(next_header, payload, extension = b''):
+    return struct.pack('>IHBB', 0x60000000, len(extension) + len(payload), next_header, 64) + socket.inet_pton(socket.AF_INET6, "2001:db8::1") + socket.inet_pton(socket.AF_INET6, "2001:db8::2") + extension + payload
+
+def tcp(sport, dport, size):
+    return struct.pack('>HHIIBBHHH', sport, dport, 1, 0, 0x50, 0x18, 65535, 0, 0) + b'\x00' * size
+
+def udp(sport, dport, size):
+    return struct.pack('>HHHH', sport, dport, 8 + size, 0) + b'\x00' * size
+
+def ethernet(ethertype, payload, vlan = False):
+    header = b'\x02\x00\x00\x00\x00\x02' + b'\x02\x00\x00\x00\x00\x01'
+    if vlan:
+        header += struct.pack('>HH', 0x8100, 10)
+    return header + struct.pack('>H', ethertype) + payload
+
+# (time in us, frame, ip.src, SP, ip.dst, DP, ip.proto), '' for the fields tshark leaves empty
+PACKETS = [
+    (1476112345123456, ethernet(0x0800, ipv4("10.0.0.1", "192.168.1.2", 6, tcp(51234, 443, 20))), "10.0.0.1", 51234, "192.168.1.2", 443, 6),
+    (1476112345123456, ethernet(0x0800, ipv4("192.168.1.2", "10.0.0.1", 6, tcp(443, 51234, 1400))), "192.168.1.2", 443, "10.0.0.1", 51234, 6),
+    (1476112345130001, ethernet(0x0800, ipv4("10.0.0.1", "8.8.8.8", 17, udp(53001, 53, 30))), "10.0.0.1", 53001, "8.8.8.8", 53, 17),
+    (1476112345130002, ethernet(0x0800, ipv4("10.0.0.1", "8.8.8.8", 1, b'\x08\x00' + b'\x00' * 62)), "10.0.0.1", '', "8.8.8.8", '', 1),
+    (1476112346000000, ethernet(0x0806, b'\x00\x01\x08\x00\x06\x04\x00\x01' + b'\x00' * 20), '', '', '', '', ''),
+    (1476112346000999, ethernet(0x0800, ipv4("10.0.0.3", "10.0.0.4", 17, udp(5000, 5001, 100)), vlan = True), "10.0.0.3", 5000, "10.0.0.4", 5001, 17),
+    (1476112347999999, ethernet(0x0800, ipv4("10.0.0.3", "10.0.0.4", 17, b'\x00' * 64, fragment = 185)), "10.0.0.3", '', "10.0.0.4", '', 17),
+    (1476112348000000, ethernet(0x86dd, ipv6(6, tcp(40000, 443, 20))), '', 40000, '', 443, ''),
+    (1476112348000001, ethernet(0x86dd, ipv6(0, udp(40001, 443, 8), bytes([17, 0]) + b'\x00' * 6)), '', 40001, '', 443, ''),
+    (1476112358250000, ethernet(0x86dd, ipv6(58, b'\x80\x00' + b'\x00' * 30)), '', '', '', '', ''),
+    (1476112358250000, ethernet(0x0800, ipv4("192.168.1.2", "10.0.0.1", 6, tcp(443, 51234, 0))), "192.168.1.2", 443, "10.0.0.1", 51234, 6),
+]
+
+def write_pcap(filename):
+    # little endian, timestamps in us
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for us, frame, *_ in PACKETS:
+            f.write(struct.pack('<IIII', us // 1000000, us % 1000000, len(frame), len(frame)) + frame)
+
+def block(block_type, body):
+    body += b'\x00' * (-len(body) % 4)
+    return struct.pack('<II', block_type, 12 + len(body)) + body + struct.pack('<I', 12 + len(body))
+
+def write_pcapng(filename):
+    # little endian, an interface with timestamps in ns (if_tsresol = 9)
+    with open(filename, 'wb') as f:
+        f.write(block(0x0a0d0d0a, struct.pack('<IHHq', 0x1a2b3c4d, 1, 0, -1)))
+        f.write(block(1, struct.pack('<HHI', 1, 0, 65535) + struct.pack('<HH', 9, 1) + b'\x09\x00\x00\x00' + struct.pack('<HH', 0, 0)))
+        for us, frame, *_ in PACKETS:
+            ns = us * 1000
+            f.write(block(6, struct.pack('<IIIII', 0, ns >> 32, ns & 0xffffffff, len(frame), len(frame)) + frame))
+
+def write_csv(filename):
+    with open(filename, 'w') as f:
+        f.write(TSHARK_HEADER + "\n")
+        previous = PACKETS[0][0]
+        for number, (us, frame, src, sport, dst, dport, proto) in enumerate(PACKETS, start = 1):
+            f.write("%d,%d.%06d000,%d.%06d000,%s,%s,%s,%s,%s,%d\n" % (number, us // 1000000, us % 1000000, (us - previous) // 1000000, (us - previous) % 1000000, src, sport, dst, dport, proto, len(frame)))
+            previous = us
+
+if __name__ == "__main__":
+    write_pcap(os.path.join(DIRECTORY, "packets.pcap"))
+    write_pcapng(os.path.join(DIRECTORY, "packets.pcapng"))
+    write_csv(os.path.join(DIRECTORY, "packets.csv"))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from compiled_forest import CompiledForest
+from feature_sweep import first_trees
+
+def flows(nb_flows, nb_features = 12, nan_fraction = 0.0, seed = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(0.0, 2.0, (nb_flows, nb_features))
+    # features with few distinct values, as the lengths
+    X[:, 0] = rng.choice([40, 52, 1500], nb_flows)
+    y = (X[:, 1] > X[:, 2]).astype(int) + (X[:, 0] == 1500) + 2 * (X[:, 3] > 1.0)
+    if nan_fraction > 0:
+        X[rng.random(X.shape) < nan_fraction] = np.nan
+    return X, y
+
+@pytest.mark.parametrize("bootstrap", [True, False])
+@pytest.mark.parametrize("nan_fraction", [0.0, 0.1])
+def test_same_predictions_as_sklearn(bootstrap, nan_fraction):
+    X, y = flows(3000, nan_fraction = nan_fraction)
+    X_test, _ = flows(2000, nan_fraction = nan_fraction, seed = 1)
+    rf = RandomForestClassifier(n_estimators = 30, bootstrap = bootstrap, random_state = 42, n_jobs = 1).fit(X[:2000], y[:2000])
+    forest = CompiledForest(rf)
+    for _X in [X, X_test]:
+        np.testing.assert_array_equal(forest.predict_proba(_X), rf.predict_proba(_X))
+        np.testing.assert_array_equal(forest.predict(_X), rf.predict(_X))
+
+def test_staged_predict_proba():
+    X, y = flows(2000, nan_fraction = 0.05)
+    rf = RandomForestClassifier(n_estimators = 40, random_state = 42, n_jobs = 1).fit(X, y)
+    sizes = [1, 5, 20, 40]
+    for n, proba in zip(sizes, CompiledForest(rf).staged_predict_proba(X, sizes)):
+        np.testing.assert_array_equal(proba, first_trees(rf, n).predict_proba(X))
+
+def test_string_classes():
+    X, y = flows(1000)
+    y = np.array(["chat", "email", "file", "video", "voip"])[y]
+    rf = RandomForestClassifier(n_estimators = 10, random_state = 42).fit(X, y)
+    np.testing.assert_array_equal(CompiledForest(rf).predict(X), rf.predict(X))
+
+def test_wrong_number_of_features():
+    X, y = flows(200)
+    forest = CompiledForest(RandomForestClassifier(n_estimators = 3, random_state = 42).fit(X, y))
+    with pytest.raises(ValueError):
+        forest.predict(X[:, :5])
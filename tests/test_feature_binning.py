@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from feature_binning import FeatureBins, bin_codes, bin_edges, load_feature_bins, save_feature_bins
+
+def flows(nb_flows, seed = 0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'sum_iat': rng.exponential(1.0, nb_flows),
+                         'nb_packets': rng.integers(1, 20, nb_flows),
+                         'src': rng.choice(["a", "b"], nb_flows)})
+
+def test_codes_order_values():
+    values = np.random.default_rng(0).exponential(1.0, 5000).astype(np.float32)
+    edges = bin_edges(values)
+    codes = bin_codes(values, edges)
+    assert len(edges) == 255 and codes.max() == 255
+    # x <= edges[k] if and only if code <= k
+    for k in [0, 10, 100, 254]:
+        np.testing.assert_array_equal(values <= edges[k], codes <= k)
+
+def test_bins_of_skewed_values():
+    # lengths: most flows on a few hundred values, a long tail of distinct values
+    rng = np.random.default_rng(1)
+    values = np.concatenate((40 + rng.geometric(0.02, 90000), rng.uniform(500, 65535, 10000).round(1)))
+    edges = bin_edges(values)
+    codes = bin_codes(values, edges)
+    # every bin holds about len(values) / 256 flows, besides those of a single dominant value
+    for code in range(len(edges) + 1):
+        _, counts = np.unique(values[codes == code], return_counts = True)
+        assert counts.sum() - counts.max(initial = 0) <= 2 * len(values) / 256
+
+def test_distinct_values():
+    values = np.array([3, 1, 2, 2, 3, 1], dtype = np.float64)
+    np.testing.assert_array_equal(bin_edges(values), [1, 2])
+    np.testing.assert_array_equal(bin_codes(values, bin_edges(values)), [2, 0, 1, 1, 2, 0])
+
+def test_transform_keeps_other_columns():
+    X = flows(1000)
+    X_binned = FeatureBins().fit(X).transform(X)
+    assert list(X_binned.columns) == list(X.columns) and X_binned.index.equals(X.index)
+    assert X_binned['sum_iat'].dtype == np.uint8 and X_binned['nb_packets'].dtype == np.uint8
+    pd.testing.assert_series_equal(X_binned['src'], X['src'])
+
+def test_save_load_folds(tmp_path):
+    bins = {fold: FeatureBins().fit(flows(1000, seed = fold)) for fold in range(3)}
+    filename = str(tmp_path / "flows_bins.npz")
+    save_feature_bins(filename, bins)
+    loaded = load_feature_bins(filename)
+    assert sorted(loaded) == [0, 1, 2]
+    for fold in bins:
+        assert list(loaded[fold].edges) == list(bins[fold].edges)
+        for c in bins[fold].edges:
+            np.testing.assert_array_equal(loaded[fold].edges[c], bins[fold].edges[c])
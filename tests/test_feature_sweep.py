@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from feature_sweep import FeatureSweep
+
+def flows(nb_flows, seed = 0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(0.0, 1.0, (nb_flows, 4)), columns = ['sum_iat', 'max_iat', 'sum_length', 'max_length'])
+    y = pd.Series((X['sum_iat'] + X['max_length'] * X['max_iat'] > 0).astype(int))
+    return X, y
+
+def sweep(tmp_path):
+    X_train, y_train = flows(300)
+    X_test, y_test = flows(200, seed = 1)
+    return FeatureSweep(X_train, y_train, X_test, y_test, str(tmp_path / "sweep.parquet"), max_leaf = 20, early_stop = False)
+
+def sorted_rows(results):
+    return results.sort_values(['depth', 'tree', 'n_feat']).reset_index(drop = True)
+
+def test_resume(tmp_path):
+    depths, n_trees = [2, 4], [3, 5]
+    expected = sweep(tmp_path).run(depths, n_trees)
+    assert len(expected) == len(depths) * len(n_trees) * 4
+
+    # nothing fitted again
+    resumed = sweep(tmp_path)
+    pd.testing.assert_frame_equal(resumed.run(depths, n_trees), expected)
+    assert resumed.scheduler.durations == []
+
+    # only the rows missing from the parquet file are computed
+    expected.loc[expected['n_feat'] != 2].to_parquet(tmp_path / "sweep.parquet", index = False)
+    resumed = sweep(tmp_path)
+    results = resumed.run(depths, n_trees)
+    assert sorted(key for key, _, _, _, _ in resumed.scheduler.durations) == [(depth, n_tree, 2) for depth in depths for n_tree in n_trees]
+    pd.testing.assert_frame_equal(sorted_rows(results), sorted_rows(expected))
@@ -0,0 +1,108 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import kurtosis, skew
+
+from encrypted_traffic_classification import FLOW_FEATURES, get_flows_statistical_features, get_flows_statistical_features_per_prefix
+
+NB_PACKETS = [1, 2, 4, 7, 8, 9, 16, 17, 130, 300]
+
+def packets(seed = 0):
+    # flows of 1 to 300 packets, constant ones and interleaved ones
+    rng = np.random.default_rng(seed)
+    flows = []
+    sizes = [1, 1, 2, 3, 7, 8, 9, 15, 16, 17, 24, 100, 128, 129, 136, 257, 300]
+    for k, size in enumerate(sizes):
+        flows.append(pd.DataFrame({'flow_id': "flow_" + str(k),
+                                   'iat': rng.exponential(0.01, size) * (rng.random(size) > 0.2),
+                                   'length': rng.integers(40, 1500, size)}))
+    for k, size in enumerate([1, 5, 8, 9, 40]):
+        flows.append(pd.DataFrame({'flow_id': "constant_" + str(k),
+                                   'iat': np.full(size, 0.1),
+                                   'length': np.full(size, 1200)}))
+    df = pd.concat(flows, ignore_index = True)
+    # packets of the flows interleaved, each flow keeping the order of its packets
+    order = np.argsort(rng.random(len(df)), kind = 'stable')
+    df = df.iloc[order]
+    df = df.iloc[np.argsort(df.groupby('flow_id', sort = False).cumcount().to_numpy() + rng.integers(0, 50, len(df)), kind = 'stable')]
+    return df.reset_index(drop = True)
+
+def reference(df, n):
+    # features of each flow as computed flow by flow with numpy and scipy
+    min_iat = np.min(df[df['iat'] > 0]['iat'])
+    rows = []
+    for flow_id in df['flow_id'].unique():
+        _df_new = df[df['flow_id'] == flow_id].head(n = n)
+        d = {'nb_packets': len(_df_new), 'min_iat': min_iat}
+        for suffix in ['iat', 'length']:
+            _df = _df_new[suffix]
+            if suffix != 'iat':
+                d['min_' + suffix] = np.min(_df)
+            d['max_' + suffix] = np.max(_df)
+            d['sum_' + suffix] = np.sum(_df)
+            d['mean_' + suffix] = np.mean(_df)
+            d['median_' + suffix] = np.median(_df)
+            d['std_' + suffix] = np.std(_df)
+            d['1stQ_' + suffix] = np.quantile(_df, 0.25)
+            d['3rdQ_' + suffix] = np.quantile(_df, 0.75)
+            _a = list(_df)
+            with warnings.catch_warnings():
+                # scipy warns on the constant flows, whose skew and kurtosis are NaN
+                warnings.simplefilter("ignore", RuntimeWarning)
+                d['skew_' + suffix] = skew(_a)
+                d['kurt_' + suffix] = kurtosis(_a)
+        rows.append(d)
+    return pd.DataFrame(rows)
+
+def assert_same_features(flows, expected):
+    assert len(flows) == len(expected)
+    for feature in FLOW_FEATURES:
+        # bit for bit, NaN where the reference has NaN
+        np.testing.assert_array_equal(flows[feature].to_numpy(dtype = np.float64), expected[feature].to_numpy(dtype = np.float64), err_msg = feature, strict = True)
+
+@pytest.mark.parametrize("n", NB_PACKETS)
+def test_features_equal_reference(n):
+    df = packets()
+    flows = get_flows_statistical_features(df, n)
+    assert flows['flow_id'].tolist() == df['flow_id'].unique().tolist()
+    assert_same_features(flows, reference(df, n))
+
+def test_features_per_prefix_equal_reference():
+    df = packets(seed = 1)
+    flows = get_flows_statistical_features_per_prefix(df, NB_PACKETS)
+    for n in NB_PACKETS:
+        assert_same_features(flows[n], reference(df, n))
+
+def test_edge_cases():
+    df = packets()
+    flows = get_flows_statistical_features(df, 300).set_index('flow_id')
+    # 1 packet and constant flows: no skewness nor kurtosis, as scipy
+    for flow_id in ["flow_0", "constant_0", "constant_2", "constant_4"]:
+        assert np.isnan(flows.loc[flow_id, 'skew_length']) and np.isnan(flows.loc[flow_id, 'kurt_length'])
+        assert flows.loc[flow_id, 'std_length'] == 0
+    assert np.isnan(flows.loc["constant_4", 'skew_iat']) and flows.loc["constant_4", 'sum_iat'] == np.sum(np.full(40, 0.1))
+    assert flows.loc["flow_16", 'nb_packets'] == 300
+    assert not np.isnan(flows.loc["flow_16", 'skew_iat'])
+
+@pytest.mark.parametrize("n", NB_PACKETS)
+def test_fixed_point_features(n):
+    df = packets()
+    flows = get_flows_statistical_features(df, n).set_index('flow_id')
+    fixed = get_flows_statistical_features(df, n, fixed_point = 32).set_index('flow_id')
+    counts = flows['nb_packets'].to_numpy()
+    # integer lengths: the same sums, divided by 2^s >= n packets
+    for feature in ['min_length', 'max_length', 'sum_length']:
+        np.testing.assert_array_equal(fixed[feature], flows[feature], err_msg = feature)
+    divisor = 2 ** np.ceil(np.log2(counts))
+    np.testing.assert_array_equal(fixed['mean_length'], np.floor(flows['sum_length'] / divisor))
+    assert (fixed['std_length'] >= 0).all()
+    assert (fixed['skew_length'] == 0).all() and (fixed['kurt_length'] == 0).all()
+    # power of 2 packets: exact but for the shifts, the variance off by less than 1 + 2 mean
+    exact = counts == divisor
+    mean, std = flows['mean_length'].to_numpy()[exact], flows['std_length'].to_numpy()[exact]
+    assert exact.sum() >= 4
+    _mean = fixed['mean_length'].to_numpy()[exact]
+    assert ((0 <= mean - _mean) & (mean - _mean < 1)).all()
+    assert (np.abs(fixed['std_length'].to_numpy()[exact] - std) <= np.sqrt(2 * mean + 1) + 1).all()
@@ -0,0 +1,82 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from encrypted_traffic_classification import FlowRecords
+
+def flows(nb_flows, nb_columns = 8, seed = 0):
+    # one dict per flow: integer, float and string features, as the flows of the data preparation
+    rng = np.random.default_rng(seed)
+    for i in range(nb_flows):
+        row = {'flow_id': "flow_" + str(i), 'nb_packets': int(rng.integers(1, 100)), 'class': int(rng.integers(0, 7))}
+        for k in range(nb_columns - 3):
+            row['feature_' + str(k)] = float(rng.random())
+        yield row
+
+def appended(rows, index = None):
+    # the DataFrame grown one flow at a time
+    df = None
+    for i, row in enumerate(rows):
+        d = pd.DataFrame([row], index = [i if index is None else index])
+        df = d if df is None else pd.concat([df, d])
+    return df
+
+def recorded(rows, index = None):
+    records = FlowRecords(capacity = 4)
+    for row in rows:
+        records.append(row, index = index)
+    return records.to_frame()
+
+def test_rows_equal_appended_rows():
+    rows = list(flows(1000))
+    pd.testing.assert_frame_equal(recorded(rows), appended(rows), check_exact = True)
+
+def test_rows_same_index():
+    rows = list(flows(50))
+    pd.testing.assert_frame_equal(recorded(rows, index = 0), appended(rows, index = 0), check_exact = True)
+
+def test_rows_upcast_and_missing_columns():
+    rows = [{'a': 1, 'b': "x"}, {'a': 2.5, 'b': "y", 'c': 3}, {'a': 4, 'c': 5}, {'a': np.int64(6), 'b': "z", 'c': 7.5}]
+    pd.testing.assert_frame_equal(recorded(rows), appended(rows), check_exact = True)
+
+def test_blocks_equal_concat():
+    rng = np.random.default_rng(1)
+    blocks = []
+    for k in range(20):
+        nb_rows = int(rng.integers(0, 30))
+        blocks.append(pd.DataFrame({'flow_id': ["flow_%d_%d" % (k, i) for i in range(nb_rows)],
+                                    'sport': pd.array(rng.integers(0, 65536, nb_rows), dtype = "Int64"),
+                                    'sum_iat': rng.random(nb_rows),
+                                    'nb_packets': rng.integers(1, 100, nb_rows)},
+                                   index = rng.integers(0, 1000, nb_rows)))
+    blocks = [b for b in blocks if len(b) > 0]
+    records = FlowRecords(capacity = 4)
+    for b in blocks:
+        records.append(b)
+    pd.testing.assert_frame_equal(records.to_frame(), pd.concat(blocks), check_exact = True)
+
+def benchmark(nb_flows = 100000, nb_columns = 32):
+    """
+    Flows per second of FlowRecords and of the DataFrame grown by pd.concat one flow at a
+    time (quadratic, timed on its first flows only), the frames being checked equal.
+    """
+    rows = list(flows(nb_flows, nb_columns))
+    start = time.perf_counter()
+    df = recorded(rows)
+    print("FlowRecords, %d flows: %.0f flows/s" % (nb_flows, nb_flows / (time.perf_counter() - start)))
+    for n in [1000, 2000, 4000]:
+        start = time.perf_counter()
+        _df = appended(rows[:n])
+        print("pd.concat per flow, %d flows: %.0f flows/s" % (n, n / (time.perf_counter() - start)))
+        pd.testing.assert_frame_equal(df.iloc[:n], _df, check_exact = True)
+    start = time.perf_counter()
+    _df = pd.concat([pd.DataFrame([row], index = [i]) for i, row in enumerate(rows)])
+    print("list of 1-row DataFrames + pd.concat, %d flows: %.0f flows/s" % (nb_flows, nb_flows / (time.perf_counter() - start)))
+    pd.testing.assert_frame_equal(df, _df, check_exact = True)
+
+if __name__ == "__main__":
+    # PYTHONPATH=. python tests/test_flow_records.py [nb flows]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
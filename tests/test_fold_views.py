@@ -0,0 +1,28 @@
+import pandas as pd
+
+from encrypted_traffic_classification import FoldViews
+
+def views(loads):
+    def load(i):
+        loads.append(i)
+        return pd.DataFrame({'sum_iat': [float(i[1])], 'max_iat': [1.0]})
+    return FoldViews(load, [(5, 0), (5, 1)], version = lambda i: ("flows.parquet", i))
+
+def test_version_without_loading():
+    loads = []
+    X = views(loads)
+    assert X.version((5, 0)) != X.version((5, 1))
+    assert loads == []
+    assert list(X[(5, 1)].columns) == ['sum_iat', 'max_iat']
+    assert loads == [(5, 1)]
+
+def test_version_of_dropped_columns():
+    loads = []
+    X = views(loads)
+    version = X.version((5, 0))
+    X.drop_columns(['max_iat'])
+    assert X.version((5, 0)) != version
+    assert list(X[(5, 0)].columns) == ['sum_iat']
+    # the folds set explicitly are keyed on their data
+    X[(5, 0)] = pd.DataFrame({'sum_iat': [0.0]})
+    assert X.version((5, 0)) is None
@@ -0,0 +1,45 @@
+from functools import partial
+
+import pandas as pd
+
+from encrypted_traffic_classification import EncryptedTrafficClassifier
+
+class Extraction():
+    def __init__(self):
+        self.calls = []
+
+    def flows(self, f, nb_packets, suffix):
+        # flows of f for every number of packets, with the classes of f
+        self.calls.append((f, list(nb_packets)))
+        return 1, (["class"], {n: pd.DataFrame({'nb_packets': [n], 'src': [f + suffix]}) for n in nb_packets})
+
+def classifier(tmp_path, nb_packets_per_flow):
+    return EncryptedTrafficClassifier(1, nb_packets_per_flow, "test", str(tmp_path) + "/", str(tmp_path) + "/")
+
+def test_flows_cached_by_number_of_packets(tmp_path):
+    files = []
+    for name in ["a.csv", "b.csv"]:
+        (tmp_path / name).write_text(name)
+        files.append(str(tmp_path / name))
+    extraction = Extraction()
+    results = classifier(tmp_path, [4, 8])._map_files(partial(extraction.flows, nb_packets = [4, 8], suffix = ""), files)
+    assert extraction.calls == [(files[0], [4, 8]), (files[1], [4, 8])]
+    assert [list(flows) for _, flows in results] == [[4, 8], [4, 8]]
+
+    # a new number of packets: only its flows are extracted, the others are read from the cache
+    extraction.calls = []
+    results = classifier(tmp_path, [4, 8, 16])._map_files(partial(extraction.flows, nb_packets = [4, 8, 16], suffix = ""), files)
+    assert extraction.calls == [(files[0], [16]), (files[1], [16])]
+    assert [classes for classes, _ in results] == [["class"], ["class"]]
+    for f, (_, flows) in zip(files, results):
+        assert list(flows) == [4, 8, 16]
+        assert all(flows[n]['nb_packets'].tolist() == [n] and flows[n]['src'].tolist() == [f] for n in flows)
+
+    # the same numbers of packets with another keyword, or a modified file, are extracted again
+    extraction.calls = []
+    classifier(tmp_path, [4])._map_files(partial(extraction.flows, nb_packets = [4], suffix = "_"), files)
+    assert extraction.calls == [(files[0], [4]), (files[1], [4])]
+    extraction.calls = []
+    (tmp_path / "b.csv").write_text("modified")
+    classifier(tmp_path, [4])._map_files(partial(extraction.flows, nb_packets = [4], suffix = ""), files)
+    assert extraction.calls == [(files[1], [4])]
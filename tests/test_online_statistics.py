@@ -0,0 +1,110 @@
+import math
+import warnings
+
+import numpy as np
+import pytest
+from scipy.stats import kurtosis, skew
+
+from online_statistics import OnlineFlowFeatures, OnlineStatistics, QuantileSketch
+
+def rank_error(sorted_values, value, rank):
+    # distance between rank and the ranks of value among sorted_values
+    low = np.searchsorted(sorted_values, value, side = 'left')
+    high = np.searchsorted(sorted_values, value, side = 'right') - 1
+    return max(0, low - rank, rank - high)
+
+def rank_bound(n, size):
+    # rank error of QuantileSketch for n values
+    return n * max(1.0, math.log2(n / size)) / size
+
+def assert_sketch_ranks(sketch, values):
+    sorted_values = np.sort(values)
+    n = len(values)
+    assert sketch.n == n
+    errors = [rank_error(sorted_values, sketch.value(rank), rank) for rank in np.linspace(0, n - 1, 101).astype(int)]
+    assert max(errors) <= rank_bound(n, sketch.size)
+
+@pytest.mark.parametrize("size", [64, 256])
+def test_sketch_rank_error(size):
+    values = np.random.default_rng(0).lognormal(0.0, 2.0, 100000)
+    sketch = QuantileSketch(size)
+    for x in values.tolist():
+        sketch.update(x)
+    assert_sketch_ranks(sketch, values)
+    # memory logarithmic in the number of values
+    assert sum(len(level) for level in sketch.levels) <= size * (math.log2(len(values) / size) + 2)
+
+def test_sketch_merge():
+    rng = np.random.default_rng(1)
+    a, b = rng.exponential(1.0, 30000), rng.normal(5.0, 1.0, 50000)
+    sketch_a, sketch_b = QuantileSketch(128), QuantileSketch(128)
+    for x in a.tolist():
+        sketch_a.update(x)
+    for x in b.tolist():
+        sketch_b.update(x)
+    assert_sketch_ranks(sketch_a.merge(sketch_b), np.concatenate((a, b)))
+    # merged with an empty sketch and into one
+    assert_sketch_ranks(sketch_a.merge(QuantileSketch(128)), np.concatenate((a, b)))
+    assert_sketch_ranks(QuantileSketch(128).merge(sketch_b), b)
+
+def reference(values):
+    # as _flows_describe: pandas/numpy moments, scipy.stats skew and kurtosis with their defaults (bias, fisher)
+    return {'min': np.min(values), 'max': np.max(values), 'sum': np.sum(values), 'mean': np.mean(values),
+            'median': np.median(values), 'std': np.std(values), '1stQ': np.quantile(values, 0.25),
+            '3rdQ': np.quantile(values, 0.75), 'skew': skew(values), 'kurt': kurtosis(values)}
+
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(2).exponential(0.01, 200),
+    np.random.default_rng(3).integers(40, 1500, 200),
+    np.array([0.5]),
+    np.full(50, 0.125),
+    np.array([3.0, 1e-9, 7.5, 7.5, 2.0]),
+], ids = ["iat", "length", "single", "constant", "small"])
+def test_statistics_equal_numpy_scipy(values):
+    statistics = OnlineStatistics()
+    statistics.update_many(values)
+    with warnings.catch_warnings():
+        # scipy warns on the constant values, whose skew and kurtosis are NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expected = reference(values)
+    features = statistics.describe('x')
+    for name in ['min', 'max', 'median', '1stQ', '3rdQ']:
+        # exact below exact_size values
+        assert features[name + '_x'] == expected[name], name
+    # compensated sum, correctly rounded
+    assert features['sum_x'] == math.fsum(values.tolist())
+    for name in ['sum', 'mean', 'std', 'skew', 'kurt']:
+        # one pass moments, up to rounding
+        np.testing.assert_allclose(features[name + '_x'], expected[name], rtol = 1e-9, atol = 1e-12, err_msg = name)
+
+def test_constant_not_representable():
+    # no variance: NaN skew and kurtosis, where scipy may return the rounding errors of its two pass moments
+    statistics = OnlineStatistics()
+    statistics.update_many(np.full(50, 0.1))
+    assert statistics.std == 0 and math.isnan(statistics.skew) and math.isnan(statistics.kurt)
+
+def test_statistics_sketched_quantiles():
+    values = np.random.default_rng(4).lognormal(0.0, 1.0, 20000)
+    statistics = OnlineStatistics(exact_size = 256, sketch_size = 256)
+    statistics.update_many(values)
+    np.testing.assert_allclose([statistics.mean, statistics.std, statistics.skew, statistics.kurt],
+                               [np.mean(values), np.std(values), skew(values), kurtosis(values)], rtol = 1e-9)
+    assert statistics.total == math.fsum(values.tolist())
+    sorted_values = np.sort(values)
+    bound = rank_bound(len(values), statistics.sketch.size)
+    for q in [0.25, 0.5, 0.75]:
+        # the interpolated value lies between the values of the two ranks around q
+        low = np.searchsorted(sorted_values, statistics.quantile(q), side = 'left')
+        high = np.searchsorted(sorted_values, statistics.quantile(q), side = 'right')
+        assert low - bound <= (len(values) - 1) * q <= high + bound
+
+def test_flow_features():
+    rng = np.random.default_rng(5)
+    iat, length = rng.exponential(0.01, 20) * (rng.random(20) > 0.3), rng.integers(40, 1500, 20)
+    flow = OnlineFlowFeatures()
+    for x, l in zip(iat.tolist(), length.tolist()):
+        flow.update(x, l)
+    features = flow.features()
+    assert features['nb_packets'] == 20
+    assert features['min_iat'] == np.min(iat[iat > 0])
+    assert features['sum_length'] == np.sum(length) and features['median_iat'] == np.median(iat)
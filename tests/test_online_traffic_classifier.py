@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_preparation.pcapreader import PACKETS_DTYPE, TSHARK_FIELDS, read_packets
+from encrypted_traffic_classification import FLOW_FEATURES, get_flows_statistical_features
+from online_traffic_classifier import ONLINE_FEATURES, OnlineTrafficClassifier, csv_batches, pcap_batches
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+class Model():
+    def predict(self, X):
+        return np.asarray(X['sum_length'] > 500).astype(int)
+
+class Recorder():
+    # features of the flows classified, in the order of the decisions
+    def __init__(self):
+        self.X = []
+
+    def predict(self, X):
+        self.X.append(X)
+        return np.zeros(len(X), dtype = np.int64)
+
+def packets(flows, nb_packets, start = 0.0, gap = 0.01):
+    # nb_packets packets of each flow (src), the flows interleaved
+    return [(start + (p * len(flows) + i) * gap, src, 1000, "10.0.0.1", 443, 6, gap, 100 * (i + 1))
+            for p in range(nb_packets) for i, src in enumerate(flows)]
+
+def test_state_of_decided_flows():
+    classifier = OnlineTrafficClassifier(Model(), ONLINE_FEATURES, 2, max_decided = 3)
+    flows = ["10.0.1.%d" % i for i in range(5)]
+    decisions = list(classifier.classify([sum([packets([src], 4, start = i) for i, src in enumerate(flows)], [])]))
+    # a decision per flow on its second packet, its next packets ignored
+    assert [d[0] for d in decisions] == flows and all(d[5] == 2 for d in decisions)
+    assert len(classifier.flows) == 0 and list(classifier.decided) == [(src, 1000, "10.0.0.1", 443, 6) for src in flows[2:]]
+
+    # the flows no longer among the max_decided last ones are classified again
+    decisions = list(classifier.classify([packets(flows[:2] + flows[4:], 2, start = 5.0)]))
+    assert [d[0] for d in decisions] == flows[:2]
+
+def test_idle_flows():
+    classifier = OnlineTrafficClassifier(Model(), ONLINE_FEATURES, 4, idle_timeout = 1.0)
+    batches = [packets(["10.0.1.1", "10.0.1.2"], 2), packets(["10.0.1.2"], 1, start = 0.5), packets(["10.0.1.3"], 1, start = 1.2)]
+    decisions = list(classifier.classify(batches))
+    # 10.0.1.1 idle since 0.02 s, classified with its 2 packets once a packet of 1.2 s is read
+    assert [(d[0], d[5], d[6]) for d in decisions] == [("10.0.1.1", 2, 0.02), ("10.0.1.2", 3, 0.5), ("10.0.1.3", 1, 1.2)]
+
+def capture(nb_packets = 5000, seed = 0):
+    # packets of 200 flows with a few DNS packets and packets without IP, as read from a pcap file
+    rng = np.random.default_rng(seed)
+    p = np.zeros(nb_packets, dtype = PACKETS_DTYPE)
+    flows = rng.integers(0, 200, nb_packets)
+    p['frame_number'] = np.arange(1, nb_packets + 1)
+    p['time_delta'] = np.round(rng.exponential(0.01, nb_packets), 6)
+    p['time_epoch'] = 1476112000 + np.cumsum(p['time_delta'])
+    p['src'] = np.where(flows % 50 == 49, "", np.char.add("10.0.0.", (flows % 7).astype(str)))
+    p['sport'] = np.where(flows % 50 == 49, -1, 1024 + flows)
+    p['dst'] = np.where(flows % 50 == 49, "", "192.168.1.2")
+    p['dport'] = np.where(flows % 40 == 3, 53, np.where(flows % 50 == 49, -1, 443))
+    p['proto'] = np.where(flows % 50 == 49, -1, np.where(flows % 2 == 0, 6, 17))
+    p['frame_len'] = rng.integers(54, 1500, nb_packets)
+    return p
+
+def offline_features(packets, n):
+    # features of the first n packets of the flows of the same packets, by 5-tuple, as in the prepared data
+    df = pd.DataFrame(packets)
+    df = df[(df['src'] != "") & (df['sport'] != 53) & (df['dport'] != 53)]
+    df = df.rename(columns = {'time_delta': 'iat', 'frame_len': 'length'})
+    df['flow_id'] = df.groupby(['src', 'sport', 'dst', 'dport', 'proto'], sort = False).ngroup()
+    flows = get_flows_statistical_features(df, n, min_iat_per_flow = True)
+    return flows.set_index(['src', 'sport', 'dst', 'dport', 'proto'])[FLOW_FEATURES]
+
+def online_features(batches, n):
+    model = Recorder()
+    decisions = list(OnlineTrafficClassifier(model, FLOW_FEATURES, n).classify(batches))
+    X = pd.concat(model.X, ignore_index = True)
+    X.index = pd.MultiIndex.from_tuples([d[:5] for d in decisions], names = ['src', 'sport', 'dst', 'dport', 'proto'])
+    return X
+
+def assert_same_features(online, offline):
+    assert sorted(online.index) == sorted(offline.index)
+    online = online.loc[offline.index]
+    np.testing.assert_array_equal(online['nb_packets'], offline['nb_packets'])
+    for feature in FLOW_FEATURES:
+        np.testing.assert_allclose(online[feature].to_numpy(dtype = np.float64), offline[feature].to_numpy(dtype = np.float64), rtol = 1e-9, atol = 1e-12, equal_nan = True, err_msg = feature)
+
+@pytest.mark.parametrize("n", [1, 2, 4, 100])
+def test_same_features_as_offline_on_pcap(n):
+    filename = os.path.join(DATA, "packets.pcap")
+    packets = np.concatenate(list(read_packets(filename)))
+    assert_same_features(online_features(pcap_batches(filename, 3), n), offline_features(packets, n))
+
+@pytest.mark.parametrize("n", [1, 4, 16, 64])
+def test_same_features_as_offline_on_csv(tmp_path, n):
+    packets = capture()
+    df = pd.DataFrame(packets)
+    for name in ['sport', 'dport', 'proto']:
+        df[name] = df[name].astype('Int64').mask(df[name] < 0)
+    df.columns = TSHARK_FIELDS
+    df.to_csv(tmp_path / "packets.csv", index = False)
+    with open(tmp_path / "packets.csv", newline = '') as f:
+        online = online_features(csv_batches(f, 256), n)
+    offline = offline_features(packets, n)
+    # flows of fewer than 64 packets classified at the end of the capture
+    assert len(offline) > 150
+    assert_same_features(online, offline)
@@ -0,0 +1,53 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_preparation.pcapreader import TSHARK_FIELDS, read_packets, write_csv
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# packets.csv: output of data_preparation/pcap2csv.sh for both captures (tests/data/write_captures.py)
+CAPTURES = ["packets.pcap", "packets.pcapng"]
+
+def expected():
+    return pd.read_csv(os.path.join(DATA, "packets.csv"), dtype = str, keep_default_na = False)
+
+def assert_same_fields(df, expected):
+    assert df.columns.tolist() == TSHARK_FIELDS
+    assert len(df) == len(expected)
+    for field in TSHARK_FIELDS:
+        if field.startswith('frame.time'):
+            # the float read by the data preparation
+            np.testing.assert_array_equal(df[field].astype(np.float64).to_numpy(), expected[field].astype(np.float64).to_numpy(), err_msg = field)
+        else:
+            assert df[field].tolist() == expected[field].tolist(), field
+
+@pytest.mark.parametrize("capture", CAPTURES)
+def test_read_packets(capture):
+    packets = np.concatenate(list(read_packets(os.path.join(DATA, capture))))
+    df = pd.DataFrame({field: packets[name].astype(str) for field, name in zip(TSHARK_FIELDS, packets.dtype.names)})
+    # -1 for the fields tshark leaves empty
+    for field in ['_ws.col.SP', '_ws.col.DP', 'ip.proto']:
+        df[field] = df[field].mask(df[field] == '-1', '')
+    df['frame.time_epoch'] = packets['time_epoch']
+    df['frame.time_delta'] = packets['time_delta']
+    assert_same_fields(df, expected())
+
+@pytest.mark.parametrize("capture", CAPTURES)
+def test_write_csv(capture):
+    output = io.StringIO()
+    write_csv(os.path.join(DATA, capture), output)
+    assert_same_fields(pd.read_csv(io.StringIO(output.getvalue()), dtype = str, keep_default_na = False), expected())
+
+@pytest.mark.parametrize("capture", CAPTURES)
+def test_batches(capture):
+    filename = os.path.join(DATA, capture)
+    np.testing.assert_array_equal(np.concatenate(list(read_packets(filename, batch_size = 3))), np.concatenate(list(read_packets(filename))))
+
+def test_not_a_capture(tmp_path):
+    filename = tmp_path / "packets.csv"
+    filename.write_text("frame.number\n")
+    with pytest.raises(ValueError):
+        next(read_packets(str(filename)))
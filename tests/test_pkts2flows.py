@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pkts2flows
+from pkts2flows import COLUMNS, pkts2flows as add_flow_ids
+
+def write_packets(path, nb_packets = 3000, seed = 0):
+    # packets of 40 connections in both directions, with idle periods
+    rng = np.random.default_rng(seed)
+    connections = rng.integers(0, 40, nb_packets)
+    reverse = rng.random(nb_packets) < 0.5
+    hosts = np.array(["10.0.%d.%d" % (c // 8, c % 8) for c in range(40)])
+    timestamp = np.cumsum(rng.exponential(0.05, nb_packets) * np.where(rng.random(nb_packets) < 0.01, 1000, 1))
+    df = pd.DataFrame({'packet_id': np.arange(1, nb_packets + 1),
+                       'timestamp': timestamp,
+                       'iat': np.diff(timestamp, prepend = timestamp[0]),
+                       'src': np.where(reverse, "192.168.0.1", hosts[connections]),
+                       'psrc': np.where(reverse, 443, 1024 + connections),
+                       'dst': np.where(reverse, hosts[connections], "192.168.0.1"),
+                       'pdst': np.where(reverse, 1024 + connections, 443),
+                       'protocol': 6,
+                       'length': rng.integers(40, 1500, nb_packets)})
+    path.mkdir()
+    df.to_csv(path / "packets.csv", index = False, header = COLUMNS)
+    return df
+
+def flows(tmp_path, name, **options):
+    (tmp_path / name).mkdir()
+    add_flow_ids([str(tmp_path / "in")], str(tmp_path / name), **options)
+    return pd.read_csv(tmp_path / name / "packets.csv")
+
+def packets_of_flows(df):
+    # packets of every flow, whatever the numbers of the flows
+    return sorted(tuple(packets) for packets in df.groupby('flow_id')['packet_id'].apply(list))
+
+@pytest.mark.parametrize("options", [{'idle_timeout': 5.0}, {'bidirectional': True, 'idle_timeout': 5.0, 'active_timeout': 60.0}])
+def test_same_flows_whatever_the_chunks(tmp_path, monkeypatch, options):
+    write_packets(tmp_path / "in")
+    expected = flows(tmp_path, "out", **options)
+    monkeypatch.setattr(pkts2flows, "CHUNKSIZE", 7)
+    df = flows(tmp_path, "out_chunks", **options)
+    # flows numbered in the order they complete, found at the end of a chunk
+    assert packets_of_flows(df) == packets_of_flows(expected)
+    assert sorted(df['packet_id']) == list(range(1, 3001)) and df['flow_id'].is_monotonic_increasing
+    assert len(packets_of_flows(expected)) > 2 * 40
+
+def test_bidirectional_without_timeout(tmp_path):
+    packets = write_packets(tmp_path / "in")
+    df = flows(tmp_path, "out", bidirectional = True)
+    # a flow per connection, numbered in the order of the 5-tuples of the lowest address first
+    connections = packets.set_index('packet_id').loc[df['packet_id'], ['src', 'dst']].apply(sorted, axis = 1).str.join(" ")
+    assert df.groupby('flow_id')['packet_id'].count().tolist() == connections.value_counts().sort_index().tolist()
+    assert (df.groupby(connections.to_numpy())['flow_id'].nunique() == 1).all()
+    assert df['flow_id'].is_monotonic_increasing and df.groupby('flow_id')['timestamp'].apply(lambda t: t.is_monotonic_increasing).all()
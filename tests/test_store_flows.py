@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from encrypted_traffic_classification import EncryptedTrafficClassifier, read_csv_chunks
+from ucdavis_quic_classifier import PACKETS_COLUMNS, PACKETS_DTYPES
+
+def chunks(filename, chunksize):
+    # packets read as by UCDavisQuicClassifier._read_packets
+    for df in read_csv_chunks(filename, chunksize, delimiter = '\t', names = PACKETS_COLUMNS):
+        df['type'] = 1 + (df['packet_size'] > 1000)
+        df['src'] = "flow"
+        yield df.fillna(0)
+
+@pytest.mark.parametrize("fold_storage", ["feather", "parquet"])
+def test_chunks_of_different_dtypes(tmp_path, fold_storage):
+    rng = np.random.default_rng(0)
+    lines = ["%s\t%f\t%d\t%d" % (1527987720 + i if i < 100 else 1527987720 + i + 0.5, 0.01 * i, rng.integers(40, 1500), i % 2) for i in range(300)]
+    # timestamps of the first chunk inferred as integers, those of the next ones as floats,
+    # and a missing packet size: the packet sizes of the second chunk are inferred as floats
+    lines[150] = "%f\t%f\t\t%d" % (1527987870.5, 1.5, 0)
+    with open(tmp_path / "packets.txt", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    assert [(c['timestamp'].dtype, c['packet_size'].dtype) for c in chunks(tmp_path / "packets.txt", 100)] == [(np.int64, np.int64), (np.float64, np.float64), (np.float64, np.int64)]
+
+    classifier = EncryptedTrafficClassifier(2, [4], "test", str(tmp_path) + "/", str(tmp_path) + "/")
+    classifier.fold_storage = fold_storage
+    # every chunk written on its own
+    classifier.memory_budget = 1
+    classifier._store_flows_by_chunks(chunks(tmp_path / "packets.txt", 100), "test.pickle", PACKETS_DTYPES)
+    expected = pd.concat(list(chunks(tmp_path / "packets.txt", 1000))).astype(PACKETS_DTYPES)
+    for fold in range(2):
+        for split in ["train", "test"]:
+            X = classifier._load_fold("test.pickle", fold, "X", split)
+            y = classifier._load_fold("test.pickle", fold, "y", split)
+            assert X['packet_size'].dtype == np.int64
+            pd.testing.assert_frame_equal(X, expected.drop('type', axis = 1).loc[X.index])
+            assert (y == expected['type'].loc[y.index]).all()
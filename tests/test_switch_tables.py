@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from xgboost import XGBClassifier
+
+from feature_binning import FeatureBins
+from switch_tables import compile_model, range_to_ternary
+from xgboost_training import QuantileTrainer
+
+def flows(nb_flows, nb_classes = 4, seed = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(0.0, 2.0, (nb_flows, 6))
+    # lengths: integers, few distinct values
+    X[:, 0] = rng.choice([40, 52, 1500], nb_flows)
+    X[:, 1] = rng.integers(40, 1500, nb_flows)
+    y = ((X[:, 1] > 700).astype(int) + (X[:, 2] > X[:, 3]) + (X[:, 0] == 1500)) % nb_classes
+    return X, y
+
+def hard_votes(forest, X):
+    # class with the most trees voting for it, the first one on ties
+    X = np.asarray(X)
+    votes = np.zeros((len(X), forest.n_classes_))
+    for estimator in forest.estimators_:
+        votes[np.arange(len(X)), estimator.predict(X).astype(np.int64)] += 1
+    return forest.classes_.take(np.argmax(votes, axis = 1))
+
+@pytest.mark.parametrize("max_depth", [None, 4])
+def test_random_forest(max_depth):
+    X, y = flows(3000)
+    X_test, _ = flows(2000, seed = 1)
+    rf = RandomForestClassifier(n_estimators = 15, max_depth = max_depth, random_state = 42, n_jobs = 1).fit(X, y)
+    tables = compile_model(rf)
+    for _X in [X, X_test]:
+        np.testing.assert_array_equal(tables.leaves(_X), rf.apply(_X))
+        np.testing.assert_array_equal(tables.predict(_X), hard_votes(rf, _X))
+
+def test_random_forest_of_binned_features():
+    X, y = flows(3000)
+    X_test, _ = flows(2000, seed = 1)
+    columns = ["f%d" % k for k in range(X.shape[1])]
+    bins = FeatureBins().fit(pd.DataFrame(X, columns = columns))
+    codes = bins.transform(pd.DataFrame(X, columns = columns))
+    rf = RandomForestClassifier(n_estimators = 15, random_state = 42, n_jobs = 1).fit(codes, y)
+    # the tables classify the values of the features
+    tables = compile_model(rf, bins.thresholds(columns))
+    for _X in [X, X_test]:
+        np.testing.assert_array_equal(tables.predict(_X), hard_votes(rf, bins.transform(pd.DataFrame(_X, columns = columns))))
+
+@pytest.mark.parametrize("nb_classes", [2, 4])
+def test_xgboost(nb_classes):
+    X, y = flows(3000, nb_classes)
+    X_test, _ = flows(2000, nb_classes, seed = 1)
+    models = [XGBClassifier(n_estimators = 20, max_depth = 4, tree_method = 'hist', random_state = 42, n_jobs = 1).fit(X, y),
+              QuantileTrainer(cores = 1).fit({0: (X, y)})[0]]
+    for model in models:
+        tables = compile_model(model)
+        for _X in [X, X_test]:
+            np.testing.assert_array_equal(tables.predict(_X), model.predict(_X))
+
+def test_range_to_ternary():
+    rng = np.random.default_rng(0)
+    for bits in [1, 3, 8, 12]:
+        values = np.arange(1 << bits)
+        ranges = [(0, (1 << bits) - 1), (0, 0), ((1 << bits) - 1, (1 << bits) - 1)] + [tuple(sorted(rng.integers(0, 1 << bits, 2).tolist())) for _ in range(200)]
+        for low, high in ranges:
+            rules = range_to_ternary(low, high, bits)
+            matches = np.array([(values & mask) == value for value, mask in rules])
+            # every integer of [low, high] matched by a single rule, no other one
+            np.testing.assert_array_equal(matches.sum(axis = 0), (low <= values) & (values <= high))
+
+def test_ternary_feature_rules():
+    X, y = flows(3000)
+    tables = compile_model(RandomForestClassifier(n_estimators = 10, random_state = 42, n_jobs = 1).fit(X, y))
+    bits = 11
+    values = np.arange(1 << bits)
+    for k, f in enumerate(tables.features.tolist()):
+        _X = np.zeros((len(values), X.shape[1]))
+        _X[:, f] = values
+        codes = np.full(len(values), -1)
+        for value, mask, code in tables.feature_rules(k, bits):
+            matched = (values & mask) == value
+            assert (codes[matched] == -1).all()
+            codes[matched] = code
+        # every integer on bits bits matched by a single rule, of the code of the range table
+        np.testing.assert_array_equal(codes, tables.codes(_X)[:, k])
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+
+from training_scheduler import TrainingScheduler
+from xgboost_training import BoosterClassifier, QuantileTrainer
+
+def flows(nb_flows, seed = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((nb_flows, 3))
+    return X, (X[:, 0] > 0.5).astype(int)
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_errors_of_a_single_fold(processes):
+    X, y = flows(200)
+    # y of a different length than X: ValueError of the fit of this fold only
+    data = {(5, 0): (X, y), (5, 1): (X, y[:100])}
+    models = TrainingScheduler(processes, cores = 2).fit({i: HistGradientBoostingClassifier(max_iter = 5) for i in data}, data, errors = (ValueError,))
+    assert isinstance(models[(5, 0)], HistGradientBoostingClassifier) and isinstance(models[(5, 1)], ValueError)
+    models = QuantileTrainer(processes, cores = 2).fit(data, errors = (ValueError,))
+    assert isinstance(models[(5, 0)], BoosterClassifier) and isinstance(models[(5, 1)], ValueError)
+    with pytest.raises(ValueError):
+        QuantileTrainer(processes, cores = 2).fit(data)
+
+def search_data(seed = 0):
+    # two (pkt, fold) of a few hundred flows, noisy enough for the numbers of trees to matter
+    data = {}
+    for i, pkt in enumerate([4, 8]):
+        rng = np.random.default_rng(seed + i)
+        X = rng.normal(0.0, 1.0, (400, 6))
+        y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(0.0, 1.0, 400) > 0).astype(int) + (X[:, 3] > 1)
+        data[(pkt, 0)] = (X, y)
+    return data
+
+def pipeline():
+    return Pipeline(steps = [("rf", RandomForestClassifier(random_state = 42, n_jobs = 1))])
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_grid_search(processes):
+    data = search_data()
+    param_grid = {"rf__n_estimators": [2, 5, 20], "rf__max_depth": [2, None]}
+    results = TrainingScheduler(processes, cores = 2).grid_search(pipeline(), param_grid, data, cv = 2)
+    for i, (X, y) in data.items():
+        expected = GridSearchCV(pipeline(), param_grid, cv = 2).fit(X, y)
+        assert results[i].best_params_ == expected.best_params_
+        np.testing.assert_allclose(results[i].cv_results_['mean_test_score'], expected.cv_results_['mean_test_score'])
+        np.testing.assert_array_equal(results[i].predict(X), expected.predict(X))
+
+@pytest.mark.parametrize("search", ["warm_start", "truncation"])
+def test_trees_search(search):
+    data = search_data()
+    n_estimators = [2, 5, 20, 40]
+    scheduler = TrainingScheduler(2, cores = 2)
+    if search == "warm_start":
+        results = scheduler.warm_start_search(pipeline(), "rf__n_estimators", n_estimators, data, cv = 2)
+    else:
+        results = scheduler.truncation_search(pipeline(), "rf__n_estimators", n_estimators, data, cv = 2)
+    for i, (X, y) in data.items():
+        expected = GridSearchCV(pipeline(), {"rf__n_estimators": n_estimators}, cv = 2).fit(X, y)
+        assert results[i].best_params_ == expected.best_params_
+        np.testing.assert_allclose(results[i].cv_results_['mean_test_score'], expected.cv_results_['mean_test_score'])
+
+def test_warm_start_search_time_budget():
+    # only the smallest forest of every split within a budget of no time
+    data = search_data()
+    results = TrainingScheduler(1, cores = 1).warm_start_search(pipeline(), "rf__n_estimators", [2, 5, 20], data, cv = 2, time_budget = 0)
+    for i in data:
+        assert results[i].best_params_ == {"rf__n_estimators": 2}
+        assert np.isnan(results[i].cv_results_['mean_test_score'][1:]).all()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+import os
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, check_cv
+from threadpoolctl import threadpool_limits
+
+from compiled_forest import CompiledForest
+
+# (X, y) of every (pkt, fold), set in the workers by _share
+_data = {}
+
+def _share(data):
+    # initializer of the workers: data is inherited, not copied, by forked workers
+    global _data
+    _data = data
+
+def _rows(a, index):
+    return a.iloc[index] if hasattr(a, 'iloc') else a[index]
+
+def _set_param(estimator, name, value):
+    # value of the parameter name of the estimator and of all its steps
+    estimator.set_params(**{_name: value for _name in estimator.get_params() if _name == name or _name.endswith('__' + name)})
+
+def _run_job(job):
+    # fit of a job on the shared data: score on the test rows of a split, or the estimator fitted on all the rows
+    key, estimator, params, _, train, test, n_jobs = job
+    start_time = time.time()
+    X, y = _data[key]
+    estimator = clone(estimator).set_params(**params)
+    _set_param(estimator, 'n_jobs', n_jobs)
+    # OpenMP threads of the estimators without n_jobs (HistGradientBoostingClassifier)
+    with threadpool_limits(limits = n_jobs, user_api = 'openmp'):
+        if train is None:
+            result = estimator.fit(X, y)
+        else:
+            estimator.fit(_rows(X, train), _rows(y, train))
+            result = estimator.score(_rows(X, test), _rows(y, test))
+    return os.getpid(), time.time() - start_time, result
+
+def _run_or_error(function, errors, job):
+    # result of function on job, or the exception of errors it raised
+    start_time = time.time()
+    try:
+        return function(job)
+    except errors as e:
+        return os.getpid(), time.time() - start_time, e
+
+def _run_predict_job(job):
+    # predictions on the test rows of the estimator fitted on the train rows
+    key, estimator, params, _, train, test, n_jobs = job
+    start_time = time.time()
+    X, y = _data[key]
+    estimator = clone(estimator).set_params(**params)
+    _set_param(estimator, 'n_jobs', n_jobs)
+    estimator.fit(_rows(X, train), _rows(y, train))
+    return os.getpid(), time.time() - start_time, estimator.predict(_rows(X, test))
+
+def _run_warm_start_job(job, parameter, time_budget):
+    # scores on the test rows of a split of a forest grown through the numbers of trees params[parameter],
+    # nan for the numbers not reached within time_budget seconds
+    key, estimator, params, _, train, test, n_jobs = job
+    start_time = time.time()
+    X, y = _data[key]
+    X_train, y_train, X_test, y_test = _rows(X, train), _rows(y, train), _rows(X, test), _rows(y, test)
+    estimator = clone(estimator)
+    _set_param(estimator, 'n_jobs', n_jobs)
+    _set_param(estimator, 'warm_start', True)
+    scores = []
+    for n in params[parameter]:
+        if time_budget is not None and len(scores) > 0 and time.time() - start_time > time_budget:
+            scores.append(np.nan)
+            continue
+        # only the trees above the previous number of trees are fitted
+        estimator.set_params(**{parameter: n}).fit(X_train, y_train)
+        scores.append(estimator.score(X_test, y_test))
+    return os.getpid(), time.time() - start_time, scores
+
+def _run_truncation_job(job, parameter, time_budget = None):
+    # scores on the test rows of a split of the first params[parameter] trees of a single forest of the largest size
+    key, estimator, params, _, train, test, n_jobs = job
+    start_time = time.time()
+    X, y = _data[key]
+    sizes = params[parameter]
+    estimator = clone(estimator).set_params(**{parameter: sizes[-1]})
+    _set_param(estimator, 'n_jobs', n_jobs)
+    estimator.fit(_rows(X, train), _rows(y, train))
+    X_test = _rows(X, test)
+    if hasattr(estimator, 'steps'):
+        if len(estimator.steps) > 1:
+            X_test = estimator[:-1].transform(X_test)
+        estimator = estimator.steps[-1][1]
+    forest = CompiledForest(estimator)
+    y_test = np.asarray(_rows(y, test))
+    scores = [np.mean(forest.classes_.take(np.argmax(proba, axis = 1)) == y_test) for proba in forest.staged_predict_proba(X_test, sizes)]
+    return os.getpid(), time.time() - start_time, scores
+
+########################################
+# Search results
+########################################
+class SearchResult():
+    """
+    Result of TrainingScheduler.grid_search for a (pkt, fold), with the attributes
+    of a fitted GridSearchCV used by the classifiers.
+    """
+    def __init__(self, best_estimator, best_params, best_score, cv_results):
+        self.best_estimator_ = best_estimator
+        self.best_params_ = best_params
+        self.best_score_ = best_score
+        self.cv_results_ = cv_results
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+    def score(self, X, y):
+        return self.best_estimator_.score(X, y)
+
+########################################
+# Training scheduler
+########################################
+class TrainingScheduler():
+    """
+    Run the fits of (pkt, fold, hyperparameters, split) jobs in a pool of at most
+    processes workers instead of one after the other, each job fitting with n_jobs =
+    cores // workers so that the cores are neither idle nor oversubscribed. The
+    (X, y) of the folds are given to the workers once when they start, and shared
+    with them when they are forked. The wall time of every job is printed and kept
+    in durations.
+    """
+    def __init__(self, processes = 1, cores = None):
+        self.processes = processes
+        self.cores = os.cpu_count() if cores is None else cores
+        # (key, params, split, pid, seconds) of every job run, split None for a fit on all the rows
+        self.durations = []
+
+    def _run(self, data, jobs, function = _run_job, errors = ()):
+        # results of function on jobs (key, estimator, params, split, train, test) in their order, split None for a fit on all the rows,
+        # the exceptions of errors raised by a job being its result
+        start_time = time.time()
+        if len(errors) > 0:
+            function = partial(_run_or_error, function, errors)
+        workers = max(1, min(self.processes, len(jobs)))
+        n_jobs = max(1, self.cores // workers)
+        jobs = [job + (n_jobs,) for job in jobs]
+        # largest folds first, so that the last jobs running are the shortest ones
+        order = sorted(range(len(jobs)), key = lambda j: -len(data[jobs[j][0]][1]) if jobs[j][4] is None else -len(jobs[j][4]))
+        results = [None] * len(jobs)
+        if workers == 1:
+            _share(data)
+            outputs = ((j, function(jobs[j])) for j in order)
+        else:
+            executor = ProcessPoolExecutor(max_workers = workers, initializer = _share, initargs = (data,))
+            futures = {executor.submit(function, jobs[j]): j for j in order}
+            outputs = ((futures[future], future.result()) for future in as_completed(futures))
+        try:
+            for j, (pid, duration, result) in outputs:
+                key, _, params, split, _, _, _ = jobs[j]
+                print("  job %s %s %s: %.2f seconds on worker %d" % (key, params, "fit" if split is None else "split " + str(split), duration, pid))
+                self.durations.append((key, params, split, pid, duration))
+                results[j] = result
+        finally:
+            if workers > 1:
+                executor.shutdown(cancel_futures = True)
+            _share({})
+        busy = sum(d for _, _, _, _, d in self.durations[-len(jobs):])
+        elapsed = time.time() - start_time
+        print("  %d jobs on %d workers of %d cores in %.2f seconds (%.0f%% of the workers busy)" % (len(jobs), workers, n_jobs, elapsed, 100 * busy / max(elapsed * workers, 1e-9)))
+        return results
+
+    def fit(self, estimators, data, errors = ()):
+        """
+        estimators[key] fitted on data[key] = (X, y) for every key, or the
+        exception of errors raised by its fit.
+        """
+        keys = list(estimators)
+        return dict(zip(keys, self._run(data, [(key, estimators[key], {}, None, None, None) for key in keys], errors = errors)))
+
+    def fit_predict(self, estimators, data, train, test):
+        """
+        Predictions on the test rows of data[key] = (X, y) of estimators[key] fitted
+        on the train rows, for every key.
+        """
+        keys = list(estimators)
+        return dict(zip(keys, self._run(data, [(key, estimators[key], {}, 0, train, test) for key in keys], _run_predict_job)))
+
+    def grid_search(self, estimator, param_grid, data, cv = 2):
+        """
+        Same search as GridSearchCV(estimator, param_grid, cv = cv) for every key of
+        data = {key: (X, y)}: the mean score over the splits of every hyperparameters
+        of param_grid, then the best ones refitted on all the rows, all the fits of
+        all the keys being jobs of the pool. Returns a SearchResult per key.
+        """
+        candidates = list(ParameterGrid(param_grid))
+        splits = {key: list(check_cv(cv, y, classifier = True).split(X, y)) for key, (X, y) in data.items()}
+        jobs = [(key, estimator, params, s, train, test) for key in data for params in candidates for s, (train, test) in enumerate(splits[key])]
+        scores = iter(self._run(data, jobs))
+        # scores of every candidate (rows) for every split (columns)
+        return self.__refit_best(estimator, data, candidates, {key: np.array([[next(scores) for _ in splits[key]] for _ in candidates]) for key in data})
+
+    def warm_start_search(self, estimator, parameter, values, data, cv = 2, time_budget = None):
+        """
+        Same search as grid_search(estimator, {parameter: values}, data, cv) for a
+        number of trees parameter (n_estimators of a forest having warm_start): a
+        single forest per split grows through the sorted values, the trees of the
+        smaller forests being kept instead of fitted again. With time_budget, a
+        forest stops growing once its split used time_budget seconds, the values
+        not reached by every split being left out of the search.
+        """
+        return self.__trees_search(_run_warm_start_job, estimator, parameter, values, data, cv, time_budget)
+
+    def truncation_search(self, estimator, parameter, values, data, cv = 2):
+        """
+        Same search as warm_start_search for a RandomForestClassifier (possibly the
+        last step of a Pipeline): a single forest of the largest size is fitted per
+        split, and the forest of every size is its first trees, all evaluated by a
+        single traversal of the trees (CompiledForest.staged_predict_proba).
+        """
+        return self.__trees_search(_run_truncation_job, estimator, parameter, values, data, cv)
+
+    def __trees_search(self, function, estimator, parameter, values, data, cv, time_budget = None):
+        # scores of every number of trees of values by a single job per split
+        candidates = [{parameter: n} for n in sorted(values)]
+        splits = {key: list(check_cv(cv, y, classifier = True).split(X, y)) for key, (X, y) in data.items()}
+        jobs = [(key, estimator, {parameter: sorted(values)}, s, train, test) for key in data for s, (train, test) in enumerate(splits[key])]
+        scores = iter(self._run(data, jobs, partial(function, parameter = parameter, time_budget = time_budget)))
+        return self.__refit_best(estimator, data, candidates, {key: np.array([next(scores) for _ in splits[key]]).T for key in data})
+
+    def __refit_best(self, estimator, data, candidates, scores):
+        # SearchResult of the best candidate, the first of the highest mean scores, refitted on all the rows for every key
+        best = {}
+        cv_results = {}
+        for key in data:
+            _scores = scores[key]
+            means = _scores.mean(axis = 1)
+            best[key] = int(np.argmax(np.nan_to_num(means, nan = -np.inf)))
+            cv_results[key] = {'params': candidates, 'mean_test_score': means}
+            for s in range(_scores.shape[1]):
+                cv_results[key]['split%d_test_score' % s] = _scores[:, s]
+        keys = list(data)
+        fitted = self._run(data, [(key, estimator, candidates[best[key]], None, None, None) for key in keys])
+        return {key: SearchResult(model, candidates[best[key]], cv_results[key]['mean_test_score'][best[key]], cv_results[key]) for key, model in zip(keys, fitted)}
+
+########################################
+# Main
+########################################
+if __name__ == "__main__":
+    # wall time of the searches of RF_predict on the folds prepared by one of the classifiers
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--processed_data_output_dir', required = True)
+    parser.add_argument('-p', '--filename_prefix', required = True)
+    parser.add_argument('-n', '--nb_packets', type = int, default = 4)
+    parser.add_argument('-f', '--nb_folds', type = int, default = 1)
+    parser.add_argument('-j', '--jobs', type = int, default = 1)
+    parser.add_argument('-t', '--time_budget', type = float, default = None)
+    args = parser.parse_args()
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from encrypted_traffic_classification import EncryptedTrafficClassifier, FLOW_FEATURES
+    classifier = EncryptedTrafficClassifier(nb_folds = args.nb_folds,
+                                            nb_packets_per_flow = [args.nb_packets],
+                                            filename_prefix = args.filename_prefix,
+                                            processed_data_output_dir = args.processed_data_output_dir,
+                                            data_dir = None)
+    data = {}
+    for fold in range(args.nb_folds):
+        suffix = args.filename_prefix + "_" + str(args.nb_packets) + ".pickle"
+        X = classifier._load_pickle(str(fold) + "_X_train_" + suffix)
+        data[(args.nb_packets, fold)] = (X[[f for f in FLOW_FEATURES if f in X.columns]], classifier._load_pickle(str(fold) + "_y_train_" + suffix))
+    # same forests for both searches
+    pipeline = Pipeline(steps = [("rf", RandomForestClassifier(random_state = classifier.random_seed))])
+    values = range(150, 400, 50)
+    durations = {}
+    results = {}
+    searches = ["grid", "warm_start", "truncation"]
+    for search in searches:
+        scheduler = TrainingScheduler(args.jobs)
+        start_time = time.time()
+        if search == "grid":
+            results[search] = scheduler.grid_search(pipeline, {"rf__n_estimators": values}, data, cv = 2)
+        elif search == "warm_start":
+            results[search] = scheduler.warm_start_search(pipeline, "rf__n_estimators", values, data, cv = 2, time_budget = args.time_budget)
+        else:
+            results[search] = scheduler.truncation_search(pipeline, "rf__n_estimators", values, data, cv = 2)
+        durations[search] = time.time() - start_time
+    for key in data:
+        for search in searches:
+            print(key, search, results[search][key].best_params_, np.round(results[search][key].cv_results_['mean_test_score'], 6).tolist())
+    for search in searches:
+        print("%s %.2f seconds (%.1fx faster than grid)" % (search, durations[search], durations["grid"] / max(durations[search], 1e-9)))
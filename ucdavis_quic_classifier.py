@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from functools import partial
 
 import os
 from os.path import isfile, join
@@ -21,10 +22,14 @@ from sklearn.compose import ColumnTransformer
 from sklearn.experimental import enable_iterative_imputer
 from sklearn.impute import SimpleImputer, IterativeImputer
 
-from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator
+from encrypted_traffic_classification import EncryptedTrafficClassifier, EncryptedTrafficClassifierIterator, FOLD_STORAGES, RF_SEARCHES, FlowRecords, read_csv_chunks
 
 REGENERATE_FLOWS_DATA = False
 
+# columns of the packets files, and dtypes of the packets stored by chunks
+PACKETS_COLUMNS = ['timestamp', 'time_delta', 'packet_size', 'direction']
+PACKETS_DTYPES = {'timestamp': 'float64', 'time_delta': 'float64', 'packet_size': 'int64', 'direction': 'int64', 'type': 'int64', 'src': 'str'}
+
 TEST_FLOWS = True
 TEST_PACKETS = False
 
@@ -54,6 +59,19 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
             result = [x + [y] for x in result for y in pool]
         self.packet_ids = result
 
+    def _read_packets(self, f, traffic_type):
+        """
+        Packets of file f, of class traffic_type, by chunks of self.chunksize packets.
+        """
+        for file_df in read_csv_chunks(f,
+                                       self.chunksize,
+                                       delimiter = '\t',
+                                       names = PACKETS_COLUMNS
+                                       ):
+            file_df['type'] = traffic_type
+            file_df['src'] = os.path.basename(f)
+            yield file_df.fillna(0)
+
     def data_preparation(self):
         print("data_prepation")
         # limit = 100000
@@ -61,48 +79,28 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
         start_time = time.time()
         traffic_type = 0
         subdirs = os.listdir(self.data_dir)
-        dfs = []
-        dfs_memory_usage = 0
-        df = pd.DataFrame()
+        files = []
         for d in subdirs:
             self.classes[traffic_type] = d
             # print(d)
-            files = os.listdir(self.data_dir + d)
-            # i = 0
-            for filename in files:
-                f = self.data_dir + d + "/" + filename
-                # print(filename)
-                file_df = pd.read_csv(f, 
-                                      delimiter = '\t',
-                                      names = ['timestamp', 'time_delta', 'packet_size', 'direction']
-                                      )
-                file_df['type'] = traffic_type
-                file_df['src'] = filename
-                dfs.append(file_df)
-                # short hack: there is a trade-off between memory usage and speed
-                # as much as possible DataFrames are insert in the dfs numpy array
-                # which is much faster than pandas.concat, but if the dfs array grows
-                # too big the process will be killed by oom_killer on Linux, so
-                # once memory is above 2GB concat what we have in dfs
-                dfs_memory_usage += file_df.memory_usage(deep = True).sum()
-                if dfs_memory_usage > 2 * 1024 * 1024 * 1024:
-                    df = pd.concat([df, *dfs])
-                    del dfs
-                    dfs = []
-                    dfs_memory_usage = 0
-                    
-                # i += 1
-                # if i >= limit:
-                #     break
-    
-                traffic_type += 1
-        
-        df = pd.concat([df, *dfs])
-        df = df.fillna(0)
+            files += [(self.data_dir + d + "/" + filename, traffic_type) for filename in os.listdir(self.data_dir + d)]
+            traffic_type += 1
 
-        del dfs
-        print(f"  flows data loaded in {time.time() - start_time} seconds")
         filename = self.filename_prefix + ".pickle"
+        chunks = (chunk for f, t in files for chunk in self._read_packets(f, t))
+        if self.fold_storage != "pickle":
+            # packets written one file at a time, at most self.memory_budget bytes of them in memory
+            self._store_flows_by_chunks(chunks, filename, PACKETS_DTYPES)
+            print(f"  packets data stored in {time.time() - start_time} seconds")
+            return
+
+        # the folds of pickle files are split from all the packets in memory
+        records = FlowRecords()
+        for chunk in chunks:
+            records.append(chunk)
+        df = records.to_frame()
+        del records
+        print(f"  flows data loaded in {time.time() - start_time} seconds")
         self._generate_data_folds(df, filename)
         
         print(df.columns)
@@ -110,7 +108,7 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
         print(df.info)
         print(df.shape)
 
-    def __get_flow_df(self, flow_df, traffic_type):
+    def __get_flow_features(self, flow_df, traffic_type):
         # filter by direction
         #file_df = file_df[file_df['direction'] == 1]
         _df = flow_df['packet_size']
@@ -139,33 +137,31 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
         skew_iat = skew(_a)
         kurt_iat = kurtosis(_a)
         data = {
-            'sum_iat': [time_delta],
-            'sum_length': [packet_size],
-            'min_length': [min_packet_size],
-            'max_length': [max_packet_size],
-            'mean_length': [mean_packet_size],
-            'median_length': [median_packet_size],
-            'std_length': [std_packet_size],
-            '1stQ_length': [Q1_packet_size],
-            '3stQ_length': [Q3_packet_size],
-            'skew_length': [skew_packet_size],
-            'kurt_length': [kurt_packet_size],
-            'min_iat': [min_time_delta],
-            'max_iat': [max_time_delta],
-            'mean_iat': [mean_time_delta],
-            'median_iat': [median_time_delta],
-            'std_iat': [std_time_delta],
-            '1stQ_iat': [Q1_iat],
-            '3stQ_iat': [Q3_iat],
-            'skew_iat': [skew_iat],
-            'kurt_iat': [kurt_iat],
-            'nb_packets': [len(flow_df)],
-            'type': [traffic_type],
+            'sum_iat': time_delta,
+            'sum_length': packet_size,
+            'min_length': min_packet_size,
+            'max_length': max_packet_size,
+            'mean_length': mean_packet_size,
+            'median_length': median_packet_size,
+            'std_length': std_packet_size,
+            '1stQ_length': Q1_packet_size,
+            '3stQ_length': Q3_packet_size,
+            'skew_length': skew_packet_size,
+            'kurt_length': kurt_packet_size,
+            'min_iat': min_time_delta,
+            'max_iat': max_time_delta,
+            'mean_iat': mean_time_delta,
+            'median_iat': median_time_delta,
+            'std_iat': std_time_delta,
+            '1stQ_iat': Q1_iat,
+            '3stQ_iat': Q3_iat,
+            'skew_iat': skew_iat,
+            'kurt_iat': kurt_iat,
+            'nb_packets': len(flow_df),
+            'type': traffic_type,
             #'direction': [flow_df['direction']]
         }
-        _df = pd.DataFrame(data = data)
-        _df.fillna(0)
-        return _df
+        return data
 
     def packets2flows_nofold(self):
         print("packets2flows_nofold")
@@ -201,7 +197,7 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
         print("_get_flows_with_all_packets")
         traffic_type = 0
         subdirs = os.listdir(self.data_dir)
-        _df = []
+        records = FlowRecords()
         start_time = time.time()
         for d in subdirs:
             self.classes[traffic_type] = d
@@ -215,50 +211,58 @@ class UCDavisQuicClassifier(EncryptedTrafficClassifier):
                 )
                 file_df['type'] = traffic_type
                 file_df['src'] = filename
-                _flow_df = self.__get_flow_df(file_df, traffic_type)
-                
-                _df.append(_flow_df)
+                # flows were historically one row DataFrames, all with index 0
+                records.append(self.__get_flow_features(file_df, traffic_type), index = 0)
                 # uncomment for debugging behavior with a single file
                 # break
             traffic_type += 1
         print("  processing took ", time.time() - start_time, "seconds.")
-        _df = pd.concat(_df)
+        _df = records.to_frame()
         _df =_df.fillna(0)
         return _df
         
+    def _cache_key(self, function, f, content_hash, n):
+        # the class of the flow of f depends on all the directories of classes
+        return super()._cache_key(function, f, content_hash, n) + repr(sorted(self.classes.items()))
+
+    def _extract_flows(self, f, nb_packets):
+        """
+        Flow of file f for every number of packets, run in a worker process when
+        self.jobs > 1. The class of the flow is given by the directory of f.
+        """
+        traffic_type = [t for t, d in self.classes.items() if d == os.path.basename(os.path.dirname(f))][0]
+        file_df = pd.read_csv(f, 
+                              delimiter = '\t',
+                              names = PACKETS_COLUMNS
+                              )
+        file_df['type'] = traffic_type
+        file_df['src'] = os.path.basename(f)
+        flows = {}
+        for n in nb_packets:
+            flows[n] = self.__get_flow_features(file_df.head(n = n), traffic_type)
+        return 1, flows
+
     def packets2flows(self):
         print("packets2flows")
         traffic_type = 0
         subdirs = sorted(os.listdir(self.data_dir))
-        dfs = {}
+        records = {}
         for n in self.nb_packets_per_flow:
-            dfs[n] = []
-        idx_d = 0
+            records[n] = FlowRecords()
+        files = []
         for d in subdirs:
-            start_time = time.time()
-            print("Processing directory #%d/%d: %s" % (idx_d, len(subdirs), d))
-            idx_d += 1
             self.classes[traffic_type] = d
-            files = sorted(os.listdir(self.data_dir + d))
-            for filename in files:
-                f = self.data_dir + d + "/" + filename
-                # print(filename)
-                file_df = pd.read_csv(f, 
-                                      delimiter = '\t',
-                                      names = ['timestamp', 'time_delta', 'packet_size', 'direction']
-                                      )
-                file_df['type'] = traffic_type
-                file_df['src'] = filename
-                for n in self.nb_packets_per_flow:
-                    _flow_df = self.__get_flow_df(file_df.head(n = n), traffic_type)
-                
-                    dfs[n].append(_flow_df)
-            print("  ", d, "processed in ", time.time() - start_time, "seconds.")            
-            
+            files += [self.data_dir + d + "/" + filename for filename in sorted(os.listdir(self.data_dir + d))]
             traffic_type += 1
+
+        # files are processed in parallel, results are merged in the order of files
+        for flows in self._map_files(partial(self._extract_flows, nb_packets = self.nb_packets_per_flow), files):
+            for n in self.nb_packets_per_flow:
+                # flows were historically one row DataFrames, all with index 0
+                records[n].append(flows[n], index = 0)
             
         for n in self.nb_packets_per_flow:
-            df = pd.concat(dfs[n])
+            df = records[n].to_frame()
             df = df.fillna(0)
             seed = 42
             filename = self.filename_prefix + "_" + str(n) + ".pickle"
@@ -327,6 +331,12 @@ if __name__ == "__main__":
     parser.add_argument('-v', '--visualization', action = 'store_true', required = False, default = False)
     parser.add_argument('-r', '--report', action = 'store_true', required = False, default = False)
     parser.add_argument('-F', '--force_rf_classification', action = 'store_true', required = False, default = False)
+    parser.add_argument('-j', '--jobs', action = 'store', default = 1, type = int)
+    parser.add_argument('-s', '--storage', action = 'store', default = 'feather', choices = FOLD_STORAGES)
+    parser.add_argument('--rf_search', action = 'store', default = 'grid', choices = RF_SEARCHES)
+    parser.add_argument('--rf_search_time_budget', action = 'store', default = None, type = float)
+    parser.add_argument('--binned', action = 'store_true', required = False, default = False)
+    parser.add_argument('-m', '--memory_budget', action = 'store', default = 2048, type = int)
     args = parser.parse_args(sys.argv[1:])
 
     VISUALIZATION_ENABLED = False
@@ -355,6 +365,12 @@ if __name__ == "__main__":
     FORCE_RF_CLASSIFICATION = False
     if args.force_rf_classification == True:
         classifier.force_rf_classification = True
+    classifier.jobs = args.jobs
+    classifier.fold_storage = args.storage
+    classifier.rf_search = args.rf_search
+    classifier.rf_search_time_budget = args.rf_search_time_budget
+    classifier.binned = args.binned
+    classifier.memory_budget = args.memory_budget * 1024 * 1024
 
     classifier.all_classes = [
         "Google Doc",
@@ -588,6 +604,33 @@ if __name__ == "__main__":
             print(output)
             ####
 
+        if GB_ENABLED:
+            print("==== GradientBoosting =====")
+            gb_regr, gb_y_train_predicted, gb_y_test_flows_predicted = classifier.GBoost_predict(
+                classifier.X_train_flows_fitted,
+                classifier.y_train_flows,
+                classifier.X_test_flows_fitted,
+                classifier.y_test_flows
+            )
+            
+            gb_cm_dict_flows, output = classifier.confusion_matrix(gb_regr,
+                                                                   classifier.y_test_flows,
+                                                                   gb_y_test_flows_predicted,
+                                                                   classifier.flow_ids,
+                                                                   "gb"
+                                                                )
+            print(output)
+            
+            gb_f1_scores_flows, output = classifier.get_F1_score(
+                gb_cm_dict_flows,
+                classifier.y_test_flows,
+                gb_y_test_flows_predicted,
+                classifier.flow_ids,
+                "gb_flows")
+            print(output)
+            avg_scores, output = classifier.avg_f1_scores(gb_f1_scores_flows, classifier.flow_ids)
+            print(output)
+
         if XG_ENABLED:
             print("==== XGBoost =====")
             xg_regr, xg_y_train_predicted, xg_y_test_flows_predicted = classifier.XGBoost_predict(
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+import xgboost as xgb
+
+# rounds of the boosters, without early stopping, and at most with it
+XG_ROUNDS = 100
+XG_MAX_ROUNDS = 1000
+XG_EARLY_STOPPING_ROUNDS = 20
+# train flows from which the rounds are chosen by early stopping on a held-out slice of them
+XG_EARLY_STOPPING_MIN_FLOWS = 10000
+XG_VALIDATION_FRACTION = 0.1
+
+def _rows(a, index):
+    return a.iloc[index] if hasattr(a, 'iloc') else a[index]
+
+########################################
+# Booster classifier
+########################################
+class BoosterClassifier():
+    """
+    Booster trained by QuantileTrainer, with the methods of a fitted XGBClassifier
+    used by the classifiers and compile_model. Its trees stop at the best round
+    of the early stopping.
+    """
+    def __init__(self, booster, classes, n_iter, fit_time):
+        self.booster = booster
+        self.classes_ = classes
+        self.n_iter_ = n_iter
+        self.fit_time = fit_time
+
+    def get_booster(self):
+        return self.booster
+
+    def predict_proba(self, X):
+        proba = self.booster.inplace_predict(X)
+        if proba.ndim == 1:
+            return np.column_stack((1 - proba, proba))
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis = 1))
+
+########################################
+# Quantile trainer
+########################################
+class QuantileTrainer():
+    """
+    Train 'hist' boosters on QuantileDMatrix, the bins of the features of every
+    fold being computed from its train flows only. Above XG_EARLY_STOPPING_MIN_FLOWS
+    train flows, the rounds are chosen by early stopping on a stratified slice of
+    XG_VALIDATION_FRACTION of them, binned with the bins of the others. The folds
+    are trained by at most processes threads at once, each booster using
+    cores // threads threads.
+    """
+    def __init__(self, processes = 1, cores = None, max_bin = 256, random_seed = 42):
+        self.processes = processes
+        self.cores = os.cpu_count() if cores is None else cores
+        self.max_bin = max_bin
+        self.random_seed = random_seed
+
+    def params(self):
+        # everything the boosters depend on, but the data
+        return [('max_bin', self.max_bin), ('bins', 'train'), ('random_seed', self.random_seed), ('rounds', XG_ROUNDS), ('max_rounds', XG_MAX_ROUNDS), ('early_stopping_rounds', XG_EARLY_STOPPING_ROUNDS), ('early_stopping_min_flows', XG_EARLY_STOPPING_MIN_FLOWS), ('validation_fraction', XG_VALIDATION_FRACTION)]
+
+    def _fit(self, X, y, nthread):
+        start_time = time.time()
+        classes, labels = np.unique(np.asarray(y), return_inverse = True)
+        params = {'tree_method': 'hist', 'max_bin': self.max_bin, 'nthread': nthread, 'seed': self.random_seed}
+        if len(classes) > 2:
+            params.update({'objective': 'multi:softprob', 'num_class': len(classes)})
+        else:
+            params['objective'] = 'binary:logistic'
+        if len(labels) < XG_EARLY_STOPPING_MIN_FLOWS:
+            booster = xgb.train(params, xgb.QuantileDMatrix(X, labels, max_bin = self.max_bin, nthread = nthread), num_boost_round = XG_ROUNDS)
+            return BoosterClassifier(booster, classes, XG_ROUNDS, time.time() - start_time)
+        rows = np.arange(len(labels))
+        try:
+            fit, validation = train_test_split(rows, test_size = XG_VALIDATION_FRACTION, stratify = labels, random_state = self.random_seed)
+        except ValueError:
+            # classes of a single flow
+            fit, validation = train_test_split(rows, test_size = XG_VALIDATION_FRACTION, random_state = self.random_seed)
+        dfit = xgb.QuantileDMatrix(_rows(X, fit), labels[fit], max_bin = self.max_bin, nthread = nthread)
+        dvalidation = xgb.QuantileDMatrix(_rows(X, validation), labels[validation], ref = dfit, nthread = nthread)
+        booster = xgb.train(params, dfit, num_boost_round = XG_MAX_ROUNDS, evals = [(dvalidation, 'validation')], early_stopping_rounds = XG_EARLY_STOPPING_ROUNDS, verbose_eval = False)
+        # trees of the rounds after the best one dropped
+        booster = booster[:booster.best_iteration + 1]
+        return BoosterClassifier(booster, classes, booster.num_boosted_rounds(), time.time() - start_time)
+
+    def fit(self, data, errors = ()):
+        """
+        BoosterClassifier fitted on data[key] = (X, y) for every key, or the
+        exception of errors raised by its fit.
+        """
+        keys = list(data)
+        threads = max(1, min(self.processes, len(keys)))
+        nthread = max(1, self.cores // threads)
+        def _fit(key):
+            try:
+                return self._fit(*data[key], nthread)
+            except errors as e:
+                return e
+        with ThreadPoolExecutor(max_workers = threads) as executor:
+            models = dict(zip(keys, executor.map(_fit, keys)))
+        for key in keys:
+            if not isinstance(models[key], BoosterClassifier):
+                continue
+            print("  %s: %d rounds in %.2f seconds on %d threads" % (key, models[key].n_iter_, models[key].fit_time, nthread))
+        return models